@@ -0,0 +1,7 @@
+"""
+Importable pipeline for the SF Crime Analysis project.
+
+The notebooks (data_cleaning.ipynb / data_cleaning_Mokshith.ipynb) remain the
+narrative record of the analysis; the modules in this package hold the code
+paths that have to scale to the full incident history.
+"""
@@ -0,0 +1,381 @@
+"""
+Materialized count tables behind the EDA charts and the dashboard.
+
+Each EDA chart in the notebooks is its own full pass over the incident frame:
+`value_counts()` for the category / neighborhood / district bars,
+`groupby(dt.to_period('M'))` for the monthly trend, `groupby(dt.hour)` for
+the hourly pattern, `countplot` for the day of week, a refiltered
+top-5 x top-5 frame for the district comparison, and a category /
+subcategory groupby for the treemap. Here every cleaned-store partition is
+grouped once on (date, hour, weekday, district, neighborhood, category,
+subcategory), and that grouping is rolled up into four small tables:
+
+- `daily`:        date, police_district, incident_category
+- `hourly`:       year, weekday, hour, police_district, incident_category
+- `neighborhood`: year, analysis_neighborhood, police_district, incident_category
+- `subcategory`:  year, police_district, incident_category, incident_subcategory
+
+Each table has a `count` column. Missing keys are kept as nulls, so every
+chart drops exactly the rows its own groupby would.
+Partition results are cached by partition version. `refresh_aggregates`,
+which `sync` calls after re-cleaning, recomputes only the months that
+changed and rewrites the parquet tables under `data/aggregates/`.
+
+Usage:
+    tables = load_aggregates()                      # refreshed if the store moved on
+    tables.category_counts().nlargest(10)           # crime_type_distribution
+    tables.hourly_counts(years=(2022, 2024))        # hourly_pattern
+    fig = treemap_figure(tables)
+    python -m sfcrime.aggregates --publish          # the six EDA chart artifacts
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR, DISTRICT_COL
+from .cube import DAYS_OF_WEEK
+from .telemetry import span
+
+AGGREGATES_DIR = os.path.join(DATA_DIR, "aggregates")
+SOURCE_COLUMNS = ['incident_datetime', DISTRICT_COL, 'analysis_neighborhood', 'incident_category',
+                  'incident_subcategory']
+TABLE_KEYS = {
+    'daily': ['date', DISTRICT_COL, 'incident_category'],
+    'hourly': ['year', 'weekday', 'hour', DISTRICT_COL, 'incident_category'],
+    'neighborhood': ['year', 'analysis_neighborhood', DISTRICT_COL, 'incident_category'],
+    'subcategory': ['year', DISTRICT_COL, 'incident_category', 'incident_subcategory'],
+}
+_MANIFEST = "_manifest.json"
+_PARTITION_CACHE = "_partitions.pkl"
+
+
+def aggregate_frame(df):
+    """The four count tables of one frame (one groupby over the full key, then roll-ups)."""
+    dt = pd.to_datetime(df['incident_datetime'], errors='coerce')
+    keys = {'date': dt.dt.normalize(), 'year': dt.dt.year.astype('Int16'), 'weekday': dt.dt.dayofweek.astype('Int8'),
+            'hour': dt.dt.hour.astype('Int8')}
+    for col in SOURCE_COLUMNS[1:]:
+        keys[col] = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+    # Group on integer codes (-1 = missing, kept as its own key) and decode the labels at the end
+    codes, labels = {}, {}
+    for col, values in keys.items():
+        codes[col], uniques = pd.factorize(values)
+        labels[col] = pd.array(uniques)
+    full = pd.DataFrame(codes).groupby(list(codes), sort=False).size().rename('count').reset_index()
+    tables = {}
+    for name, cols in TABLE_KEYS.items():
+        table = full.groupby(cols, sort=False)['count'].sum().reset_index()
+        for col in cols:
+            table[col] = labels[col].take(table[col].to_numpy(), allow_fill=True)
+        tables[name] = table
+    return tables
+
+
+def partition_aggregates(root, part, columns=SOURCE_COLUMNS):
+    """Worker: count tables of one store partition (`columns`: the source columns the store has)."""
+    from .store import open_clean_store
+
+    return aggregate_frame(open_clean_store(root).read_partition(part, columns=columns))
+
+
+class AggregateTables:
+    """The materialized tables plus the chart queries over them (None filters = everything)."""
+    def __init__(self, tables, version=None):
+        self.tables = tables
+        self.version = version
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    @property
+    def nbytes(self):
+        return sum(int(t.memory_usage(deep=True).sum()) for t in self.tables.values())
+
+    def _filtered(self, name, years=None, categories=None, districts=None):
+        t = self.tables[name]
+        mask = np.ones(len(t), dtype=bool)
+        if years is not None:
+            year = t['date'].dt.year if 'date' in t.columns else t['year']
+            mask &= (year >= years[0]).fillna(False).to_numpy() & (year <= years[1]).fillna(False).to_numpy()
+        if categories is not None:
+            mask &= t['incident_category'].isin(categories).to_numpy()
+        if districts is not None:
+            mask &= t[DISTRICT_COL].isin(districts).to_numpy()
+        return t[mask]
+
+    def _counts(self, name, by, **filters):
+        t = self._filtered(name, **filters)
+        return t.groupby(by, observed=True)['count'].sum().sort_values(ascending=False).rename('count')
+
+    def category_counts(self, **filters):
+        """`value_counts()` of incident_category."""
+        return self._counts('daily', 'incident_category', **filters)
+
+    def district_counts(self, **filters):
+        return self._counts('daily', DISTRICT_COL, **filters)
+
+    def neighborhood_counts(self, **filters):
+        return self._counts('neighborhood', 'analysis_neighborhood', **filters)
+
+    def monthly_counts(self, **filters):
+        """Incidents per calendar month (timestamps of the month start)."""
+        t = self._filtered('daily', **filters)
+        counts = t.groupby(t['date'].dt.to_period('M'))['count'].sum()
+        counts.index = counts.index.to_timestamp()
+        return counts
+
+    def weekday_counts(self, **filters):
+        """Incidents per day of the week, Monday first."""
+        counts = self._filtered('hourly', **filters).groupby('weekday')['count'].sum()
+        return pd.Series([int(counts.get(d, 0)) for d in range(7)], index=DAYS_OF_WEEK, name='count')
+
+    def hourly_counts(self, **filters):
+        """Incidents per hour of the day (0-23, hours without incidents omitted)."""
+        counts = self._filtered('hourly', **filters).groupby('hour')['count'].sum()
+        counts.index = counts.index.astype(int)
+        return counts
+
+    def top_pairs(self, n_districts=5, n_categories=5, **filters):
+        """(district x category) counts for the top districts and categories (the district comparison)."""
+        t = self._filtered('daily', **filters)
+        districts = t.groupby(DISTRICT_COL)['count'].sum().nlargest(n_districts).index
+        categories = t.groupby('incident_category')['count'].sum().nlargest(n_categories).index
+        t = t[t[DISTRICT_COL].isin(districts) & t['incident_category'].isin(categories)]
+        grid = t.pivot_table(index=DISTRICT_COL, columns='incident_category', values='count', aggfunc='sum')
+        return grid.reindex(index=districts, columns=categories).fillna(0).astype(np.int64)
+
+    def subcategory_counts(self, top_categories=15, **filters):
+        """(category, subcategory, count) rows for the `top_categories` largest categories (the treemap)."""
+        t = self._filtered('subcategory', **filters)
+        top = t.groupby('incident_category')['count'].sum().nlargest(top_categories).index
+        t = t[t['incident_category'].isin(top)]
+        return t.groupby(['incident_category', 'incident_subcategory'])['count'].sum().reset_index()
+
+
+# -----------------------------
+# Materialization
+# -----------------------------
+def refresh_aggregates(store=None, root=AGGREGATES_DIR, max_workers=None, verbose=True):
+    """
+    Bring the tables in `root` up to the store's version: only partitions written since the last
+    refresh are re-aggregated, then the per-partition tables are concatenated and rewritten.
+    """
+    from .store import open_clean_store
+
+    t0 = time.perf_counter()
+    store = store or open_clean_store()
+    columns = [c for c in SOURCE_COLUMNS if c in store.dataset().schema.names]
+    with span("aggregates.partitions") as step:
+        results, stale = store.map_partitions(partition_aggregates, (columns,),
+                                              cache_path=os.path.join(root, _PARTITION_CACHE),
+                                              cache_key=TABLE_KEYS, max_workers=max_workers)
+        step.attrs["stale"] = len(stale)
+    os.makedirs(root, exist_ok=True)
+    tables = {}
+    for name, cols in TABLE_KEYS.items():
+        frames = [r[name] for r in results.values() if len(r[name])]
+        table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=cols + ['count'])
+        if 'date' not in cols:
+            # Year-keyed tables: fold the months of each year together
+            table = table.groupby(cols, dropna=False, sort=False)['count'].sum().reset_index()
+        tmp = os.path.join(root, f"{name}.parquet.tmp")
+        table.to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(root, f"{name}.parquet"))
+        tables[name] = table
+    tmp = os.path.join(root, _MANIFEST + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump({"version": store.version, "store": store.identity, "tables": {n: len(t) for n, t in tables.items()},
+                   "refreshed_at": time.time()}, fh, indent=2)
+    os.replace(tmp, os.path.join(root, _MANIFEST))
+    if verbose:
+        rows = ", ".join(f"{n} {len(t):,}" for n, t in tables.items())
+        print(f"Aggregates refreshed ✅ {len(stale)} of {len(results)} partitions, rows: {rows} "
+              f"({time.perf_counter() - t0:.1f}s, store version {store.version})")
+    return _categorize(tables, store.version)
+
+
+def _categorize(tables, version):
+    for table in tables.values():
+        for col in table.columns:
+            if table[col].dtype == object or pd.api.types.is_string_dtype(table[col].dtype):
+                table[col] = table[col].astype('category')
+    return AggregateTables(tables, version)
+
+
+def load_aggregates(store=None, root=AGGREGATES_DIR, refresh=True):
+    """The materialized tables; refreshed first when they are older than the store or
+    were built from another one (unless `refresh=False`)."""
+    from .store import open_clean_store
+
+    store = store or open_clean_store()
+    path = os.path.join(root, _MANIFEST)
+    version, identity = None, None
+    if os.path.exists(path):
+        with open(path) as fh:
+            manifest = json.load(fh)
+        version, identity = manifest["version"], manifest.get("store")
+    if (version != store.version or identity != store.identity) and refresh:
+        return refresh_aggregates(store, root, verbose=False)
+    if version is None:
+        raise FileNotFoundError(f"no aggregate tables in {root}; run `python -m sfcrime.aggregates`")
+    return _categorize({name: pd.read_parquet(os.path.join(root, f"{name}.parquet")) for name in TABLE_KEYS},
+                       version)
+
+
+# -----------------------------
+# Charts (the notebook's EDA figures, from the tables)
+# -----------------------------
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    return plt, sns
+
+
+# Each chart takes the small series / frame it draws (see CHARTS), so it can be rendered in a worker process
+def plot_category_distribution(top):
+    plt, sns = _pyplot()
+    fig = plt.figure(figsize=(12, 8))
+    sns.barplot(y=top.index.astype(str), x=top.values, hue=top.index.astype(str), palette='viridis', legend=False)
+    plt.title('Top 10 Most Common Incident Categories', fontsize=16)
+    plt.xlabel('Number of Incidents', fontsize=12)
+    plt.ylabel('Incident Category', fontsize=12)
+    return fig
+
+
+def plot_monthly_trend(monthly):
+    plt, sns = _pyplot()
+    fig = plt.figure(figsize=(14, 7))
+    sns.lineplot(x=monthly.index, y=monthly.values)
+    plt.title('Total Incidents Reported per Month (2018-Present)', fontsize=16)
+    plt.xlabel('Date', fontsize=12)
+    plt.ylabel('Number of Incidents', fontsize=12)
+    return fig
+
+
+def plot_day_of_week(counts):
+    plt, sns = _pyplot()
+    fig = plt.figure(figsize=(10, 6))
+    sns.barplot(x=counts.index, y=counts.values, hue=counts.index, palette='plasma', legend=False)
+    plt.title('Number of Incidents by Day of the Week', fontsize=16)
+    plt.xlabel('Day of the Week', fontsize=12)
+    plt.ylabel('Number of Incidents', fontsize=12)
+    plt.xticks(rotation=45)
+    return fig
+
+
+def plot_hourly_pattern(hourly):
+    plt, sns = _pyplot()
+    fig = plt.figure(figsize=(12, 6))
+    sns.lineplot(x=hourly.index, y=hourly.values, marker='o')
+    plt.title('Incidents by Hour of the Day', fontsize=16)
+    plt.xlabel('Hour of the Day', fontsize=12)
+    plt.ylabel('Number of Incidents', fontsize=12)
+    plt.xticks(np.arange(0, 24, 1))
+    plt.grid(True, which='both', linestyle='--', linewidth=0.5)
+    return fig
+
+
+def plot_neighborhood_hotspots(top):
+    plt, sns = _pyplot()
+    fig = plt.figure(figsize=(12, 8))
+    sns.barplot(y=top.index.astype(str), x=top.values, hue=top.index.astype(str), palette='cubehelix',
+                legend=False)
+    plt.title('Top 10 Neighborhoods by Incident Count', fontsize=16)
+    plt.xlabel('Number of Incidents', fontsize=12)
+    plt.ylabel('Neighborhood', fontsize=12)
+    return fig
+
+
+def plot_district_comparison(grid):
+    plt, sns = _pyplot()
+    long = grid.stack().rename('count').reset_index()
+    fig = plt.figure(figsize=(15, 8))
+    sns.barplot(x=DISTRICT_COL, y='count', hue='incident_category', data=long, order=list(grid.index),
+                hue_order=list(grid.columns), palette='husl')
+    plt.title('Top 5 Incident Types in Top 5 Police Districts', fontsize=16)
+    plt.xlabel('Police District', fontsize=12)
+    plt.ylabel('Number of Incidents', fontsize=12)
+    plt.legend(title='Incident Category')
+    return fig
+
+
+def treemap_figure(tables, top_categories=15, **filters):
+    """The notebook's plotly treemap of categories and subcategories."""
+    import plotly.express as px
+
+    data = tables.subcategory_counts(top_categories, **filters)
+    return px.treemap(data, path=['incident_category', 'incident_subcategory'], values='count',
+                      title='Hierarchical View of Incident Categories and Subcategories',
+                      color_continuous_scale='YlOrRd')
+
+
+def overview_figures(cube, years=None, categories=None, districts=None):
+    """Dashboard key statistics, monthly trend and district bars for one filter (slices of the cube)."""
+    import plotly.express as px
+
+    with span("dashboard.filter") as step:
+        view = cube.query(years=years, categories=categories, districts=districts)
+        step.rows_out = int(view.total)
+    with span("dashboard.aggregate"):
+        stats = {'total': view.total, 'daily_average': view.daily_average, 'top_category': view.top_category}
+        trend_data = view.monthly().rename_axis('Date').reset_index()
+        district_data = view.by_district().rename_axis('District').reset_index()
+    with span("dashboard.render", rows_in=len(trend_data) + len(district_data)):
+        fig_time = px.line(trend_data, x='Date', y='Incidents', title='Monthly Crime Incidents Trend')
+        fig_district = px.bar(district_data, x='District', y='Incidents', title='Total Incidents by District')
+    return stats, fig_time, fig_district
+
+
+def detail_figures(cube, tables, years=None, categories=None, districts=None):
+    """Dashboard hourly pattern and category treemap for one filter."""
+    import plotly.express as px
+
+    with span("dashboard.aggregate"):
+        hours = cube.hour_profile(years=years, categories=categories, districts=districts).sum()
+    with span("dashboard.render", rows_in=len(hours)):
+        fig_hour = px.line(hours.rename_axis('Hour').reset_index(name='Incidents'), x='Hour', y='Incidents',
+                           markers=True, title='Incidents by Hour of the Day')
+    # The treemap aggregates its own (subcategory) table, so it gets one span of its own
+    with span("dashboard.treemap"):
+        fig_treemap = treemap_figure(tables, years=years, categories=categories, districts=districts)
+    return fig_hour, fig_treemap
+
+
+# name -> (data drawn from the tables, chart, caption)
+CHARTS = {
+    'crime_type_distribution': (lambda t: t.category_counts().nlargest(10), plot_category_distribution,
+                                'Top 10 Most Common Incident Categories'),
+    'monthly_trend': (lambda t: t.monthly_counts(), plot_monthly_trend, 'Total Incidents Reported per Month'),
+    'day_of_week': (lambda t: t.weekday_counts(), plot_day_of_week, 'Number of Incidents by Day of the Week'),
+    'hourly_pattern': (lambda t: t.hourly_counts(), plot_hourly_pattern, 'Incidents by Hour of the Day'),
+    'neighborhood_hotspots': (lambda t: t.neighborhood_counts().nlargest(10), plot_neighborhood_hotspots,
+                              'Top 10 Neighborhoods by Incident Count'),
+    'district_comparison': (lambda t: t.top_pairs(), plot_district_comparison,
+                            'Top 5 Incident Types in Top 5 Police Districts'),
+}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh the materialized count tables and the EDA charts")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--publish", action="store_true", help="publish the EDA chart artifacts")
+    args = parser.parse_args()
+
+    from .store import open_clean_store
+
+    store = open_clean_store()
+    tables = refresh_aggregates(store, max_workers=args.workers)
+    print(f"Tables in memory: {tables.nbytes / 1e6:.1f} MB")
+    if args.publish:
+        from .report import render_report
+
+        # Only the charts whose numbers changed are re-drawn
+        render_report(store, names=list(CHARTS), max_workers=args.workers)
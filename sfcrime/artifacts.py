@@ -0,0 +1,167 @@
+"""
+Versioned artifact directory for the report and model images shown by the app.
+
+The Streamlit app used to `os.path.exists` hardcoded PNGs in the repository
+root (`kmeans_cluster_map.png`, `svm_decision_boundary.png`, ...), so an image
+could silently go stale relative to the data and models it describes. Here
+each artifact is published under its own name with a monotonically increasing
+version, and a manifest records which file is current plus the store version
+it was built from:
+
+    data/artifacts/
+        _manifest.json                   {"version": 7, "artifacts": {name: entry}}
+        kmeans_cluster_map/v0000007.png
+        svm_decision_boundary/v0000005.png
+
+Readers only ever follow the manifest, which is replaced atomically, so a
+publish never exposes a half-written image. Older versions are pruned.
+
+Usage:
+    store = ArtifactStore()
+    store.publish("kmeans_cluster_map", figure=fig, caption="K-Means Cluster Map", data_version=12)
+    store.path("kmeans_cluster_map")        # current file, or None
+    python -m sfcrime.artifacts --import-legacy   # adopt the PNGs in the repository root
+"""
+import io
+import json
+import os
+import shutil
+import time
+
+from .config import ARTIFACT_DIR
+
+MANIFEST = "_manifest.json"
+
+# Images the notebooks wrote to the repository root, in the order the app shows them
+LEGACY_IMAGES = [
+    "coorelation_heatmap", "coorelation_heatmap_cleaned", "outliers_boxplot", "qqplots",
+    "crime_type_distribution", "monthly_trend", "day_of_week", "hourly_pattern",
+    "neighborhood_hotspots", "district_comparison", "wordcloud", "apriori_scatter_plot",
+    "kmeans_elbow_plot", "kmeans_cluster_map", "svm_decision_boundary",
+]
+
+
+class ArtifactStore:
+    """
+    Directory of named, versioned artifacts plus a manifest.
+    - root: artifact directory (created on first publish)
+    - keep: number of versions kept per artifact
+    """
+    def __init__(self, root=ARTIFACT_DIR, keep=3):
+        self.root = root
+        self.keep = keep
+
+    # -----------------------------
+    # Manifest
+    # -----------------------------
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST)
+
+    @property
+    def manifest(self):
+        # Re-read every time: the app and the pipeline publish from different processes
+        if not os.path.exists(self.manifest_path):
+            return {"version": 0, "artifacts": {}}
+        with open(self.manifest_path) as fh:
+            return json.load(fh)
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    def names(self):
+        return sorted(self.manifest["artifacts"])
+
+    def entry(self, name):
+        """Manifest entry of the current version of `name` (file, version, caption, data_version, created_at)."""
+        return self.manifest["artifacts"].get(name)
+
+    def path(self, name):
+        entry = self.entry(name)
+        if entry is None:
+            return None
+        path = os.path.join(self.root, entry["file"])
+        return path if os.path.exists(path) else None
+
+    # -----------------------------
+    # Publish
+    # -----------------------------
+    def publish(self, name, src=None, data=None, figure=None, caption=None, data_version=None,
+                ext=".png", meta=None):
+        """
+        Write a new version of `name` from exactly one of:
+        - src: path of an existing file (copied)
+        - data: bytes
+        - figure: matplotlib figure (saved with `bbox_inches="tight"`)
+        Returns the new manifest entry.
+        """
+        if sum(x is not None for x in (src, data, figure)) != 1:
+            raise ValueError("publish() needs exactly one of src, data or figure")
+        manifest = self.manifest
+        version = manifest["version"] + 1
+        if src is not None:
+            ext = os.path.splitext(src)[1] or ext
+        rel = f"{name}/v{version:07d}{ext}"
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp = path + ".tmp"
+        if src is not None:
+            shutil.copyfile(src, tmp)
+        else:
+            if figure is not None:
+                buf = io.BytesIO()
+                figure.savefig(buf, format=ext.lstrip("."), bbox_inches="tight")
+                data = buf.getvalue()
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+        os.replace(tmp, path)
+
+        entry = {"file": rel, "version": version, "caption": caption,
+                 "data_version": data_version, "created_at": time.time()}
+        if meta:
+            entry["meta"] = meta
+        manifest["version"] = version
+        manifest["artifacts"][name] = entry
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+        self._prune(name)
+        return entry
+
+    def _prune(self, name):
+        adir = os.path.join(self.root, name)
+        files = sorted(f for f in os.listdir(adir) if f.startswith("v") and not f.endswith(".tmp"))
+        for old in files[:-self.keep]:
+            os.remove(os.path.join(adir, old))
+
+
+def import_legacy(store=None, src_dir=".", names=LEGACY_IMAGES, verbose=True):
+    """Publish the repository-root PNGs that are not in the store yet."""
+    store = store or ArtifactStore()
+    published = []
+    for name in names:
+        src = os.path.join(src_dir, f"{name}.png")
+        if store.entry(name) is None and os.path.exists(src):
+            store.publish(name, src=src, meta={"source": "legacy"})
+            published.append(name)
+    if verbose:
+        print(f"Imported {len(published)} legacy images into {store.root} ✅")
+    return published
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or populate the versioned artifact directory")
+    parser.add_argument("--import-legacy", action="store_true", help="publish the PNGs in the repository root")
+    args = parser.parse_args()
+    store = ArtifactStore()
+    if args.import_legacy:
+        import_legacy(store)
+    for name in store.names():
+        entry = store.entry(name)
+        print(f"{name:32s} v{entry['version']:<5d} data_version={entry['data_version']} "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['created_at']))}")
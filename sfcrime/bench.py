@@ -0,0 +1,579 @@
+"""
+Reproducible benchmarks of the pipeline stages.
+
+Apart from the `import time` around the notebook's LightGBM fit and comments
+such as "add the low_memory flag to reduce RAM usage", there is no record of
+how long a stage takes or how much memory it uses. This module runs each
+stage on `sfcrime.synthetic` data, which is deterministic for a given
+(rows, seed), and measures every step:
+
+- `ingest`: pages fetched from a local `StubSodaServer` with `fetch_all` and
+  parsed back, then the upsert of all rows into a raw store
+- `clean`: `clean_store_from_raw` (two-pass streaming clean into the
+  partitioned store)
+- `apriori`: district-day basket from the store, itemsets, rules
+- `kmeans`: the geographic k sweep (`sweep_k`, k = 2..10)
+- `svm`: `KernelSGDClassifier` fit and evaluation
+- `boosting`: response frame, target encoding + scaling (`prepare`), then
+  XGBoost and LightGBM fit / predict with the notebooks' best parameters
+- `dashboard`: count-table refresh, cube build, and the dashboard's
+  filter-to-figure path (`overview_figures` + `detail_figures`) over a fixed
+  set of random filters, reported as latency percentiles; then the
+  memory-mapped snapshot write and its hotspot query over the same filters
+
+Each step records wall time, rows in / out, resident memory at the start,
+the peak RSS sampled while it runs, and optionally the Python-heap peak from
+`tracemalloc`. Results are written as JSON together with the environment
+(git commit, library versions, CPU count), and `--compare` reports the steps
+that got slower or bigger than a previous run.
+
+Usage:
+    python -m sfcrime.bench --rows 100000 1000000              # data/bench/bench-<time>.json
+    python -m sfcrime.bench --rows 100000 --stages clean apriori --compare latest
+    runs = [run_benchmarks(100_000, stages=['dashboard'])]
+"""
+import importlib.metadata
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR, DISTRICT_COL, MODEL_NUMERIC_COLS
+from .telemetry import current_rss, max_rss
+
+BENCH_DIR = os.path.join(DATA_DIR, "bench")
+STAGES = ['ingest', 'clean', 'apriori', 'kmeans', 'svm', 'boosting', 'dashboard']
+# Stages that read the cleaned store need the raw rows and the clean before them
+PREREQUISITES = {'clean': ['ingest'], 'apriori': ['ingest', 'clean'], 'kmeans': ['ingest', 'clean'],
+                 'svm': ['ingest', 'clean'], 'boosting': ['ingest', 'clean'], 'dashboard': ['ingest', 'clean']}
+# Rows served by the stub server (every row is held as a JSON dict in memory)
+INGEST_ROWS = 200_000
+DASHBOARD_FILTERS = 50
+# A step is flagged when it is this many times slower (or its peak RSS this much larger) than the baseline
+REGRESSION_RATIO = 1.25
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.05
+MIN_RSS_MB = 16.0
+VERSIONED_PACKAGES = ['numpy', 'pandas', 'pyarrow', 'scikit-learn', 'xgboost', 'lightgbm', 'plotly', 'streamlit']
+
+
+# -----------------------------
+# Memory
+# -----------------------------
+class RssSampler:
+    """
+    Peak RSS between `start` and `stop`, sampled by a background thread. The
+    kernel only keeps a lifetime peak, so a per-step peak has to be sampled;
+    without /proc the lifetime `ru_maxrss` is reported instead.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_rss = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.start_rss = current_rss()
+        self.peak = self.start_rss
+        if self.start_rss is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        else:
+            self.peak = max_rss()
+        return self.start_rss, self.peak
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def _mb(nbytes):
+    return None if nbytes is None else round(nbytes / 2 ** 20, 1)
+
+
+@dataclass
+class StepResult:
+    stage: str
+    step: str
+    rows_in: int = 0
+    rows_out: int = 0
+    seconds: float = 0.0
+    rss_start_mb: float = None
+    peak_rss_mb: float = None
+    python_peak_mb: float = None
+    children_peak_rss_mb: float = None
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def name(self):
+        return f"{self.stage}.{self.step}"
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_in / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def rss_growth_mb(self):
+        if self.peak_rss_mb is None or self.rss_start_mb is None:
+            return None
+        return round(self.peak_rss_mb - self.rss_start_mb, 1)
+
+    def to_dict(self):
+        return {**asdict(self), 'name': self.name, 'rows_per_sec': round(self.rows_per_sec, 1),
+                'rss_growth_mb': self.rss_growth_mb}
+
+
+class Bench:
+    """
+    Collects `StepResult`s.
+    - trace_python: also record the Python-heap peak with `tracemalloc` (numpy and pandas
+      buffers included); this slows pure-Python code down noticeably
+    """
+    def __init__(self, trace_python=False, verbose=True):
+        self.trace_python = trace_python
+        self.verbose = verbose
+        self.steps = []
+
+    @contextmanager
+    def measure(self, stage, step, rows_in=0):
+        """Time and memory-profile the block; set `rows_out` / `extra` on the yielded result."""
+        result = StepResult(stage, step, rows_in=int(rows_in))
+        children_before = max_rss(resource.RUSAGE_CHILDREN)
+        if self.trace_python:
+            tracemalloc.start()
+        sampler = RssSampler().start()
+        t0 = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result.seconds = round(time.perf_counter() - t0, 4)
+            start, peak = sampler.stop()
+            result.rss_start_mb, result.peak_rss_mb = _mb(start), _mb(peak)
+            if self.trace_python:
+                result.python_peak_mb = _mb(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            children_after = max_rss(resource.RUSAGE_CHILDREN)
+            if children_after > children_before:
+                result.children_peak_rss_mb = _mb(children_after)
+            self.steps.append(result)
+            if self.verbose:
+                growth = result.rss_growth_mb
+                print(f"  {result.name:<28} {result.seconds:>9.3f}s  {result.rows_in:>11,} rows in  "
+                      f"{result.rows_per_sec:>12,.0f} rows/s  peak {result.peak_rss_mb} MB"
+                      + (f" (+{growth} MB)" if growth is not None else ""))
+
+
+@dataclass
+class BenchContext:
+    """State threaded through the stages of one run."""
+    n_rows: int
+    seed: int
+    work_dir: str
+    ingest_rows: int = INGEST_ROWS
+    dashboard_filters: int = DASHBOARD_FILTERS
+    max_workers: int = None
+    chunk_files: list = field(default_factory=list)
+    raw_store: object = None
+    clean_store: object = None
+
+    def path(self, *parts):
+        return os.path.join(self.work_dir, *parts)
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+def generate(bench, ctx):
+    """Synthetic raw chunks, written once to parquet so later steps do not time the generator."""
+    from .synthetic import synthetic_chunks
+
+    os.makedirs(ctx.path("synthetic"), exist_ok=True)
+    with bench.measure('synthetic', 'generate', ctx.n_rows) as step:
+        for i, chunk in enumerate(synthetic_chunks(ctx.n_rows, ctx.seed)):
+            path = ctx.path("synthetic", f"chunk_{i:05d}.parquet")
+            chunk.to_parquet(path, index=False)
+            ctx.chunk_files.append(path)
+            step.rows_out += len(chunk)
+        step.extra['chunks'] = len(ctx.chunk_files)
+
+
+def _head_rows(files, n_rows):
+    frames, total = [], 0
+    for path in files:
+        if total >= n_rows:
+            break
+        df = pd.read_parquet(path)
+        frames.append(df.head(n_rows - total))
+        total += len(frames[-1])
+    return pd.concat(frames, ignore_index=True)
+
+
+def stage_ingest(bench, ctx):
+    from .ingest import fetch_all, iter_pages
+    from .store import open_raw_store
+    from .stub_server import StubSodaServer
+    from .synthetic import soda_records
+
+    records = soda_records(_head_rows(ctx.chunk_files, min(ctx.ingest_rows, ctx.n_rows)))
+    pages_dir = ctx.path("pages")
+    with StubSodaServer(records) as server:
+        with bench.measure('ingest', 'stub_fetch', len(records)) as step:
+            stats = fetch_all(server.url, pages_dir, max_workers=ctx.max_workers or 8, resume=False, verbose=False)
+            step.rows_out = sum(len(page) for page in iter_pages(pages_dir))
+            step.extra.update(pages=stats.pages, megabytes=round(stats.bytes / 1e6, 1), retries=stats.retries,
+                              fetch_seconds=round(stats.seconds, 4))
+    del records
+    shutil.rmtree(pages_dir, ignore_errors=True)
+
+    ctx.raw_store = open_raw_store(ctx.path("incidents_raw"))
+    with bench.measure('ingest', 'raw_upsert', ctx.n_rows) as step:
+        for path in ctx.chunk_files:
+            ctx.raw_store.upsert(pd.read_parquet(path))
+        step.rows_out = sum(ctx.raw_store.partition_info(p)['rows'] for p in ctx.raw_store.partitions())
+        step.extra['partitions'] = len(ctx.raw_store.partitions())
+
+
+def stage_clean(bench, ctx):
+    from .cleaning import clean_store_from_raw
+    from .store import open_clean_store
+
+    ctx.clean_store = open_clean_store(ctx.path("incidents"))
+    rows_in = sum(ctx.raw_store.partition_info(p)['rows'] for p in ctx.raw_store.partitions())
+    with bench.measure('clean', 'stream_clean', rows_in) as step:
+        report = clean_store_from_raw(ctx.raw_store, ctx.clean_store, verbose=False)
+        step.rows_out = report.rows_out
+        step.extra.update(dropped_missing=report.dropped_missing, dropped_duplicates=report.dropped_duplicates,
+                          dropped_outliers=report.dropped_outliers)
+
+
+def _clean_rows(ctx):
+    return sum(ctx.clean_store.partition_info(p)['rows'] for p in ctx.clean_store.partitions())
+
+
+def stage_apriori(bench, ctx):
+    from .mining import basket_from_store, frequent_itemsets, rules_frame
+
+    with bench.measure('apriori', 'basket', _clean_rows(ctx)) as step:
+        basket = basket_from_store(ctx.clean_store)
+        step.rows_out = basket.n_transactions
+        step.extra['items'] = len(basket.items)
+    with bench.measure('apriori', 'itemsets', basket.n_transactions) as step:
+        itemsets = frequent_itemsets(basket, min_support=0.01)
+        step.rows_out = len(itemsets)
+    with bench.measure('apriori', 'rules', len(itemsets)) as step:
+        step.rows_out = len(rules_frame(basket, itemsets))
+
+
+def stage_kmeans(bench, ctx):
+    from .clustering import StoreBatches, sweep_k
+
+    with bench.measure('kmeans', 'sweep_k', _clean_rows(ctx)) as step:
+        results, _ = sweep_k(StoreBatches(ctx.clean_store.root), k_values=range(2, 11), max_workers=ctx.max_workers,
+                             verbose=False)
+        step.rows_out = len(results)
+        step.extra['inertia'] = {r.k: round(r.inertia, 3) for r in results}
+
+
+def stage_svm(bench, ctx):
+    from .classify import KernelSGDClassifier
+
+    columns = MODEL_NUMERIC_COLS + [DISTRICT_COL]
+    chunks = lambda: ctx.clean_store.iter_frames(columns=columns)  # noqa: E731
+    rows = _clean_rows(ctx)
+    with bench.measure('svm', 'fit', rows) as step:
+        model = KernelSGDClassifier().fit(chunks, verbose=False)
+        step.extra['pca_components'] = int(model.n_pca_)
+    with bench.measure('svm', 'evaluate', rows) as step:
+        result = model.evaluate(chunks)
+        step.rows_out = result.n_test
+        step.extra['accuracy'] = round(result.accuracy, 4)
+
+
+def stage_boosting(bench, ctx):
+    from .response import evaluate, load_response_frame, prepare
+    from .serving import NOTEBOOK_BEST
+    from .tuning import make_estimator
+
+    with bench.measure('boosting', 'response_frame', _clean_rows(ctx)) as step:
+        frame = load_response_frame(ctx.clean_store)
+        step.rows_out = len(frame)
+    with bench.measure('boosting', 'target_encoding', len(frame)) as step:
+        data = prepare(frame)
+        step.rows_out = len(data.X_train_final) + len(data.X_test_final)
+    for kind in ('xgb', 'lgbm'):
+        params, n_estimators = NOTEBOOK_BEST[kind]
+        try:
+            model = make_estimator(kind, params, n_estimators, n_jobs=ctx.max_workers)
+        except ImportError as exc:
+            print(f"  {kind} skipped: {exc}")
+            continue
+        with bench.measure('boosting', f'{kind}_fit', len(data.X_train_final)) as step:
+            model.fit(data.X_train_final, data.y_train_log)
+            step.extra['n_estimators'] = n_estimators
+        with bench.measure('boosting', f'{kind}_predict', len(data.X_test_final)) as step:
+            step.rows_out = len(model.predict(data.X_test_final))
+        step.extra.update({k: round(v, 4) for k, v in evaluate(model, data).items()})
+
+
+def random_filters(cube, n, seed=0):
+    """`n` dashboard filter tuples (year range, categories, districts) drawn like a user would pick them."""
+    rng = np.random.default_rng(seed)
+    years = cube.years
+    filters = []
+    for _ in range(n):
+        lo, hi = sorted(rng.choice(years, 2))
+        n_categories = rng.integers(1, min(6, len(cube.categories)) + 1)
+        categories = tuple(str(c) for c in rng.choice(cube.categories, n_categories, replace=False))
+        n_districts = rng.integers(1, len(cube.districts) + 1)
+        districts = tuple(str(d) for d in rng.choice(cube.districts, n_districts, replace=False))
+        filters.append(((int(lo), int(hi)), categories, districts))
+    return filters
+
+
+def stage_dashboard(bench, ctx):
+    from .aggregates import detail_figures, overview_figures, refresh_aggregates
+    from .cube import CrimeCube
+    from .snapshot import write_snapshot
+
+    with bench.measure('dashboard', 'aggregates', _clean_rows(ctx)) as step:
+        tables = refresh_aggregates(ctx.clean_store, root=ctx.path("aggregates"), max_workers=ctx.max_workers,
+                                    verbose=False)
+        step.rows_out = sum(len(t) for t in tables.tables.values())
+        step.extra['megabytes'] = round(tables.nbytes / 1e6, 2)
+    with bench.measure('dashboard', 'cube', len(tables['daily'])) as step:
+        cube = CrimeCube.from_aggregates(tables['daily'], tables['hourly'])
+        step.extra['megabytes'] = round(cube.nbytes / 1e6, 2)
+    filters = random_filters(cube, ctx.dashboard_filters, ctx.seed)
+    latencies = []
+    with bench.measure('dashboard', 'filter_to_figure', len(filters)) as step:
+        for years, categories, districts in filters:
+            t0 = time.perf_counter()
+            overview_figures(cube, years, categories, districts)
+            detail_figures(cube, tables, years, categories, districts)
+            latencies.append(time.perf_counter() - t0)
+        step.rows_out = len(latencies)
+        ms = np.array(latencies) * 1000
+        # The first filter also pays for the plotly imports and templates
+        step.extra.update(first_ms=round(ms[0], 2), p50_ms=round(float(np.percentile(ms, 50)), 2),
+                          p95_ms=round(float(np.percentile(ms, 95)), 2), max_ms=round(float(ms.max()), 2))
+    with bench.measure('dashboard', 'snapshot', _clean_rows(ctx)) as step:
+        snap = write_snapshot(ctx.clean_store, root=ctx.path("snapshot"), verbose=False)
+        step.rows_out = snap.n
+        step.extra['megabytes'] = round(snap.nbytes / 1e6, 2)
+    latencies = []
+    with bench.measure('dashboard', 'hotspots', len(filters)) as step:
+        for years, categories, districts in filters:
+            t0 = time.perf_counter()
+            snap.top_cells(10, years=years, categories=categories, districts=districts)
+            latencies.append(time.perf_counter() - t0)
+        step.rows_out = len(latencies)
+        ms = np.array(latencies) * 1000
+        step.extra.update(p50_ms=round(float(np.percentile(ms, 50)), 2), p95_ms=round(float(np.percentile(ms, 95)), 2))
+
+
+STAGE_FUNCTIONS = {
+    'ingest': stage_ingest,
+    'clean': stage_clean,
+    'apriori': stage_apriori,
+    'kmeans': stage_kmeans,
+    'svm': stage_svm,
+    'boosting': stage_boosting,
+    'dashboard': stage_dashboard,
+}
+
+
+# -----------------------------
+# Runs
+# -----------------------------
+def resolve_stages(stages):
+    """Requested stages plus their prerequisites, in pipeline order."""
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages: {sorted(unknown)} (choose from {STAGES})")
+    needed = set(stages)
+    for stage in stages:
+        needed.update(PREREQUISITES.get(stage, []))
+    return [s for s in STAGES if s in needed]
+
+
+def run_benchmarks(n_rows, seed=0, stages=STAGES, work_dir=None, ingest_rows=INGEST_ROWS,
+                   dashboard_filters=DASHBOARD_FILTERS, max_workers=None, trace_python=False, keep=False,
+                   verbose=True):
+    """
+    One benchmark run over `n_rows` synthetic incidents.
+    - work_dir: scratch directory for the stores (a temporary one by default; removed unless `keep`)
+    - ingest_rows: rows served by the stub server (the raw upsert always takes all `n_rows`)
+    Returns a JSON-serializable dict with the settings and one entry per step.
+    """
+    stages = resolve_stages(stages)
+    scratch = work_dir or tempfile.mkdtemp(prefix="sfcrime-bench-")
+    ctx = BenchContext(n_rows, seed, scratch, ingest_rows, dashboard_filters, max_workers)
+    bench = Bench(trace_python, verbose)
+    if verbose:
+        print(f"Benchmark: {n_rows:,} rows, seed {seed}, stages {', '.join(stages)}")
+    t0 = time.perf_counter()
+    try:
+        generate(bench, ctx)
+        for stage in stages:
+            STAGE_FUNCTIONS[stage](bench, ctx)
+    finally:
+        if not keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+    seconds = time.perf_counter() - t0
+    if verbose:
+        print(f"Benchmark complete ✅ {n_rows:,} rows in {seconds:.1f}s")
+    return {
+        'rows': n_rows, 'seed': seed, 'stages': stages, 'ingest_rows': min(ingest_rows, n_rows),
+        'dashboard_filters': dashboard_filters, 'max_workers': max_workers, 'seconds': round(seconds, 3),
+        'steps': [s.to_dict() for s in bench.steps],
+    }
+
+
+def _git_commit():
+    # Run in the package's checkout, not the working directory the benchmark was started from
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10, cwd=cwd)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, timeout=30, cwd=cwd)
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+    if commit.returncode != 0:
+        return None, None
+    return commit.stdout.strip(), bool(dirty.stdout.strip())
+
+
+def environment():
+    """What a result depends on besides the code: commit, interpreter, machine and library versions."""
+    commit, dirty = _git_commit()
+    versions = {}
+    for package in VERSIONED_PACKAGES:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_commit': commit, 'git_dirty': dirty,
+        'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(),
+        'cpu_count': os.cpu_count(), 'packages': versions,
+    }
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(results, fh, indent=2, default=str)
+    os.replace(tmp, path)
+    return path
+
+
+def latest_results(bench_dir=BENCH_DIR):
+    """Path of the most recent `bench-*.json` in `bench_dir` (None if there is none)."""
+    if not os.path.isdir(bench_dir):
+        return None
+    files = sorted(f for f in os.listdir(bench_dir) if f.startswith("bench-") and f.endswith(".json"))
+    return os.path.join(bench_dir, files[-1]) if files else None
+
+
+def load_results(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+# -----------------------------
+# Run-over-run comparison
+# -----------------------------
+def compare(results, baseline, ratio=REGRESSION_RATIO):
+    """
+    Step-by-step comparison with a previous results file, matched on (rows, step name).
+    A step regresses when its time or peak RSS grew by more than `ratio` (and by more than
+    the noise floors MIN_SECONDS / MIN_RSS_MB).
+    """
+    previous = {(run['rows'], step['name']): step for run in baseline['runs'] for step in run['steps']}
+    rows = []
+    for run in results['runs']:
+        for step in run['steps']:
+            old = previous.get((run['rows'], step['name']))
+            if old is None:
+                continue
+            time_ratio = step['seconds'] / old['seconds'] if old['seconds'] > 0 else np.nan
+            rss_ratio = (step['peak_rss_mb'] / old['peak_rss_mb']
+                         if step['peak_rss_mb'] and old['peak_rss_mb'] else np.nan)
+            slower = time_ratio > ratio and step['seconds'] - old['seconds'] > MIN_SECONDS
+            bigger = rss_ratio > ratio and step['peak_rss_mb'] - old['peak_rss_mb'] > MIN_RSS_MB
+            rows.append({'rows': run['rows'], 'step': step['name'], 'seconds': step['seconds'],
+                         'baseline_seconds': old['seconds'], 'time_ratio': round(time_ratio, 3),
+                         'peak_rss_mb': step['peak_rss_mb'], 'baseline_peak_rss_mb': old['peak_rss_mb'],
+                         'rss_ratio': round(rss_ratio, 3), 'regression': bool(slower or bigger)})
+    return pd.DataFrame(rows, columns=['rows', 'step', 'seconds', 'baseline_seconds', 'time_ratio', 'peak_rss_mb',
+                                       'baseline_peak_rss_mb', 'rss_ratio', 'regression'])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic incidents")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000],
+                        help="row counts to run, e.g. 100000 1000000 10000000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--ingest-rows", type=int, default=INGEST_ROWS, help="rows served by the stub server")
+    parser.add_argument("--filters", type=int, default=DASHBOARD_FILTERS, help="dashboard filters to time")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--trace-python", action="store_true", help="also record tracemalloc peaks (slower)")
+    parser.add_argument("--work-dir", default=None, help="keep the generated stores here instead of a temp dir")
+    parser.add_argument("--out", default=None, help="results file (default data/bench/bench-<time>.json)")
+    parser.add_argument("--compare", default=None, help="previous results file, or 'latest'")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO, help="regression threshold")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    baseline_path = latest_results() if args.compare == "latest" else args.compare
+    results = {'environment': environment(), 'runs': []}
+    for n_rows in args.rows:
+        work_dir = os.path.join(args.work_dir, f"rows-{n_rows}") if args.work_dir else None
+        results['runs'].append(run_benchmarks(n_rows, args.seed, args.stages, work_dir, args.ingest_rows,
+                                              args.filters, args.workers, args.trace_python,
+                                              keep=args.work_dir is not None))
+    out = args.out or os.path.join(BENCH_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    print(f"Results saved to {save_results(results, out)}")
+
+    if baseline_path:
+        table = compare(results, load_results(baseline_path), args.ratio)
+        print(f"\nCompared with {baseline_path}:")
+        print(table.to_string(index=False) if len(table) else "no steps in common")
+        regressions = table[table['regression']]
+        if len(regressions):
+            print(f"⚠️ {len(regressions)} regressed step(s): {', '.join(regressions['step'])}")
+            if args.fail_on_regression:
+                sys.exit(1)
@@ -0,0 +1,368 @@
+"""
+Scalable police-district classifier (the notebooks' SVM task).
+
+The notebook standardizes the numeric columns, keeps the PCA components that
+explain 95% of the variance and trains `SVC(kernel='rbf', C=1.0)` to predict
+`police_district`. Exact kernel SVC training is super-linear in the number of
+rows and prediction touches every support vector, so it only runs on a
+subsample. `KernelSGDClassifier` keeps the same model family and makes every
+stage streaming:
+
+- standardization + PCA truncated to 95% explained variance come from a
+  `sfcrime.features.FeatureTransform` (the shared one fitted once per data
+  version, or one fitted in the first pass), which also collects the label
+  set and a reservoir sample
+- the RBF kernel is approximated by an explicit feature map (random Fourier
+  features, or Nystroem on the sample) with SVC's `gamma='scale'`
+- a linear SVM (`SGDClassifier(loss='hinge')`) is trained with `partial_fit`
+  over the chunks for a few epochs
+
+Training is linear in the number of rows. Prediction is one matrix product
+per batch. The train/test split is a hash of `incident_id` (20% test), so
+every pass sees the same split without holding it in memory.
+
+Usage:
+    model = KernelSGDClassifier().fit(chunks)          # chunks: () -> iterable of DataFrames
+    result = model.evaluate(chunks)                   # report text/dict, confusion matrix, accuracy
+    fig = model.plot_decision_boundary(sample_df)     # svm_decision_boundary.png
+    benchmark_vs_svc(frame)                           # accuracy and time vs exact SVC
+    python -m sfcrime.classify --publish
+"""
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import classification_report, confusion_matrix
+
+from .config import DISTRICT_COL, MODEL_NUMERIC_COLS
+from .features import FeatureTransform
+from .telemetry import instrumented, span
+
+# Rows pushed through the kernel map at once (rows x n_components float64)
+KERNEL_BLOCK_ROWS = 8192
+# Kernel feature maps: random Fourier features or Nystroem
+KERNELS = ('rff', 'nystroem')
+
+
+def test_mask(ids, test_fraction=0.2):
+    """Deterministic train/test split from a multiplicative hash of the ids."""
+    h = (np.asarray(ids, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+    return h < np.uint64(int(test_fraction * 2 ** 32))
+
+
+@dataclass
+class Evaluation:
+    accuracy: float
+    report: str
+    report_dict: dict
+    confusion: np.ndarray
+    labels: list
+    n_test: int
+    seconds: float
+
+
+class KernelSGDClassifier:
+    """
+    Approximate RBF-kernel SVM trained chunk by chunk.
+    - features / target: input columns and the label column
+    - kernel: 'rff' (random Fourier features) or 'nystroem'
+    - n_components: size of the kernel feature map
+    - gamma: RBF width; None = SVC's 'scale' (1 / (n_features * X.var()))
+    - variance: PCA explained-variance threshold (the notebook's n_components=0.95)
+    - alpha / epochs: SGD regularization and passes over the training rows
+    - transform: fitted `FeatureTransform` to reuse (None = fit one on the training rows)
+    """
+    def __init__(self, features=MODEL_NUMERIC_COLS, target=DISTRICT_COL, kernel='rff', n_components=500,
+                 gamma=None, variance=0.95, alpha=1e-5, epochs=2, test_fraction=0.2, id_col='incident_id',
+                 sample_size=20_000, seed=42, transform=None):
+        if kernel not in KERNELS:
+            raise ValueError(f"unknown kernel {kernel!r} (choose from {KERNELS})")
+        self.features = list(features)
+        self.target = target
+        self.kernel = kernel
+        self.n_components = n_components
+        self.gamma = gamma
+        self.variance = variance
+        self.alpha = alpha
+        self.epochs = epochs
+        self.test_fraction = test_fraction
+        self.id_col = id_col
+        self.sample_size = sample_size
+        self.seed = seed
+        self.transform = transform
+
+    # -----------------------------
+    # Fitting
+    # -----------------------------
+    def _split(self, df, test):
+        mask = test_mask(df[self.id_col].to_numpy(), self.test_fraction)
+        return df[mask if test else ~mask]
+
+    def _X(self, df):
+        return df[self.features].to_numpy(dtype=np.float64)
+
+    @instrumented("svm.fit")
+    def fit(self, chunks, verbose=True):
+        """`chunks`: zero-argument callable returning an iterable of DataFrames (e.g. `store.iter_frames`)."""
+        t0 = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+
+        # Pass 1: standardization + PCA (unless a fitted transform was given), classes, reservoir sample
+        with span("svm.scan", rows_in=0) as step:
+            transform = self.transform if self.transform is not None else FeatureTransform(self.features, self.variance)
+            classes, sample, keys = set(), None, None
+            for df in chunks():
+                df = self._split(df, test=False)
+                if df.empty:
+                    continue
+                X = self._X(df)
+                step.rows_in += len(X)
+                if self.transform is None:
+                    transform.partial_fit(X)
+                classes.update(df[self.target].dropna().unique())
+                k = rng.random(len(X))
+                sample = X if sample is None else np.vstack([sample, X])
+                keys = k if keys is None else np.concatenate([keys, k])
+                if len(keys) > self.sample_size:
+                    keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+                    sample, keys = sample[keep], keys[keep]
+            self.classes_ = np.array(sorted(classes), dtype=object)
+            self.transform_ = transform
+            self.n_pca_ = transform.n_components_
+            self.explained_variance_ratio_ = transform.explained_variance_ratio_[:self.n_pca_]
+            step.attrs['sample_rows'] = len(sample) if sample is not None else 0
+
+        # Kernel feature map, with gamma='scale' measured on the sample
+        Z = self._pca(sample)
+        gamma = self.gamma if self.gamma is not None else 1.0 / (Z.shape[1] * Z.var())
+        self.gamma_ = float(gamma)
+        if self.kernel == 'nystroem':
+            self.feature_map_ = Nystroem(gamma=gamma, n_components=min(self.n_components, len(Z)),
+                                         random_state=self.seed).fit(Z)
+        else:
+            self.feature_map_ = RBFSampler(gamma=gamma, n_components=self.n_components, random_state=self.seed).fit(Z)
+
+        # Passes 2+: linear SVM on the kernel features
+        with span("svm.sgd", epochs=self.epochs) as step:
+            self.model_ = SGDClassifier(loss='hinge', alpha=self.alpha, n_jobs=-1, random_state=self.seed)
+            self.n_train_ = 0
+            for epoch in range(self.epochs):
+                for df in chunks():
+                    df = self._split(df, test=False)
+                    df = df[df[self.target].notna()]
+                    if df.empty:
+                        continue
+                    order = rng.permutation(len(df))
+                    X = self._X(df)[order]
+                    y = df[self.target].astype(object).to_numpy()[order]
+                    for start in range(0, len(X), KERNEL_BLOCK_ROWS):
+                        self.model_.partial_fit(self._kernel(X[start:start + KERNEL_BLOCK_ROWS]),
+                                                y[start:start + KERNEL_BLOCK_ROWS], classes=self.classes_)
+                    if epoch == 0:
+                        self.n_train_ += len(df)
+            step.rows_in = step.rows_out = self.n_train_
+        self.fit_seconds_ = time.perf_counter() - t0
+        if verbose:
+            print(f"District classifier trained ✅ {self.n_train_:,} rows, {self.n_pca_} PCA components, "
+                  f"{self.kernel} x {self.n_components} in {self.fit_seconds_:.1f}s")
+        return self
+
+    # -----------------------------
+    # Prediction
+    # -----------------------------
+    def _pca(self, X):
+        return self.transform_.project(X, self.n_pca_)
+
+    def _kernel(self, X):
+        return self.feature_map_.transform(self._pca(X))
+
+    def decision_function(self, df_or_X):
+        X = self._X(df_or_X) if isinstance(df_or_X, pd.DataFrame) else np.asarray(df_or_X, dtype=np.float64)
+        with span("svm.predict", rows_in=len(X)) as step:
+            out = [self.model_.decision_function(self._kernel(X[s:s + KERNEL_BLOCK_ROWS]))
+                   for s in range(0, len(X), KERNEL_BLOCK_ROWS)]
+            step.rows_out = len(X)
+        return np.vstack(out) if out else np.zeros((0, len(self.classes_)))
+
+    def predict(self, df_or_X):
+        return self.classes_[self.decision_function(df_or_X).argmax(axis=1)]
+
+    @instrumented("svm.evaluate")
+    def evaluate(self, chunks):
+        """Classification report and confusion matrix on the hash test split, as in the notebook."""
+        t0 = time.perf_counter()
+        y_true, y_pred = [], []
+        for df in chunks():
+            df = self._split(df, test=True)
+            df = df[df[self.target].notna()]
+            if df.empty:
+                continue
+            y_true.append(df[self.target].astype(object).to_numpy())
+            y_pred.append(self.predict(df))
+        return evaluation(np.concatenate(y_true), np.concatenate(y_pred), list(self.classes_),
+                          time.perf_counter() - t0)
+
+    # -----------------------------
+    # Plots
+    # -----------------------------
+    def decision_grid(self, pc_range, resolution=300):
+        """
+        Predicted class over a PC1 x PC2 grid (other components at 0, i.e. the mean),
+        evaluated as one batched kernel map + matrix product.
+        """
+        (x0, x1), (y0, y1) = pc_range
+        xx, yy = np.meshgrid(np.linspace(x0, x1, resolution), np.linspace(y0, y1, resolution))
+        Z = np.zeros((xx.size, self.n_pca_))
+        Z[:, 0], Z[:, 1] = xx.ravel(), yy.ravel()
+        scores = np.vstack([self.model_.decision_function(self.feature_map_.transform(Z[s:s + KERNEL_BLOCK_ROWS]))
+                            for s in range(0, len(Z), KERNEL_BLOCK_ROWS)])
+        return xx, yy, scores.argmax(axis=1).reshape(xx.shape)
+
+    def plot_decision_boundary(self, sample_df, resolution=300, max_points=3000):
+        """SVM decision regions in PCA space (PC1 vs PC2) with sample points overlaid."""
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        sample_df = sample_df[sample_df[self.target].notna()]
+        if len(sample_df) > max_points:
+            sample_df = sample_df.sample(max_points, random_state=self.seed)
+        P = self._pca(self._X(sample_df))
+        pad = 0.5
+        pc_range = ((P[:, 0].min() - pad, P[:, 0].max() + pad), (P[:, 1].min() - pad, P[:, 1].max() + pad))
+        xx, yy, grid = self.decision_grid(pc_range, resolution)
+        codes = pd.Index(self.classes_).get_indexer(sample_df[self.target].astype(object))
+
+        cmap = plt.get_cmap('tab10', len(self.classes_))
+        fig, ax = plt.subplots(figsize=(12, 9))
+        ax.contourf(xx, yy, grid, levels=np.arange(len(self.classes_) + 1) - 0.5, cmap=cmap, alpha=0.3)
+        ax.scatter(P[:, 0], P[:, 1], c=codes, cmap=cmap, vmin=-0.5, vmax=len(self.classes_) - 0.5,
+                   s=8, edgecolors='k', linewidths=0.2)
+        handles = [plt.Line2D([], [], marker='o', linestyle='', color=cmap(i), label=name)
+                   for i, name in enumerate(self.classes_)]
+        ax.legend(handles=handles, title='Police district', bbox_to_anchor=(1.02, 1), loc='upper left')
+        ax.set_xlabel('Principal Component 1')
+        ax.set_ylabel('Principal Component 2')
+        ax.set_title('SVM Decision Boundary (Slice in PCA Space: PC1 vs PC2)')
+        return fig
+
+
+def evaluation(y_true, y_pred, labels, seconds=0.0):
+    report = classification_report(y_true, y_pred, labels=labels, target_names=labels, zero_division=0)
+    report_dict = classification_report(y_true, y_pred, labels=labels, target_names=labels,
+                                        zero_division=0, output_dict=True)
+    return Evaluation(float(np.mean(y_true == y_pred)), report, report_dict,
+                      confusion_matrix(y_true, y_pred, labels=labels), labels, len(y_true), seconds)
+
+
+def plot_confusion(result, title='Confusion Matrix for SVM (Police District Prediction)'):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    sns.heatmap(result.confusion, annot=True, fmt='d', cmap='Blues',
+                xticklabels=result.labels, yticklabels=result.labels, ax=ax)
+    ax.set_title(title)
+    ax.set_ylabel('True District (Actual)')
+    ax.set_xlabel('Predicted District')
+    return fig
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def benchmark_vs_svc(frame, svc_rows=(5_000, 20_000), max_test_rows=20_000, verbose=True, **model_kwargs):
+    """
+    Exact `SVC(kernel='rbf', C=1.0)` (on the same scaled PCA features) on `svc_rows`
+    training subsamples vs KernelSGDClassifier on the same subsamples and on all
+    training rows of `frame`. All models are scored on the same test rows.
+    Returns a DataFrame: model, train_rows, fit_s, predict_s, accuracy.
+    """
+    from sklearn.svm import SVC
+
+    rows = []
+    test = frame[test_mask(frame[model_kwargs.get('id_col', 'incident_id')].to_numpy(),
+                           model_kwargs.get('test_fraction', 0.2))]
+    test = test[test[model_kwargs.get('target', DISTRICT_COL)].notna()]
+    if len(test) > max_test_rows:
+        test = test.sample(max_test_rows, random_state=0)
+
+    def run(name, train_frame, make):
+        t0 = time.perf_counter()
+        model = make(train_frame)
+        fit_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pred = model.predict(test)
+        rows.append({'model': name, 'train_rows': len(train_frame), 'fit_s': fit_s,
+                     'predict_s': time.perf_counter() - t0,
+                     'accuracy': float(np.mean(pred == test[approx.target].astype(object).to_numpy()))})
+
+    approx = KernelSGDClassifier(**model_kwargs)
+    full_train = frame[~test_mask(frame[approx.id_col].to_numpy(), approx.test_fraction)]
+
+    def make_approx(train_frame):
+        return KernelSGDClassifier(**model_kwargs).fit(lambda: [train_frame], verbose=False)
+
+    class ExactSVC:
+        def __init__(self, train_frame):
+            # Same preprocessing as the approximate model, then the notebook's exact SVC
+            self.prep = KernelSGDClassifier(**{**model_kwargs, 'epochs': 0}).fit(lambda: [train_frame], verbose=False)
+            Z = self.prep._pca(self.prep._X(train_frame))
+            self.svc = SVC(kernel='rbf', C=1.0, random_state=42).fit(Z, train_frame[approx.target].astype(object))
+
+        def predict(self, df):
+            return self.svc.predict(self.prep._pca(self.prep._X(df)))
+
+    for n in svc_rows:
+        sub = full_train.sample(min(n, len(full_train)), random_state=0)
+        run('SVC (exact)', sub, ExactSVC)
+        run('KernelSGD', sub, make_approx)
+    run('KernelSGD', full_train, make_approx)
+
+    result = pd.DataFrame(rows)
+    if verbose:
+        print(result.round(3).to_string(index=False))
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .store import open_clean_store
+
+    parser = argparse.ArgumentParser(description="Train the scalable police-district classifier on the cleaned store")
+    parser.add_argument("--kernel", choices=KERNELS, default="rff")
+    parser.add_argument("--components", type=int, default=500)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--benchmark", action="store_true", help="also compare against exact SVC on subsamples")
+    parser.add_argument("--publish", action="store_true", help="publish svm_decision_boundary and the confusion matrix")
+    args = parser.parse_args()
+
+    from .features import load_or_fit
+
+    store = open_clean_store()
+    columns = MODEL_NUMERIC_COLS + [DISTRICT_COL]
+    chunks = lambda: store.iter_frames(columns=columns)  # noqa: E731
+    model = KernelSGDClassifier(kernel=args.kernel, n_components=args.components, epochs=args.epochs,
+                                transform=load_or_fit(store)).fit(chunks)
+    result = model.evaluate(chunks)
+    print(result.report)
+    print(f"Overall Accuracy: {result.accuracy:.4f}")
+    if args.benchmark:
+        benchmark_vs_svc(store.read(columns=columns), kernel=args.kernel, n_components=args.components)
+    if args.publish:
+        from .artifacts import ArtifactStore
+
+        artifacts = ArtifactStore()
+        sample = next(iter(chunks()))
+        artifacts.publish("svm_decision_boundary", figure=model.plot_decision_boundary(sample),
+                          caption="SVM Decision Boundary (Slice in PCA Space: PC1 vs PC2)",
+                          data_version=store.version)
+        artifacts.publish("svm_confusion_matrix", figure=plot_confusion(result),
+                          caption="Confusion Matrix for SVM (Police District Prediction)",
+                          data_version=store.version, meta={"accuracy": result.accuracy})
@@ -0,0 +1,265 @@
+"""
+Cleaning of raw incident records, as done in the notebooks: drop API-only
+columns, parse datetimes, coerce numeric strings, drop rows with missing
+values and duplicate incident_ids, then remove IQR outliers.
+
+`clean_frame` cleans one in-memory batch. `stream_clean` runs the same
+steps over a chunked source with memory bounded by the chunk size:
+
+- pass 1 cleans rows, dedupes incident_ids with a compact bitmap and feeds
+  every IQR column into a quantile sketch, so all bounds come from one scan
+- pass 2 re-reads the chunks and applies every bound in a single combined
+  mask, instead of the notebooks' per-column `df = df[...]` loop where each
+  filter shifted the quantiles used for the next column
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .config import CATEGORICAL_COLS, DATETIME_COLS, NUMERIC_COLS, RAW_COLUMNS
+from .sketches import QuantileSketch
+from .telemetry import span
+
+IQR_BOUNDS_FILE = "_iqr_bounds.json"
+IQR_WHISKER = 1.5
+# Ids above this go to a plain set instead of the bitmap (SF incident_ids are ~7 digits)
+MAX_BITMAP_ID = 1 << 28
+
+FLOAT32_COLS = ['latitude', 'longitude']
+
+
+def is_unwanted_column(col):
+    # `:@computed_region_*` and `filed_online` are added by the API and are not in the
+    # original dataset; `:id`/`:updated_at` are SODA system fields; `point` duplicates lat/lon
+    return col.startswith(':') or col in ('filed_online', 'point')
+
+
+def drop_unwanted_columns(df):
+    return df.drop(columns=[c for c in df.columns if is_unwanted_column(c)])
+
+
+def coerce_types(df):
+    """Parse datetimes and convert the numeric-string columns in one vectorized pass each."""
+    df = df.copy()
+    for col in DATETIME_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def apply_clean_dtypes(df):
+    """
+    Storage dtypes for the cleaned table: float32 coordinates (~1 m precision),
+    int64 ids/codes, and dictionary-encoded categoricals for the low-cardinality
+    text columns. Expects no missing values (i.e. after `dropna`).
+    """
+    df = df.copy()
+    for col in NUMERIC_COLS:
+        if col not in df.columns:
+            continue
+        if col in FLOAT32_COLS:
+            df[col] = df[col].astype(np.float32)
+        elif (df[col] % 1 == 0).all():
+            df[col] = df[col].astype(np.int64)
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def clean_rows(df):
+    """
+    Row-local steps.
+    - columns are aligned to RAW_COLUMNS so a field that is absent from a whole
+      page (SODA omits nulls) is treated as missing, exactly like the full frame
+    - rows with any missing value are dropped (`df.dropna()` in the notebooks)
+    """
+    with span("clean.rows", rows_in=len(df)) as step:
+        df = coerce_types(drop_unwanted_columns(df).reindex(columns=RAW_COLUMNS)).dropna()
+        step.rows_out = len(df)
+    return df
+
+
+def clean_frame(df, bounds=None):
+    """
+    Clean one batch of raw records: row-local steps, duplicate incident_ids
+    keep the first row, then optional IQR `bounds` ({col: (lower, upper)}).
+    """
+    df = clean_rows(df)
+    with span("clean.dedupe", rows_in=len(df)) as step:
+        df = df.drop_duplicates(subset=['incident_id'], keep='first')
+        step.rows_out = len(df)
+    if bounds:
+        with span("clean.iqr", rows_in=len(df)) as step:
+            df = df[iqr_mask(df, bounds)]
+            step.rows_out = len(df)
+    with span("clean.dtypes", rows_in=len(df)):
+        return apply_clean_dtypes(df).reset_index(drop=True)
+
+
+# -----------------------------
+# IQR bounds
+# -----------------------------
+def iqr_bounds(sketches, whisker=IQR_WHISKER):
+    """{col: (Q1 - 1.5*IQR, Q3 + 1.5*IQR)} from per-column quantile sketches."""
+    bounds = {}
+    for col, sketch in sketches.items():
+        if len(sketch) == 0:
+            continue
+        q1, q3 = sketch.quantile([0.25, 0.75])
+        iqr = q3 - q1
+        bounds[col] = (float(q1 - whisker * iqr), float(q3 + whisker * iqr))
+    return bounds
+
+
+def iqr_mask(df, bounds):
+    """Rows inside every column's bounds, as one combined boolean mask."""
+    keep = np.ones(len(df), dtype=bool)
+    for col, (lower, upper) in bounds.items():
+        if col in df.columns:
+            values = df[col].to_numpy(dtype=np.float64)
+            keep &= (values >= lower) & (values <= upper)
+    return keep
+
+
+def save_bounds(bounds, root):
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, IQR_BOUNDS_FILE), "w") as fh:
+        json.dump(bounds, fh, indent=2)
+
+
+def load_bounds(root):
+    path = os.path.join(root, IQR_BOUNDS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return {col: tuple(b) for col, b in json.load(fh).items()}
+
+
+# -----------------------------
+# Streaming cleaning
+# -----------------------------
+class IdSet:
+    """
+    Compact set of non-negative integer ids: one bit per id up to the largest
+    id seen (~190 KB for SF's ~1.5M id range), with a plain set for outliers.
+    """
+    def __init__(self):
+        self.bits = np.zeros(0, dtype=np.uint64)
+        self.overflow = set()
+
+    def _grow(self, max_id):
+        words = (int(max_id) >> 6) + 1
+        if words > len(self.bits):
+            self.bits = np.concatenate([self.bits, np.zeros(max(words, 2 * len(self.bits)) - len(self.bits), np.uint64)])
+
+    def add_new(self, ids):
+        """Add `ids`; return a mask of entries not seen before (first occurrence wins within the batch)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        new = np.zeros(len(ids), dtype=bool)
+        if len(ids) == 0:
+            return new
+        _, first = np.unique(ids, return_index=True)
+        new[first] = True
+
+        small = (ids >= 0) & (ids < MAX_BITMAP_ID)
+        if small.any():
+            self._grow(ids[small].max())
+            word = ids >> 6
+            bit = (ids & 63).astype(np.uint64)
+            seen = np.zeros(len(ids), dtype=bool)
+            seen[small] = ((self.bits[word[small]] >> bit[small]) & np.uint64(1)).astype(bool)
+            new &= ~seen
+            add = new & small
+            np.bitwise_or.at(self.bits, word[add], np.uint64(1) << bit[add])
+        for i in np.flatnonzero(new & ~small):
+            if ids[i] in self.overflow:
+                new[i] = False
+            else:
+                self.overflow.add(int(ids[i]))
+        return new
+
+
+@dataclass
+class CleaningReport:
+    rows_in: int = 0
+    dropped_missing: int = 0
+    dropped_duplicates: int = 0
+    dropped_outliers: int = 0
+    rows_out: int = 0
+    bounds: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+def stream_clean(chunks, iqr_cols=NUMERIC_COLS, sketch_k=400, report=None):
+    """
+    Two-pass chunked cleaning.
+    - chunks: zero-argument callable returning an iterable of (key, raw DataFrame);
+      it is called once per pass (e.g. `raw_store.iter_partitions`)
+    - iqr_cols: columns filtered with the 1.5*IQR rule (the notebooks use every numeric column)
+    - report: optional CleaningReport filled in as the stream is consumed
+    Yields (key, cleaned DataFrame) per chunk.
+    """
+    report = report if report is not None else CleaningReport()
+    t0 = time.perf_counter()
+
+    sketches = {col: QuantileSketch(k=sketch_k) for col in iqr_cols}
+    seen = IdSet()
+    # Spans are closed before each `yield`, so they never stay open while the consumer runs
+    for _, raw in chunks():
+        df = clean_rows(raw)
+        with span("clean.dedupe", rows_in=len(df)) as step:
+            df = df[seen.add_new(df['incident_id'].to_numpy())]
+            step.rows_out = len(df)
+        with span("clean.sketch", rows_in=len(df)):
+            for col in iqr_cols:
+                sketches[col].update(df[col].to_numpy(dtype=np.float64))
+    bounds = iqr_bounds(sketches)
+    report.bounds = bounds
+
+    seen = IdSet()
+    for key, raw in chunks():
+        report.rows_in += len(raw)
+        df = clean_rows(raw)
+        report.dropped_missing += len(raw) - len(df)
+        with span("clean.dedupe", rows_in=len(df)) as step:
+            new = seen.add_new(df['incident_id'].to_numpy())
+            step.rows_out = int(new.sum())
+        with span("clean.iqr", rows_in=int(new.sum())) as step:
+            keep = new.copy()
+            keep[new] = iqr_mask(df[new], bounds)
+            step.rows_out = int(keep.sum())
+        report.dropped_duplicates += int((~new).sum())
+        report.dropped_outliers += int(new.sum() - keep.sum())
+        with span("clean.dtypes", rows_in=int(keep.sum())):
+            out = apply_clean_dtypes(df[keep]).reset_index(drop=True)
+        report.rows_out += len(out)
+        report.seconds = time.perf_counter() - t0
+        yield key, out
+
+
+def clean_store_from_raw(raw_store, clean_store, iqr_cols=NUMERIC_COLS, verbose=True):
+    """
+    Full rebuild of the cleaned store from the raw store, one month partition
+    in memory at a time. The IQR bounds are saved next to the cleaned store so
+    incremental syncs re-clean changed partitions with the same bounds.
+    """
+    report = CleaningReport()
+    with span("clean.store") as run:
+        for part, df in stream_clean(raw_store.iter_partitions, iqr_cols, report=report):
+            with span("clean.write", rows_in=len(df), partition=part):
+                clean_store.write_partitions({part: df})
+        run.rows_in, run.rows_out = report.rows_in, report.rows_out
+    save_bounds(report.bounds, clean_store.root)
+    if verbose:
+        print(f"Cleaning complete ✅ {report.rows_in:,} -> {report.rows_out:,} rows "
+              f"(missing: {report.dropped_missing:,}, duplicates: {report.dropped_duplicates:,}, "
+              f"outliers: {report.dropped_outliers:,}) in {report.seconds:.1f}s")
+    return report
@@ -0,0 +1,351 @@
+"""
+Scalable K-Means for the geographic hotspot clustering.
+
+The notebooks fit full-batch `KMeans(n_init=10)` on a 50k-row sample once per
+k for the elbow plot, then call `silhouette_score(X_scaled, labels)`, which is
+O(n^2) and fails on large inputs (hence the try/except around it). Here:
+
+- features are streamed from disk in chunks (`StoreBatches` scans the
+  cleaned store with column projection), and one pass keeps a reservoir
+  sample while fitting Welford standardization (`sfcrime.features`), or
+  reuses the transform already fitted for this data version
+- candidate centroids are warm-started on the sample, k = 2, 3, ... each
+  seeded with the previous solution plus one D^2-sampled point, so every k
+  starts close to a good solution and needs only one mini-batch refinement
+- all k are refined together: each epoch is a single pass over the chunks
+  that feeds every chunk to every k's `MiniBatchKMeans.partial_fit`, and one
+  more pass computes the exact inertia of all of them, so the store is read
+  epochs + 1 times however many k are swept
+- silhouette and Davies-Bouldin are computed on repeated cluster-stratified
+  subsamples of the reservoir, reported as mean with a percentile interval,
+  in parallel processes per k
+
+Usage:
+    results, scaler = sweep_k(StoreBatches(), k_values=range(2, 11))
+    results_frame(results)                   # k, inertia, silhouette (+CI), davies_bouldin (+CI)
+    fig = plot_elbow(results)
+    python -m sfcrime.clustering --publish    # sweep the cleaned store, publish kmeans_elbow_plot
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import davies_bouldin_score, silhouette_score
+
+from .config import CLEAN_STORE_DIR
+from .features import FeatureTransform
+from .telemetry import instrumented, span
+from .store import open_clean_store
+
+GEO_FEATURES = ('latitude', 'longitude')
+
+
+# -----------------------------
+# Feature batches
+# -----------------------------
+class StoreBatches:
+    """
+    Re-iterable source of float64 feature chunks from the cleaned store.
+    Picklable (only the path is shipped), so worker processes read the chunks themselves.
+    """
+    def __init__(self, root=CLEAN_STORE_DIR, columns=GEO_FEATURES, batch_rows=262_144, **read_kwargs):
+        self.root = root
+        self.columns = list(columns)
+        self.batch_rows = batch_rows
+        self.read_kwargs = read_kwargs
+
+    def _to_array(self, batches):
+        X = np.column_stack([np.concatenate([b.column(c).to_numpy(zero_copy_only=False) for b in batches])
+                             for c in self.columns]).astype(np.float64)
+        return X[~np.isnan(X).any(axis=1)]
+
+    def __call__(self):
+        # One file per district-month is small, so record batches are regrouped into `batch_rows` chunks
+        pending, rows = [], 0
+        for batch in open_clean_store(self.root).scan_batches(columns=self.columns, **self.read_kwargs):
+            pending.append(batch)
+            rows += batch.num_rows
+            if rows >= self.batch_rows:
+                yield self._to_array(pending)
+                pending, rows = [], 0
+        if pending:
+            yield self._to_array(pending)
+
+
+class ArrayBatches:
+    """In-memory counterpart of StoreBatches (e.g. for a notebook frame)."""
+    def __init__(self, X, batch_rows=262_144):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.batch_rows = batch_rows
+
+    def __call__(self):
+        for start in range(0, len(self.X), self.batch_rows):
+            yield self.X[start:start + self.batch_rows]
+
+
+def fit_scaler(batches, sample_size=50_000, seed=42, transform=None):
+    """
+    One pass: Welford standardization per chunk plus a uniform reservoir sample (raw units).
+    - transform: fitted `FeatureTransform` of the same columns to reuse instead of refitting
+    """
+    rng = np.random.default_rng(seed)
+    fitted = transform
+    reservoir, keys = None, None
+    for X in batches():
+        if len(X) == 0:
+            continue
+        if transform is None:
+            if fitted is None:
+                fitted = FeatureTransform(columns=getattr(batches, 'columns', range(X.shape[1])))
+            fitted.partial_fit(X)
+        # Reservoir via random keys: keep the `sample_size` rows with the smallest keys seen so far
+        batch_keys = rng.random(len(X))
+        if reservoir is None:
+            reservoir, keys = X, batch_keys
+        else:
+            reservoir, keys = np.vstack([reservoir, X]), np.concatenate([keys, batch_keys])
+        if len(keys) > sample_size:
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            reservoir, keys = reservoir[keep], keys[keep]
+    if reservoir is None:
+        raise ValueError("no feature rows to cluster")
+    return fitted.as_scaler(), reservoir
+
+
+# -----------------------------
+# Warm starts
+# -----------------------------
+def seed_centroids(sample, k_values, seed=42, n_restarts=0):
+    """
+    {k: centroids} fitted on the (scaled) sample. Each k starts from the
+    previous k's centroids plus one point drawn with probability proportional
+    to its squared distance to them (the k-means++ rule).
+    - n_restarts: k-means++ fits per k to compare against the warm start (off by
+      default); a better restart becomes that k's seed, the chain continues warm
+    """
+    rng = np.random.default_rng(seed)
+    k_values = sorted(k_values)
+    seeds = {}
+    centroids = sample[rng.integers(len(sample))][None, :]
+    for k in range(2, k_values[-1] + 1):
+        d2 = ((sample[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        new = sample[rng.choice(len(sample), p=d2 / d2.sum())]
+        warm = KMeans(n_clusters=k, init=np.vstack([centroids, new]), n_init=1, random_state=seed).fit(sample)
+        centroids = warm.cluster_centers_
+        if k not in k_values:
+            continue
+        seeds[k] = centroids
+        if n_restarts:
+            fresh = KMeans(n_clusters=k, n_init=n_restarts, random_state=seed).fit(sample)
+            if fresh.inertia_ < warm.inertia_:
+                seeds[k] = fresh.cluster_centers_
+    return seeds
+
+
+# -----------------------------
+# Sweep
+# -----------------------------
+@dataclass
+class KResult:
+    k: int
+    centroids: np.ndarray
+    inertia: float
+    n_rows: int
+    silhouette: float
+    silhouette_ci: tuple
+    davies_bouldin: float
+    davies_bouldin_ci: tuple
+    seconds: float = 0.0
+    cluster_sizes: list = field(default_factory=list)
+
+
+def stratified_sample(labels, size, rng):
+    """Row positions of a sample of `size` with every cluster represented in proportion (at least 2 rows)."""
+    positions = []
+    clusters, counts = np.unique(labels, return_counts=True)
+    for cluster, count in zip(clusters, counts):
+        take = min(count, max(2, int(round(size * count / len(labels)))))
+        positions.append(rng.choice(np.flatnonzero(labels == cluster), take, replace=False))
+    return np.concatenate(positions)
+
+
+def score_on_sample(sample, labels, metric_sample=2000, n_boot=8, seed=42, ci=0.95):
+    """Silhouette and Davies-Bouldin means and percentile intervals over repeated stratified subsamples."""
+    rng = np.random.default_rng(seed)
+    sil, db = [], []
+    for _ in range(n_boot):
+        idx = stratified_sample(labels, metric_sample, rng)
+        if len(np.unique(labels[idx])) < 2:
+            continue
+        sil.append(silhouette_score(sample[idx], labels[idx]))
+        db.append(davies_bouldin_score(sample[idx], labels[idx]))
+    if not sil:
+        return np.nan, (np.nan, np.nan), np.nan, (np.nan, np.nan)
+    q = [(1 - ci) / 2 * 100, (1 + ci) / 2 * 100]
+    return (float(np.mean(sil)), tuple(np.percentile(sil, q)), float(np.mean(db)), tuple(np.percentile(db, q)))
+
+
+def refine_centroids(batches, scaler, seeds, epochs=1, batch_size=4096, seed=42):
+    """
+    Mini-batch refinement of every k's seed centroids in shared passes over the chunks.
+    Each chunk is read and scaled once per epoch and fed to all k models; a final pass
+    computes their exact inertia and cluster sizes.
+    Returns {k: (centroids, inertia, cluster sizes, seconds spent on that k)} and the row count.
+    """
+    models = {k: MiniBatchKMeans(n_clusters=k, init=init, n_init=1, batch_size=batch_size, random_state=seed)
+              for k, init in seeds.items()}
+    seconds = dict.fromkeys(models, 0.0)
+    inertia = dict.fromkeys(models, 0.0)
+    sizes = {k: np.zeros(k, dtype=np.int64) for k in models}
+    n_rows = 0
+    with span("kmeans.refine", k_values=sorted(models), epochs=epochs) as step:
+        for _ in range(epochs):
+            for X in batches():
+                X = scaler.transform(X)
+                for k, model in models.items():
+                    t0 = time.perf_counter()
+                    for start in range(0, len(X), batch_size):
+                        model.partial_fit(X[start:start + batch_size])
+                    seconds[k] += time.perf_counter() - t0
+        for X in batches():
+            X = scaler.transform(X)
+            n_rows += len(X)
+            for k, model in models.items():
+                t0 = time.perf_counter()
+                inertia[k] -= model.score(X)
+                sizes[k] += np.bincount(model.predict(X), minlength=k)
+                seconds[k] += time.perf_counter() - t0
+        step.rows_in = step.rows_out = n_rows
+    return {k: (m.cluster_centers_, float(inertia[k]), sizes[k], seconds[k]) for k, m in models.items()}, n_rows
+
+
+def _score_k(k, centroids, inertia, sizes, seconds, n_rows, sample, metric_sample, n_boot, seed):
+    """Worker: sampled metrics of one refined k."""
+    t0 = time.perf_counter()
+    with span("kmeans.score_k", k=k):
+        labels = ((sample[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        sil, sil_ci, db, db_ci = score_on_sample(sample, labels, metric_sample, n_boot, seed)
+    return KResult(k, centroids, inertia, n_rows, sil, sil_ci, db, db_ci,
+                   seconds + time.perf_counter() - t0, sizes.tolist())
+
+
+@instrumented("kmeans.sweep")
+def sweep_k(batches, k_values=range(2, 11), max_workers=None, epochs=1, batch_size=4096,
+            sample_size=50_000, metric_sample=2000, n_boot=8, seed=42, transform=None, n_restarts=0,
+            verbose=True):
+    """
+    Mini-batch K-Means for every k in `k_values`, refined together in shared passes.
+    - batches: re-iterable chunk source (StoreBatches / ArrayBatches)
+    - epochs: passes of mini-batch refinement over the chunks (shared by all k)
+    - transform: shared `FeatureTransform` of the batch columns (see `sfcrime.features.load_or_fit`)
+    - n_restarts: k-means++ restarts per k when seeding (see `seed_centroids`)
+    - max_workers: processes for the per-k sampled metrics
+    Returns ([KResult] sorted by k, fitted scaler).
+    """
+    t0 = time.perf_counter()
+    k_values = sorted(k_values)
+    with span("kmeans.seed"):
+        scaler, sample = fit_scaler(batches, sample_size, seed, transform)
+        sample = scaler.transform(sample)
+        seeds = seed_centroids(sample, k_values, seed, n_restarts)
+    refined, n_rows = refine_centroids(batches, scaler, seeds, epochs, batch_size, seed)
+
+    max_workers = max_workers or min(len(k_values), os.cpu_count() or 1)
+    args = [(k, *refined[k], n_rows, sample, metric_sample, n_boot, seed) for k in k_values]
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_score_k, *zip(*args)))
+    else:
+        results = [_score_k(*a) for a in args]
+    if verbose:
+        print(f"K-Means sweep complete ✅ k={k_values[0]}..{k_values[-1]} over {n_rows:,} rows "
+              f"in {time.perf_counter() - t0:.1f}s")
+    return results, scaler
+
+
+def results_frame(results):
+    return pd.DataFrame([{
+        'k': r.k, 'inertia': r.inertia,
+        'silhouette': r.silhouette, 'silhouette_lo': r.silhouette_ci[0], 'silhouette_hi': r.silhouette_ci[1],
+        'davies_bouldin': r.davies_bouldin, 'davies_bouldin_lo': r.davies_bouldin_ci[0],
+        'davies_bouldin_hi': r.davies_bouldin_ci[1], 'seconds': r.seconds,
+    } for r in results])
+
+
+def plot_elbow(results):
+    """Elbow curve (inertia) with the sampled silhouette and its interval on a second axis."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    frame = results_frame(results)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(frame['k'], frame['inertia'], 'bo-')
+    ax.set_xlabel('Number of clusters (k)')
+    ax.set_ylabel('Inertia (Within-cluster sum of squares)')
+    ax.set_title('Elbow Method for Optimal k')
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax2 = ax.twinx()
+    ax2.errorbar(frame['k'], frame['silhouette'],
+                 yerr=[frame['silhouette'] - frame['silhouette_lo'], frame['silhouette_hi'] - frame['silhouette']],
+                 fmt='s--', color='darkorange', capsize=3, label='Silhouette (sampled, 95% interval)')
+    ax2.set_ylabel('Silhouette score')
+    ax2.legend(loc='upper right')
+    return fig
+
+
+def plot_cluster_map(points, labels, centroids):
+    """
+    The notebook's K-Means map: sampled incidents colored by cluster, centroids as red crosses.
+    - points: (n, 2) latitude / longitude; centroids: (k, 2) in the same (unscaled) units
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig = plt.figure(figsize=(12, 10))
+    sns.scatterplot(x=points[:, 1], y=points[:, 0], hue=labels, palette='viridis', s=10, alpha=0.7)
+    plt.scatter(centroids[:, 1], centroids[:, 0], marker='X', s=200, c='red', label='Centroids', edgecolor='black')
+    plt.title(f'K-Means Clustering (k={len(centroids)})', fontweight='bold')
+    plt.xlabel('Longitude')
+    plt.ylabel('Latitude')
+    plt.legend(title='Cluster')
+    plt.grid(True, linestyle='--', alpha=0.3)
+    return fig
+
+
+def assign_clusters(batches, scaler, centroids):
+    """Yields the nearest-centroid label array for each chunk."""
+    for X in batches():
+        d2 = ((scaler.transform(X)[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        yield d2.argmin(axis=1)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mini-batch K-Means sweep over the cleaned store")
+    parser.add_argument("--k-min", type=int, default=2)
+    parser.add_argument("--k-max", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--publish", action="store_true", help="publish kmeans_elbow_plot to the artifact store")
+    args = parser.parse_args()
+
+    from .features import load_or_fit
+
+    transform = load_or_fit(columns=GEO_FEATURES, name="geo_transform")
+    sweep, _ = sweep_k(StoreBatches(), range(args.k_min, args.k_max + 1), args.workers, args.epochs,
+                       transform=transform)
+    print(results_frame(sweep).round(4).to_string(index=False))
+    if args.publish:
+        from .artifacts import ArtifactStore
+
+        ArtifactStore().publish("kmeans_elbow_plot", figure=plot_elbow(sweep),
+                                caption="K-Means Elbow Plot – Choosing Number of Clusters",
+                                data_version=open_clean_store().version)
@@ -0,0 +1,59 @@
+"""
+Shared constants for the SF Crime pipeline (dataset, columns, paths).
+"""
+import os
+
+# -----------------------------
+# SODA dataset
+# -----------------------------
+# Police Department Incident Reports: 2018 to Present
+API_ENDPOINT = os.getenv("API_ENDPOINT", "https://data.sfgov.org/resource/wg3w-h783.json")
+APP_TOKEN = os.getenv("APP_TOKEN", "")
+
+# Largest page size the SODA 2.1 endpoints accept in a single request
+MAX_PAGE_SIZE = 50000
+
+# -----------------------------
+# Local data layout
+# -----------------------------
+DATA_DIR = os.getenv("SFCRIME_DATA_DIR", "data")
+RAW_DIR = os.path.join(DATA_DIR, "raw")
+RAW_STORE_DIR = os.path.join(DATA_DIR, "incidents_raw")
+CLEAN_STORE_DIR = os.path.join(DATA_DIR, "incidents")
+WATERMARK_PATH = os.path.join(DATA_DIR, "watermark.json")
+# Versioned model / report images read by the Streamlit app
+ARTIFACT_DIR = os.getenv("SFCRIME_ARTIFACT_DIR", os.path.join(DATA_DIR, "artifacts"))
+# Span metrics file (`*.prom` = Prometheus text, otherwise JSONL; empty = in memory only)
+METRICS_PATH = os.getenv("SFCRIME_METRICS", "")
+# Comma-separated span-name patterns to run the sampling profiler for (e.g. "clean.*,svm.fit")
+PROFILE_SPANS = os.getenv("SFCRIME_PROFILE", "")
+
+# -----------------------------
+# Columns
+# -----------------------------
+# Dataset fields kept after dropping the API-only extras
+# (`:@computed_region_*`, `filed_online`, the nested `point` geometry)
+RAW_COLUMNS = [
+    'incident_datetime', 'incident_date', 'incident_time', 'incident_year',
+    'incident_day_of_week', 'report_datetime', 'row_id', 'incident_id',
+    'incident_number', 'cad_number', 'report_type_code', 'report_type_description',
+    'incident_code', 'incident_category', 'incident_subcategory', 'incident_description',
+    'resolution', 'intersection', 'cnn', 'police_district', 'analysis_neighborhood',
+    'supervisor_district', 'supervisor_district_2012', 'latitude', 'longitude',
+]
+DATETIME_COLS = ['incident_datetime', 'report_datetime']
+# Columns the notebooks convert with `str.isnumeric()` / `pd.to_numeric`
+NUMERIC_COLS = [
+    'incident_year', 'row_id', 'incident_id', 'incident_number', 'cad_number',
+    'incident_code', 'cnn', 'supervisor_district', 'supervisor_district_2012',
+    'latitude', 'longitude',
+]
+# Low-cardinality text columns stored dictionary-encoded (pandas `category`)
+CATEGORICAL_COLS = ['incident_category', 'police_district', 'analysis_neighborhood', 'resolution']
+# Numeric model features: NUMERIC_COLS minus the ids/codes the notebooks drop as redundant
+MODEL_NUMERIC_COLS = [
+    'incident_id', 'cad_number', 'incident_code', 'cnn', 'supervisor_district',
+    'latitude', 'longitude',
+]
+# Sub-partition of the cleaned store below year/month
+DISTRICT_COL = 'police_district'
@@ -0,0 +1,278 @@
+"""
+Pre-aggregated count cube behind the Interactive Crime Dashboard.
+
+The dashboard in `website.py` re-filtered the row-level frame on every widget
+change (`.dt.year` comparisons plus two `.isin` masks) and then re-grouped it
+by month and by district, so each rerun cost O(rows). `CrimeCube` aggregates
+the rows once into dense NumPy arrays:
+
+- `counts`: (day, category, district) incident counts over a contiguous day axis
+- `hourly`: optional (year, day-of-week, hour, category, district) counts
+
+A filter then becomes a slice on the day/year axis plus 0/1 selector vectors
+on the category and district axes, and every dashboard number (total, active
+days, most common category, monthly trend, district bar) is a reduction over
+that slice. Query latency depends on the cube shape (~2,900 days x ~50
+categories x 11 districts for the full SF history), not on the row count.
+
+Usage:
+    cube = CrimeCube.from_frame(df, date_col='incident_date', category_col='incident_category',
+                                district_col='police_district', hour_col='incident_time')
+    view = cube.query(years=(2022, 2024), categories=['Robbery'], districts=['Mission'])
+    view.total, view.active_days, view.top_category
+    view.monthly()            # Series indexed by 'YYYY-MM'
+    view.by_district()        # Series indexed by district
+    CrimeCube.from_aggregates(tables['daily'], tables['hourly'])    # from sfcrime.aggregates
+    cube.save('data/cube.npz'); CrimeCube.load('data/cube.npz')
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def _codes(values, labels):
+    """Positions of `values` in `labels` (-1 for unknown)."""
+    return pd.Index(labels).get_indexer(values)
+
+
+def _selector(labels, selected):
+    """0/1 weight vector over `labels` (all ones when `selected` is None)."""
+    if selected is None:
+        return np.ones(len(labels), dtype=np.int64)
+    weights = np.zeros(len(labels), dtype=np.int64)
+    idx = _codes(list(selected), labels)
+    weights[idx[idx >= 0]] = 1
+    return weights
+
+
+def _hour_of_time_strings(values):
+    """Hour of `HH:MM` strings as float (NaN if unparseable), reading the two digit bytes directly."""
+    text = pd.Series(values).astype(str)
+    raw = np.frombuffer(text.to_numpy(dtype='S5').tobytes(), dtype=np.uint8).reshape(-1, 5).astype(np.int64)
+    hour = ((raw[:, 0] - 48) * 10 + (raw[:, 1] - 48)).astype(np.float64)
+    fixed = (raw[:, 2] == ord(':')) & (raw[:, 0] >= 48) & (raw[:, 0] <= 57) & (raw[:, 1] >= 48) & (raw[:, 1] <= 57)
+    if not fixed.all():
+        # e.g. `9:05`: fall back to the text before the colon
+        other = text[~fixed].str.partition(':')[0]
+        hour[~fixed] = pd.to_numeric(other, errors='coerce').to_numpy(dtype=np.float64)
+    return hour
+
+
+class CrimeCube:
+    """
+    Dense incident count cube.
+    - start: first day of the day axis (numpy datetime64[D])
+    - categories / districts: axis labels
+    - counts: (n_days, n_categories, n_districts) int64
+    - hourly: optional (n_years, 7, 24, n_categories, n_districts) int64, years from `start`'s year
+    """
+    def __init__(self, start, categories, districts, counts, hourly=None):
+        self.start = np.datetime64(start, 'D')
+        self.categories = list(categories)
+        self.districts = list(districts)
+        self.counts = counts
+        self.hourly = hourly
+
+    @classmethod
+    def from_frame(cls, df, date_col='Date', category_col='Category', district_col='District',
+                   weight_col=None, hour_col=None, categories=None, districts=None):
+        """
+        Aggregate a row-level frame.
+        - weight_col: optional per-row count (the mock data's `Incidents`); default 1 per row
+        - hour_col: optional datetime / `HH:MM` column used for the hour x day-of-week cube
+        - categories / districts: fixed axis labels (default: sorted values present in `df`)
+        """
+        dates = pd.to_datetime(df[date_col], errors='coerce').to_numpy().astype('datetime64[D]')
+        valid = ~np.isnat(dates)
+        if categories is None:
+            categories = sorted(df[category_col].dropna().unique())
+        if districts is None:
+            districts = sorted(df[district_col].dropna().unique())
+        cat = _codes(df[category_col].to_numpy(), categories)
+        dist = _codes(df[district_col].to_numpy(), districts)
+        valid &= (cat >= 0) & (dist >= 0)
+        weights = (df[weight_col].to_numpy(dtype=np.int64) if weight_col
+                   else np.ones(len(df), dtype=np.int64))
+
+        dates, cat, dist, weights = dates[valid], cat[valid], dist[valid], weights[valid]
+        n_cat, n_dist = len(categories), len(districts)
+        if len(dates) == 0:
+            return cls(np.datetime64('1970-01-01'), categories, districts,
+                       np.zeros((0, n_cat, n_dist), dtype=np.int64))
+        start = dates.min()
+        day = (dates - start).astype(np.int64)
+        n_days = int(day.max()) + 1
+        flat = (day * n_cat + cat) * n_dist + dist
+        counts = np.bincount(flat, weights=weights, minlength=n_days * n_cat * n_dist)
+        counts = counts.astype(np.int64).reshape(n_days, n_cat, n_dist)
+
+        hourly = None
+        if hour_col is not None:
+            hours = df[hour_col][valid]
+            if pd.api.types.is_datetime64_any_dtype(hours):
+                hour = hours.dt.hour.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                hour = _hour_of_time_strings(hours)
+            ok = ~np.isnan(hour) & (hour >= 0) & (hour < 24)
+            ts = pd.DatetimeIndex(dates)
+            year = (ts.year - ts.year.min()).to_numpy()
+            dow = ts.dayofweek.to_numpy()
+            n_years = int(year.max()) + 1
+            flat = ((((year * 7 + dow) * 24 + hour.astype(np.int64)) * n_cat + cat) * n_dist + dist)[ok]
+            hourly = np.bincount(flat, weights=weights[ok], minlength=n_years * 7 * 24 * n_cat * n_dist)
+            hourly = hourly.astype(np.int64).reshape(n_years, 7, 24, n_cat, n_dist)
+        return cls(start, categories, districts, counts, hourly)
+
+    @classmethod
+    def from_aggregates(cls, daily, hourly=None, categories=None, districts=None):
+        """
+        Cube from the materialized count tables of `sfcrime.aggregates` instead of rows.
+        - daily: date / incident_category / police_district / count
+        - hourly: optional year / weekday / hour / incident_category / police_district / count
+        """
+        cube = cls.from_frame(daily, date_col='date', category_col='incident_category', district_col='police_district',
+                              weight_col='count', categories=categories, districts=districts)
+        if hourly is None or len(cube.counts) == 0:
+            return cube
+        cat = _codes(hourly['incident_category'].to_numpy(), cube.categories)
+        dist = _codes(hourly['police_district'].to_numpy(), cube.districts)
+        year = hourly['year'].to_numpy(dtype=np.float64, na_value=np.nan) - cube.first_year
+        dow = hourly['weekday'].to_numpy(dtype=np.float64, na_value=np.nan)
+        hour = hourly['hour'].to_numpy(dtype=np.float64, na_value=np.nan)
+        n_years, n_cat, n_dist = len(cube.years), len(cube.categories), len(cube.districts)
+        ok = (cat >= 0) & (dist >= 0) & (year >= 0) & (year < n_years) & ~np.isnan(dow) & ~np.isnan(hour)
+        flat = ((((year * 7 + dow) * 24 + hour).astype(np.int64) * n_cat + cat) * n_dist + dist)[ok]
+        hourly_counts = np.bincount(flat, weights=hourly['count'].to_numpy(dtype=np.int64)[ok],
+                                    minlength=n_years * 7 * 24 * n_cat * n_dist)
+        cube.hourly = hourly_counts.astype(np.int64).reshape(n_years, 7, 24, n_cat, n_dist)
+        return cube
+
+    # -----------------------------
+    # Axes
+    # -----------------------------
+    @property
+    def days(self):
+        return self.start + np.arange(len(self.counts))
+
+    @property
+    def first_year(self):
+        return int(str(self.start)[:4])
+
+    @property
+    def years(self):
+        if len(self.counts) == 0:
+            return []
+        return list(range(self.first_year, int(str(self.days[-1])[:4]) + 1))
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + (self.hourly.nbytes if self.hourly is not None else 0)
+
+    def day_range(self, start=None, end=None, years=None):
+        """Half-open [lo, hi) day-axis slice for dates `start`..`end` (inclusive) or a (first, last) year range."""
+        if years is not None:
+            start, end = f"{years[0]}-01-01", f"{years[1]}-12-31"
+        lo = 0 if start is None else int((np.datetime64(start, 'D') - self.start).astype(np.int64))
+        hi = len(self.counts) if end is None else int((np.datetime64(end, 'D') - self.start).astype(np.int64)) + 1
+        lo, hi = min(max(lo, 0), len(self.counts)), min(max(hi, 0), len(self.counts))
+        return lo, max(lo, hi)
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def query(self, start=None, end=None, years=None, categories=None, districts=None):
+        """CubeView for a date (or year) range and category / district selections (None = all)."""
+        lo, hi = self.day_range(start, end, years)
+        return CubeView(self, lo, hi, _selector(self.categories, categories), _selector(self.districts, districts))
+
+    def hour_profile(self, years=None, categories=None, districts=None):
+        """(day-of-week x hour) DataFrame of counts; requires the cube to be built with `hour_col`."""
+        if self.hourly is None:
+            raise ValueError("cube was built without hour_col")
+        y0, y1 = (0, len(self.hourly)) if years is None else \
+            (max(years[0] - self.first_year, 0), max(years[1] - self.first_year + 1, 0))
+        grid = np.einsum('ywhcd,c,d->wh', self.hourly[y0:y1],
+                         _selector(self.categories, categories), _selector(self.districts, districts))
+        return pd.DataFrame(grid, index=DAYS_OF_WEEK, columns=range(24))
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, path):
+        arrays = {'start': np.array(str(self.start)), 'categories': np.array(self.categories, dtype=str),
+                  'districts': np.array(self.districts, dtype=str), 'counts': self.counts}
+        if self.hourly is not None:
+            arrays['hourly'] = self.hourly
+        tmp = path + '.tmp.npz'
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(str(z['start']), z['categories'].tolist(), z['districts'].tolist(),
+                       z['counts'], z['hourly'] if 'hourly' in z.files else None)
+
+
+class CubeView:
+    """A filtered slice of a CrimeCube; every property is a reduction over the slice only."""
+    def __init__(self, cube, lo, hi, cat_weights, dist_weights):
+        self.cube = cube
+        self.lo, self.hi = lo, hi
+        self.cat_weights = cat_weights
+        self.dist_weights = dist_weights
+        self._per_day = None
+
+    @property
+    def block(self):
+        return self.cube.counts[self.lo:self.hi]
+
+    @property
+    def per_day(self):
+        """Incidents per day of the slice (after category and district selection)."""
+        if self._per_day is None:
+            self._per_day = np.einsum('tcd,c,d->t', self.block, self.cat_weights, self.dist_weights)
+        return self._per_day
+
+    @property
+    def total(self):
+        return int(self.per_day.sum())
+
+    @property
+    def active_days(self):
+        """Days with at least one incident (the dashboard's `Date.nunique()`)."""
+        return int(np.count_nonzero(self.per_day))
+
+    @property
+    def daily_average(self):
+        return self.total / self.active_days if self.active_days else 0.0
+
+    def by_category(self):
+        values = np.einsum('tcd,d->c', self.block, self.dist_weights) * self.cat_weights
+        keep = self.cat_weights.astype(bool)
+        return pd.Series(values[keep], index=np.array(self.cube.categories, dtype=object)[keep], name='Incidents')
+
+    @property
+    def top_category(self):
+        counts = self.by_category()
+        return counts.idxmax() if self.total else None
+
+    def by_district(self):
+        values = np.einsum('tcd,c->d', self.block, self.cat_weights) * self.dist_weights
+        keep = self.dist_weights.astype(bool)
+        return pd.Series(values[keep], index=np.array(self.cube.districts, dtype=object)[keep], name='Incidents')
+
+    def monthly(self):
+        """Incidents per calendar month ('YYYY-MM'), only months with incidents (like the groupby it replaces)."""
+        days = self.cube.days[self.lo:self.hi]
+        if len(days) == 0:
+            return pd.Series(dtype=np.int64, name='Incidents')
+        months = days.astype('datetime64[M]')
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        totals = np.add.reduceat(self.per_day, starts)
+        # Months without any incident in the slice are absent, as with `groupby(to_period('M'))`
+        active = np.add.reduceat((self.per_day > 0).astype(np.int64), starts) > 0
+        return pd.Series(totals[active], index=months[starts][active].astype(str), name='Incidents')
@@ -0,0 +1,211 @@
+"""
+Streaming standardization + PCA shared by the classifier, clustering and plots.
+
+The notebooks build `df_normalized` and `df_standardized` as full copies of the
+frame, fit `PCA(n_components=0.95)` on `df_standardized[numerical_cols]` in the
+EDA section, and fit the same PCA again inside the SVM cell. `FeatureTransform`
+replaces all of that with one pass over chunks:
+
+- per chunk, the mean and the co-moment matrix `sum((x - mean)(x - mean)^T)`
+  are merged into the running totals with Chan/Welford updates, so memory is
+  one chunk plus a d x d matrix
+- the standard deviations are the co-moment diagonal (population variance,
+  as `StandardScaler`), and the principal axes are the eigenvectors of the
+  correlation matrix derived from the same co-moments. That is exactly
+  `PCA().fit(StandardScaler().fit_transform(X))`, signs included, without a
+  second pass over standardized data (as `IncrementalPCA` would need)
+- the fitted transform is published once per store version through the
+  artifact store (`feature_transform/v*.npz`), and `load_or_fit` hands the
+  same instance to every consumer until the data changes
+
+Usage:
+    ft = load_or_fit()                           # MODEL_NUMERIC_COLS of the cleaned store
+    Z = ft.transform(df)                         # standardized
+    P = ft.project(df)                           # principal components (95% of the variance)
+    scaler = ft.as_scaler()                      # sklearn StandardScaler view
+    python -m sfcrime.features                   # fit (or reuse) and print the explained variance
+"""
+import io
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from .config import MODEL_NUMERIC_COLS
+
+TRANSFORM_ARTIFACT = "feature_transform"
+
+
+class FeatureTransform:
+    """
+    Welford standardization + PCA over `columns`, fitted chunk by chunk.
+    - columns: numeric input columns (order defines the feature order)
+    - variance: explained-variance threshold for `project` (the notebooks' n_components=0.95)
+    """
+    def __init__(self, columns=MODEL_NUMERIC_COLS, variance=0.95):
+        self.columns = list(columns)
+        self.variance = variance
+        d = len(self.columns)
+        self.n_samples_seen_ = 0
+        self.mean_ = np.zeros(d)
+        self.comoment_ = np.zeros((d, d))
+        self._pca = None
+
+    # -----------------------------
+    # Fitting
+    # -----------------------------
+    def _array(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[self.columns].to_numpy(dtype=np.float64)
+        return np.asarray(X, dtype=np.float64)
+
+    def partial_fit(self, X):
+        """Merge one chunk (DataFrame with `columns`, or array); rows with missing values are skipped."""
+        X = self._array(X)
+        X = X[~np.isnan(X).any(axis=1)]
+        n_b = len(X)
+        if n_b == 0:
+            return self
+        mean_b = X.mean(axis=0)
+        D = X - mean_b
+        n_a = self.n_samples_seen_
+        n = n_a + n_b
+        delta = mean_b - self.mean_
+        self.comoment_ += D.T @ D + np.outer(delta, delta) * (n_a * n_b / n)
+        self.mean_ = self.mean_ + delta * (n_b / n)
+        self.n_samples_seen_ = n
+        self._pca = None
+        return self
+
+    def fit(self, chunks):
+        """One pass over `chunks`: zero-argument callable returning an iterable of DataFrames / arrays."""
+        for X in chunks():
+            self.partial_fit(X)
+        if self.n_samples_seen_ < 2:
+            raise ValueError("need at least two complete rows to fit the feature transform")
+        return self
+
+    # -----------------------------
+    # Statistics
+    # -----------------------------
+    @property
+    def var_(self):
+        return np.diag(self.comoment_) / max(self.n_samples_seen_, 1)
+
+    @property
+    def scale_(self):
+        # StandardScaler leaves constant features unscaled
+        scale = np.sqrt(self.var_)
+        return np.where(scale > 0, scale, 1.0)
+
+    def _decompose(self):
+        if self._pca is None:
+            # Covariance of the standardized features (ddof=1, as PCA)
+            cov = self.comoment_ / np.outer(self.scale_, self.scale_) / (self.n_samples_seen_ - 1)
+            eigvals, eigvecs = np.linalg.eigh(cov)
+            order = np.argsort(eigvals)[::-1]
+            eigvals, components = np.clip(eigvals[order], 0, None), eigvecs[:, order].T
+            # sklearn's svd_flip convention: the largest |loading| of each component is positive
+            signs = np.sign(components[np.arange(len(components)), np.abs(components).argmax(axis=1)])
+            self._pca = (eigvals, components * signs[:, None])
+        return self._pca
+
+    @property
+    def explained_variance_(self):
+        return self._decompose()[0]
+
+    @property
+    def explained_variance_ratio_(self):
+        ev = self.explained_variance_
+        return ev / ev.sum()
+
+    @property
+    def components_(self):
+        """All principal axes (rows), in the standardized feature space."""
+        return self._decompose()[1]
+
+    @property
+    def n_components_(self):
+        """Components needed to reach `variance` of the explained variance."""
+        ratio = np.cumsum(self.explained_variance_ratio_)
+        return int(min(np.searchsorted(ratio, self.variance) + 1, len(ratio)))
+
+    # -----------------------------
+    # Transform
+    # -----------------------------
+    def transform(self, X):
+        """Standardized features (z-scores)."""
+        return (self._array(X) - self.mean_) / self.scale_
+
+    def project(self, X, n_components=None):
+        """Principal component scores, `n_components_` of them unless given."""
+        k = n_components or self.n_components_
+        return self.transform(X) @ self.components_[:k].T
+
+    def as_scaler(self):
+        """A fitted `StandardScaler` with the same statistics (for code written against sklearn)."""
+        scaler = StandardScaler()
+        scaler.mean_, scaler.var_, scaler.scale_ = self.mean_.copy(), self.var_, self.scale_
+        scaler.n_samples_seen_ = self.n_samples_seen_
+        scaler.n_features_in_ = len(self.columns)
+        return scaler
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def dumps(self):
+        buf = io.BytesIO()
+        np.savez(buf, columns=np.asarray(self.columns), variance=self.variance, n=self.n_samples_seen_,
+                 mean=self.mean_, comoment=self.comoment_)
+        return buf.getvalue()
+
+    @classmethod
+    def loads(cls, data):
+        with np.load(io.BytesIO(data)) as z:
+            ft = cls(columns=[str(c) for c in z['columns']], variance=float(z['variance']))
+            ft.n_samples_seen_ = int(z['n'])
+            ft.mean_, ft.comoment_ = z['mean'], z['comoment']
+        return ft
+
+
+def load_or_fit(store=None, columns=MODEL_NUMERIC_COLS, variance=0.95, name=TRANSFORM_ARTIFACT, artifacts=None,
+                batch_rows=262_144, verbose=True):
+    """
+    The transform of `columns` for the store's current version: loaded from the artifact store
+    when it was fitted on this version, otherwise fitted in one pass and published.
+    """
+    from .artifacts import ArtifactStore
+    from .store import open_clean_store
+
+    store = store or open_clean_store()
+    artifacts = artifacts or ArtifactStore()
+    entry, path = artifacts.entry(name), artifacts.path(name)
+    if (path is not None and entry.get('data_version') == store.version
+            and entry.get('meta', {}).get('columns') == list(columns)):
+        with open(path, 'rb') as fh:
+            ft = FeatureTransform.loads(fh.read())
+        ft.variance = variance
+        return ft
+
+    ft = FeatureTransform(columns, variance).fit(lambda: store.iter_frames(columns=list(columns),
+                                                                          batch_rows=batch_rows))
+    artifacts.publish(name, data=ft.dumps(), ext=".npz", data_version=store.version,
+                      caption=f"Standardization + PCA of {', '.join(columns)}",
+                      meta={"columns": list(columns), "n_rows": ft.n_samples_seen_})
+    if verbose:
+        print(f"Feature transform fitted ✅ {ft.n_samples_seen_:,} rows, {ft.n_components_} of "
+              f"{len(ft.columns)} components for {variance:.0%} variance (data version {store.version})")
+    return ft
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit (or reuse) the streaming standardization + PCA")
+    parser.add_argument("--variance", type=float, default=0.95)
+    args = parser.parse_args()
+
+    ft = load_or_fit(variance=args.variance)
+    print(f"Original number of features: {len(ft.columns)}")
+    print(f"Reduced number of features: {ft.n_components_}")
+    print(f"Explained variance ratio by each component: {ft.explained_variance_ratio_[:ft.n_components_]}")
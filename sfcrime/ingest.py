@@ -0,0 +1,266 @@
+"""
+Concurrent, paginated ingestion from the SF OpenData (SODA) API.
+
+The notebooks call `requests.get(api_endpoint)` once, which only returns the
+API's default page (1,000 rows). This module plans the full pull as
+`$limit`/`$offset` pages ordered by `:id`, fetches them concurrently over a
+pooled session with retry/backoff, and streams every page straight to disk.
+
+Usage:
+    from sfcrime.ingest import fetch_all, iter_pages
+    stats = fetch_all(max_workers=8)
+    print(stats)                       # records, seconds, records/sec
+    for page_df in iter_pages():       # one DataFrame per page file
+        ...
+"""
+import glob
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import API_ENDPOINT, APP_TOKEN, MAX_PAGE_SIZE, RAW_DIR
+from .telemetry import span
+
+# Status codes worth retrying: throttling and transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+STREAM_CHUNK_BYTES = 1 << 16
+
+
+@dataclass
+class IngestStats:
+    pages: int = 0
+    skipped_pages: int = 0
+    records: int = 0
+    bytes: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def records_per_sec(self):
+        return self.records / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.records:,} records in {self.pages} pages "
+                f"({self.skipped_pages} already on disk), {self.bytes / 1e6:.1f} MB, "
+                f"{self.retries} retries, {self.seconds:.1f}s -> {self.records_per_sec:,.0f} records/sec")
+
+
+class IngestError(RuntimeError):
+    """Raised when a page cannot be fetched after all retries."""
+
+
+def make_session(app_token=APP_TOKEN, pool_size=8):
+    """
+    Session with a connection pool sized to the concurrency cap, so every
+    worker thread reuses a keep-alive connection instead of reconnecting.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if app_token:
+        session.headers["X-App-Token"] = app_token
+    return session
+
+
+def _get_with_retry(session, url, params, retries, backoff, timeout, stream=False):
+    """GET with exponential backoff + jitter. Returns (response, n_retries)."""
+    for attempt in range(retries + 1):
+        try:
+            resp = session.get(url, params=params, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise IngestError(f"{url} {params}: {e}") from e
+        else:
+            if resp.status_code == 200:
+                return resp, attempt
+            if resp.status_code not in RETRY_STATUS or attempt == retries:
+                raise IngestError(f"{url} {params}: HTTP {resp.status_code} {resp.text[:200]}")
+            resp.close()
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                time.sleep(float(retry_after))
+                continue
+        time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+    raise IngestError(f"{url} {params}: retries exhausted")
+
+
+def count_records(session, endpoint=API_ENDPOINT, where=None, retries=5, backoff=0.5, timeout=60):
+    """Total number of rows matching `where`, via `$select=count(*)`."""
+    params = {"$select": "count(*)"}
+    if where:
+        params["$where"] = where
+    resp, _ = _get_with_retry(session, endpoint, params, retries, backoff, timeout)
+    row = resp.json()[0]
+    # SODA names the column `count` (older endpoints: `count_1`)
+    return int(next(iter(row.values())))
+
+
+def plan_pages(total, page_size=MAX_PAGE_SIZE):
+    """Split `total` rows into (offset, limit) pages."""
+    return [(offset, min(page_size, total - offset)) for offset in range(0, total, page_size)]
+
+
+def page_path(out_dir, offset):
+    return os.path.join(out_dir, f"page_{offset:010d}.json")
+
+
+class _RecordCounter:
+    """
+    Counts the top-level objects of a JSON array fed block by block, without parsing it.
+    Vectorized per block; string state (with backslash escapes) and nesting depth carry over
+    from one block to the next.
+    """
+    def __init__(self):
+        self.records = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, block):
+        import numpy as np
+
+        if not block:
+            return
+        a = np.frombuffer(block, dtype=np.uint8)
+        quote = a == 34
+        if self._escaped or b"\\" in block:
+            # A quote preceded by an odd run of backslashes (possibly from the previous block) is escaped
+            pos = np.arange(len(a))
+            last_plain = np.maximum.accumulate(np.where(a == 92, -1 - self._escaped, pos))
+            quote[1:] &= (pos[1:] - 1 - last_plain[:-1]) % 2 == 0
+            quote[0] &= not self._escaped
+            self._escaped = bool((len(a) - 1 - last_plain[-1]) % 2)
+        # uint8 sums wrap at 256, which keeps their parity
+        in_string = (np.cumsum(quote, dtype=np.uint8) & 1).astype(bool) ^ self._in_string
+        structural = np.where(in_string, 0, a)
+        step = (structural == 123).view(np.int8) + (structural == 91).view(np.int8) \
+            - (structural == 125).view(np.int8) - (structural == 93).view(np.int8)
+        depth = self._depth + np.cumsum(step, dtype=np.int32)
+        # Depth 2 right after a `{`: an object directly inside the outer array
+        self.records += int(np.count_nonzero((depth == 2) & (structural == 123)))
+        self._depth = int(depth[-1])
+        self._in_string = bool(in_string[-1])
+
+
+def fetch_page(session, endpoint, offset, limit, dest, where=None, order=":id",
+               retries=5, backoff=0.5, timeout=120, select=None, parent=None):
+    """
+    Fetch one page and stream the response body to `dest` without parsing it.
+    Writes to a temp file first so an interrupted run never leaves a partial
+    page that would be mistaken for a complete one on resume.
+    - parent: span of the whole pull (pages run on pool threads)
+    Returns (bytes_written, rows_written, n_retries); rows are counted from the
+    streamed body, so a short last page or a shrinking dataset is reported as is.
+    """
+    params = {"$limit": limit, "$offset": offset, "$order": order}
+    if where:
+        params["$where"] = where
+    if select:
+        params["$select"] = select
+    with span("ingest.page", parent=parent, offset=offset) as page:
+        resp, n_retries = _get_with_retry(session, endpoint, params, retries, backoff, timeout, stream=True)
+        tmp = dest + ".part"
+        written, counter = 0, _RecordCounter()
+        with resp, open(tmp, "wb") as fh:
+            for block in resp.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                fh.write(block)
+                written += len(block)
+                counter.feed(block)
+        os.replace(tmp, dest)
+        page.rows_out = counter.records
+        page.attrs.update(bytes=written, retries=n_retries, limit=limit)
+    return written, counter.records, n_retries
+
+
+def fetch_all(endpoint=API_ENDPOINT, out_dir=RAW_DIR, page_size=MAX_PAGE_SIZE, max_workers=8,
+              where=None, order=":id", app_token=APP_TOKEN, retries=5, backoff=0.5,
+              timeout=120, resume=True, verbose=True, select=None):
+    """
+    Pull every row matching `where` into `out_dir` as one JSON file per page.
+
+    - page_size: rows per request (`$limit`), capped at MAX_PAGE_SIZE
+    - max_workers: concurrency cap (threads and pooled connections)
+    - resume: skip pages whose file already exists from a previous run
+    - select: optional `$select` (e.g. ":*, *" to include the :updated_at system field)
+    Returns an IngestStats with records/sec for sizing a full backfill.
+    """
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    os.makedirs(out_dir, exist_ok=True)
+    stats = IngestStats()
+    t0 = time.perf_counter()
+
+    with make_session(app_token, pool_size=max_workers) as session, span("ingest.fetch_all") as pull:
+        total = count_records(session, endpoint, where, retries, backoff, timeout)
+        pages = plan_pages(total, page_size)
+        todo = []
+        for offset, limit in pages:
+            dest = page_path(out_dir, offset)
+            if resume and os.path.exists(dest):
+                stats.skipped_pages += 1
+            else:
+                todo.append((offset, limit, dest))
+        if verbose:
+            print(f"Planned {len(pages)} pages for {total:,} records ({len(todo)} to fetch)")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(fetch_page, session, endpoint, offset, limit, dest,
+                            where, order, retries, backoff, timeout, select, pull)
+                for offset, limit, dest in todo
+            ]
+            for fut in as_completed(futures):
+                written, rows, n_retries = fut.result()
+                stats.pages += 1
+                stats.records += rows
+                stats.bytes += written
+                stats.retries += n_retries
+                if verbose and stats.pages % 10 == 0:
+                    elapsed = time.perf_counter() - t0
+                    print(f"  {stats.pages}/{len(todo)} pages, {stats.records / elapsed:,.0f} records/sec")
+        pull.rows_out = stats.records
+
+    stats.seconds = time.perf_counter() - t0
+    if verbose:
+        print(f"Ingestion complete ✅ {stats}")
+    return stats
+
+
+def iter_pages(out_dir=RAW_DIR):
+    """Yield one DataFrame per page file, in offset order (bounded memory)."""
+    import pandas as pd
+
+    for path in sorted(glob.glob(os.path.join(out_dir, "page_*.json"))):
+        with span("ingest.parse_page") as page, open(path, "rb") as fh:
+            df = pd.DataFrame(json.load(fh))
+            page.rows_out = len(df)
+        yield df
+
+
+def load_pages(out_dir=RAW_DIR):
+    """Concatenate every page on disk into a single DataFrame."""
+    import pandas as pd
+
+    frames = list(iter_pages(out_dir))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Paginated SODA ingestion")
+    parser.add_argument("--endpoint", default=API_ENDPOINT)
+    parser.add_argument("--out-dir", default=RAW_DIR)
+    parser.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--where", default=None)
+    parser.add_argument("--no-resume", action="store_true")
+    args = parser.parse_args()
+    fetch_all(args.endpoint, args.out_dir, args.page_size, args.workers,
+              where=args.where, resume=not args.no_resume)
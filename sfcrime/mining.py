@@ -0,0 +1,453 @@
+"""
+Bitset-based frequent itemset mining for the district-day crime basket.
+
+The notebooks build a dense `transaction_id x incident_category` frame via
+`groupby(...).count().unstack()` and hand it to mlxtend's `apriori(...,
+low_memory=True)`. Here each district-day is an integer transaction id and
+each category is a packed bit vector over transactions (n_categories x
+ceil(n_transactions / 64) uint64 words). Itemsets are mined depth-first
+(Eclat): extending a prefix ANDs its bit vector with every remaining
+category at once, and supports are the vectorized popcounts of those ANDs.
+
+`IncrementalMiner` keeps the result up to date as district-days arrive or
+expire, using the negative-border technique: it tracks support counts for
+the frequent itemsets plus their negative border (infrequent itemsets whose
+subsets are all frequent). A batch only updates those counts; the stored
+window is rescanned only for new candidates created when a border itemset
+becomes frequent.
+
+Usage:
+    basket = TransactionBitsets.from_frame(df)                 # police_district x incident_date
+    itemsets = frequent_itemsets(basket, min_support=0.01)     # {(i, j, ...): count}
+    rules = rules_frame(basket, itemsets, min_confidence=0.3, min_lift=1.2, max_side_len=2)
+
+    miner = IncrementalMiner(categories, min_support=0.01, window=30 * 11)
+    changes = miner.add_frame(todays_incidents)                # rules that crossed a threshold
+"""
+import time
+from collections import deque, namedtuple
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from .telemetry import span
+
+Rule = namedtuple("Rule", ["antecedents", "consequents", "antecedent_support",
+                           "consequent_support", "support", "confidence", "lift"])
+RuleChanges = namedtuple("RuleChanges", ["added", "removed", "n_transactions"])
+
+if hasattr(np, "bitwise_count"):
+    def popcount(words, axis=-1):
+        """Number of set bits along `axis` of a uint64 array."""
+        return np.bitwise_count(words).sum(axis=axis, dtype=np.int64)
+else:
+    _BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(words, axis=-1):
+        """Number of set bits along `axis` of a uint64 array (byte lookup for NumPy < 2.0)."""
+        as_bytes = words.view(np.uint8).reshape(words.shape[:-1] + (-1,))
+        return _BYTE_POPCOUNT[as_bytes].sum(axis=axis, dtype=np.int64)
+
+
+class TransactionBitsets:
+    """
+    Vertical bitset layout of a basket.
+    - items: category names, index i <-> row i of `bits`
+    - bits: (n_items, n_words) uint64; bit t of row i is set if transaction t contains item i
+    - n_transactions: number of transactions (district-days)
+    """
+    def __init__(self, items, bits, n_transactions):
+        self.items = list(items)
+        self.bits = bits
+        self.n_transactions = int(n_transactions)
+
+    @classmethod
+    def from_codes(cls, txn_codes, item_codes, items, n_transactions):
+        """Build from parallel integer arrays (one entry per incident; repeats are harmless)."""
+        txn_codes = np.asarray(txn_codes, dtype=np.int64)
+        item_codes = np.asarray(item_codes, dtype=np.int64)
+        n_words = (int(n_transactions) + 63) // 64
+        bits = np.zeros((len(items), max(n_words, 1)), dtype=np.uint64)
+        flat = item_codes * bits.shape[1] + (txn_codes >> 6)
+        np.bitwise_or.at(bits.reshape(-1), flat, np.uint64(1) << (txn_codes & 63).astype(np.uint64))
+        return cls(items, bits, n_transactions)
+
+    @classmethod
+    def from_frame(cls, df, transaction_cols=("police_district", "incident_date"), item_col="incident_category"):
+        """
+        One transaction per unique combination of `transaction_cols`
+        (the notebooks' `police_district + '_' + incident_date`), without
+        building the string key or the dense basket.
+        """
+        with span("mining.basket", rows_in=len(df)) as step:
+            keys = [df[c].to_numpy() for c in transaction_cols]
+            txn_codes, uniques = pd.MultiIndex.from_arrays(keys).factorize()
+            item_codes, items = pd.factorize(df[item_col], sort=True)
+            valid = (txn_codes >= 0) & (item_codes >= 0)
+            basket = cls.from_codes(txn_codes[valid], item_codes[valid], list(items), len(uniques))
+            basket.transactions = uniques
+            step.rows_out = basket.n_transactions
+        return basket
+
+    @property
+    def item_counts(self):
+        return popcount(self.bits)
+
+    def count(self, itemset):
+        """Support count of an itemset given as item indices."""
+        acc = np.bitwise_and.reduce(self.bits[list(itemset)], axis=0)
+        return int(popcount(acc))
+
+    def names(self, itemset):
+        return frozenset(self.items[i] for i in itemset)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+def frequent_itemsets(basket, min_support=0.01, max_len=None):
+    """
+    Eclat over the bitsets. Returns {itemset (sorted tuple of item indices): support count}.
+    Items are explored in increasing-support order, which keeps the tails short
+    where prefixes are most frequent.
+    """
+    min_count = int(np.ceil(min_support * basket.n_transactions))
+    counts = basket.item_counts
+    frequent = [i for i in np.argsort(counts, kind="stable") if counts[i] >= min_count]
+    result = {(int(i),): int(counts[i]) for i in frequent}
+
+    def extend(prefix, prefix_bits, tail):
+        if not tail or (max_len is not None and len(prefix) >= max_len):
+            return
+        anded = basket.bits[tail] & prefix_bits
+        tail_counts = popcount(anded)
+        keep = np.flatnonzero(tail_counts >= min_count)
+        next_tail = [tail[k] for k in keep]
+        for pos, k in enumerate(keep):
+            itemset = prefix + (tail[k],)
+            result[tuple(sorted(itemset))] = int(tail_counts[k])
+            extend(itemset, anded[k], next_tail[pos + 1:])
+
+    with span("mining.itemsets", rows_in=basket.n_transactions) as step:
+        for pos, i in enumerate(frequent):
+            extend((int(i),), basket.bits[i], [int(j) for j in frequent[pos + 1:]])
+        step.rows_out = len(result)
+    return result
+
+
+def iter_rules(itemsets, n_transactions, min_confidence=0.0, min_lift=0.0, max_side_len=None):
+    """
+    Stream association rules from `itemsets` ({sorted tuple: count}, closed
+    under subsets as returned by `frequent_itemsets`), applying the confidence,
+    lift and per-side length filters as each rule is generated.
+    Yields Rule tuples with item indices and relative supports.
+    """
+    n = float(n_transactions)
+    for itemset, count in itemsets.items():
+        if len(itemset) < 2:
+            continue
+        support = count / n
+        for size in range(1, len(itemset)):
+            if max_side_len is not None and (size > max_side_len or len(itemset) - size > max_side_len):
+                continue
+            for antecedent in combinations(itemset, size):
+                consequent = tuple(i for i in itemset if i not in antecedent)
+                a_sup = itemsets[antecedent] / n
+                c_sup = itemsets[consequent] / n
+                confidence = support / a_sup
+                lift = confidence / c_sup
+                if confidence >= min_confidence and lift >= min_lift:
+                    yield Rule(antecedent, consequent, a_sup, c_sup, support, confidence, lift)
+
+
+def itemsets_frame(basket, itemsets):
+    """mlxtend-style frame: support, itemsets (frozenset of names), length; sorted by support."""
+    rows = [(count / basket.n_transactions, basket.names(s), len(s)) for s, count in itemsets.items()]
+    df = pd.DataFrame(rows, columns=["support", "itemsets", "length"])
+    return df.sort_values("support", ascending=False, ignore_index=True)
+
+
+def rules_frame(basket, itemsets, min_confidence=0.3, min_lift=1.2, max_side_len=2):
+    """
+    Rules as a DataFrame with the columns the notebooks print
+    (antecedents/consequents as ', '-joined names), sorted by lift then confidence.
+    """
+    with span("mining.rules", rows_in=len(itemsets)) as step:
+        rows = [(", ".join(sorted(basket.items[i] for i in r.antecedents)),
+                 ", ".join(sorted(basket.items[i] for i in r.consequents)),
+                 r.antecedent_support, r.consequent_support, r.support, r.confidence, r.lift)
+                for r in iter_rules(itemsets, basket.n_transactions, min_confidence, min_lift, max_side_len)]
+        step.rows_out = len(rows)
+    df = pd.DataFrame(rows, columns=["antecedents", "consequents", "antecedent support",
+                                     "consequent support", "support", "confidence", "lift"])
+    return df.sort_values(["lift", "confidence"], ascending=[False, False], ignore_index=True)
+
+
+def basket_from_store(store, years=None, districts=None):
+    """District-day basket straight from the cleaned store, reading only the three columns needed."""
+    with span("mining.read") as step:
+        df = store.read(columns=["police_district", "incident_date", "incident_category"],
+                        year=years, district=districts)
+        step.rows_out = len(df)
+    return TransactionBitsets.from_frame(df)
+
+
+def plot_rules_scatter(rules):
+    """The notebook's confidence vs lift scatter, colored and sized by support (pass a sample of the rules)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # A style context rather than `set_style`, so figures drawn after this one in the process keep theirs
+    with sns.axes_style("whitegrid"):
+        fig, ax = plt.subplots(figsize=(10, 6))
+    if len(rules):
+        sns.scatterplot(x='confidence', y='lift', data=rules, hue='support', size='support', palette='viridis',
+                        sizes=(20, 200), alpha=0.6, ax=ax)
+    plt.axhline(y=1.0, color='r', linestyle='--', linewidth=1)
+    plt.xlabel("Confidence (P(Consequent | Antecedent))", fontsize=12)
+    plt.ylabel("Lift", fontsize=12)
+    plt.title(f"Association Rules Scatter Plot (Sampled {len(rules):,} Rules)", fontsize=14)
+    if len(rules):
+        plt.legend(title='Support', loc='upper left', bbox_to_anchor=(1.05, 1))
+    return fig
+
+
+# -----------------------------
+# Incremental maintenance
+# -----------------------------
+def _immediate_subsets(itemset):
+    return [itemset[:k] + itemset[k + 1:] for k in range(len(itemset))]
+
+
+class IncrementalMiner:
+    """
+    Frequent itemsets and rules over a sliding or expanding window of transactions.
+    - items: the category vocabulary (fixed; unknown categories are ignored)
+    - min_support / min_confidence / min_lift / max_side_len: same filters as `rules_frame`
+    - max_len: optional cap on itemset size
+    - window: keep only the most recent `window` transactions (None = expanding)
+    Transactions are stored horizontally as item masks (one uint64 word per
+    64 categories), i.e. 8 bytes per district-day for the ~50 SF categories.
+    """
+    def __init__(self, items, min_support=0.01, min_confidence=0.3, min_lift=1.2,
+                 max_len=None, max_side_len=2, window=None):
+        self.items = list(items)
+        self.index = {name: i for i, name in enumerate(self.items)}
+        self.n_words = max(1, (len(self.items) + 63) // 64)
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self.min_lift = min_lift
+        self.max_len = max_len
+        self.max_side_len = max_side_len
+        self.window = window
+        self.batches = deque()
+        self.n = 0
+        # Tracked itemsets: frequent ones plus the negative border. Every single
+        # item is always tracked, so the border is complete from the start.
+        self.counts = {(i,): 0 for i in range(len(self.items))}
+        self.frequent = set()
+        self.rules = {}
+
+    @property
+    def min_count(self):
+        return max(1, int(np.ceil(self.min_support * self.n)))
+
+    # --- transactions ---
+    def masks_from_frame(self, df, transaction_cols=("police_district", "incident_date"),
+                         item_col="incident_category"):
+        """(n_transactions, n_words) item masks, one row per unique transaction key in `df`."""
+        keys = [df[c].to_numpy() for c in transaction_cols]
+        txn_codes, uniques = pd.MultiIndex.from_arrays(keys).factorize()
+        item_codes = df[item_col].map(self.index).to_numpy()
+        valid = (txn_codes >= 0) & pd.notna(item_codes)
+        txn_codes, item_codes = txn_codes[valid], item_codes[valid].astype(np.int64)
+        masks = np.zeros((len(uniques), self.n_words), dtype=np.uint64)
+        flat = txn_codes * self.n_words + (item_codes >> 6)
+        np.bitwise_or.at(masks.reshape(-1), flat, np.uint64(1) << (item_codes & 63).astype(np.uint64))
+        return masks
+
+    def _itemset_masks(self, itemsets):
+        masks = np.zeros((len(itemsets), self.n_words), dtype=np.uint64)
+        for row, itemset in enumerate(itemsets):
+            for i in itemset:
+                masks[row, i >> 6] |= np.uint64(1) << np.uint64(i & 63)
+        return masks
+
+    def _count(self, transactions, itemsets):
+        """Support counts of `itemsets` in a (n, n_words) transaction mask array."""
+        counts = np.zeros(len(itemsets), dtype=np.int64)
+        if len(itemsets) == 0 or len(transactions) == 0:
+            return counts
+        wanted = self._itemset_masks(itemsets)[:, None, :]
+        step = max(1, 2_000_000 // len(itemsets))
+        for start in range(0, len(transactions), step):
+            chunk = transactions[None, start:start + step, :]
+            counts += ((chunk & wanted) == wanted).all(axis=2).sum(axis=1)
+        return counts
+
+    def _window_masks(self):
+        if not self.batches:
+            return np.zeros((0, self.n_words), dtype=np.uint64)
+        return np.concatenate(list(self.batches))
+
+    def _apply(self, transactions, sign):
+        tracked = list(self.counts)
+        for itemset, c in zip(tracked, self._count(transactions, tracked)):
+            self.counts[itemset] += sign * int(c)
+
+    def _pop_oldest(self, n_transactions):
+        removed = []
+        while n_transactions > 0 and self.batches:
+            head = self.batches[0]
+            if len(head) <= n_transactions:
+                removed.append(self.batches.popleft())
+                n_transactions -= len(head)
+            else:
+                removed.append(head[:n_transactions])
+                self.batches[0] = head[n_transactions:]
+                n_transactions = 0
+        out = np.concatenate(removed) if removed else np.zeros((0, self.n_words), dtype=np.uint64)
+        self.n -= len(out)
+        return out
+
+    # --- maintenance ---
+    def _refresh(self):
+        """Re-derive the frequent set; count new candidates (window scan) only when a border itemset became frequent."""
+        while True:
+            min_count = self.min_count
+            frequent = {s for s, c in self.counts.items() if c >= min_count}
+            self.counts = {s: c for s, c in self.counts.items()
+                           if s in frequent or len(s) == 1 or all(sub in frequent for sub in _immediate_subsets(s))}
+            newly = frequent - self.frequent
+            self.frequent = frequent
+            if not newly:
+                return
+            singles = sorted(s[0] for s in frequent if len(s) == 1)
+            candidates = set()
+            for itemset in newly:
+                if self.max_len is not None and len(itemset) >= self.max_len:
+                    continue
+                for x in singles:
+                    if x in itemset:
+                        continue
+                    cand = tuple(sorted(itemset + (x,)))
+                    if cand not in self.counts and all(sub in frequent for sub in _immediate_subsets(cand)):
+                        candidates.add(cand)
+            if not candidates:
+                return
+            candidates = sorted(candidates)
+            self.counts.update(zip(candidates, (int(c) for c in self._count(self._window_masks(), candidates))))
+
+    def _diff_rules(self):
+        itemsets = {s: self.counts[s] for s in self.frequent}
+        current = {(r.antecedents, r.consequents): r
+                   for r in iter_rules(itemsets, self.n, self.min_confidence, self.min_lift, self.max_side_len)}
+        added = [current[k] for k in current.keys() - self.rules.keys()]
+        removed = [self.rules[k] for k in self.rules.keys() - current.keys()]
+        self.rules = current
+        return RuleChanges(added, removed, self.n)
+
+    def add(self, transactions):
+        """Add a (n, n_words) mask batch, expire past the window, return rules that crossed a threshold."""
+        transactions = np.asarray(transactions, dtype=np.uint64).reshape(-1, self.n_words)
+        self.batches.append(transactions)
+        self.n += len(transactions)
+        self._apply(transactions, +1)
+        if self.window is not None and self.n > self.window:
+            self._apply(self._pop_oldest(self.n - self.window), -1)
+        self._refresh()
+        return self._diff_rules()
+
+    def add_frame(self, df, transaction_cols=("police_district", "incident_date"), item_col="incident_category"):
+        return self.add(self.masks_from_frame(df, transaction_cols, item_col))
+
+    def expire(self, n_transactions):
+        """Drop the oldest `n_transactions` explicitly (e.g. a day-based window)."""
+        self._apply(self._pop_oldest(n_transactions), -1)
+        self._refresh()
+        return self._diff_rules()
+
+    def frequent_itemsets(self):
+        return {s: self.counts[s] for s in self.frequent}
+
+    def changes_frame(self, changes):
+        """Readable frame of a RuleChanges result (status = added / removed)."""
+        rows = [(status, ", ".join(sorted(self.items[i] for i in r.antecedents)),
+                 ", ".join(sorted(self.items[i] for i in r.consequents)), r.support, r.confidence, r.lift)
+                for status, rules in (("added", changes.added), ("removed", changes.removed)) for r in rules]
+        return pd.DataFrame(rows, columns=["status", "antecedents", "consequents", "support", "confidence", "lift"])
+
+
+def benchmark_incremental(df, initial_days=90, steps=30, window_days=None, min_support=0.01,
+                          min_confidence=0.3, min_lift=1.2, max_side_len=2, verbose=True):
+    """
+    Replay `df` day by day: after an initial window of `initial_days`, add one
+    day at a time (expiring the oldest day if `window_days` is set) and time the
+    incremental update against a full re-mine (basket build + Eclat + rules) of
+    the same window. Also checks both produce identical frequent itemsets.
+    """
+    days = np.sort(df["incident_date"].unique())
+    by_day = {day: group for day, group in df.groupby("incident_date", sort=False)}
+    items = sorted(df["incident_category"].dropna().unique())
+    miner = IncrementalMiner(items, min_support, min_confidence, min_lift, max_side_len=max_side_len)
+
+    window = deque()
+    for day in days[:initial_days]:
+        window.append((day, miner.masks_from_frame(by_day[day])))
+    miner.add(np.concatenate([m for _, m in window]))
+
+    inc_times, full_times, consistent = [], [], True
+    for day in days[initial_days:initial_days + steps]:
+        t0 = time.perf_counter()
+        masks = miner.masks_from_frame(by_day[day])
+        window.append((day, masks))
+        miner.add(masks)
+        if window_days is not None and len(window) > window_days:
+            _, old = window.popleft()
+            miner.expire(len(old))
+        inc_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        frame = pd.concat([by_day[d] for d, _ in window], ignore_index=True)
+        basket = TransactionBitsets.from_frame(frame, item_col="incident_category")
+        full = frequent_itemsets(basket, min_support)
+        sum(1 for _ in iter_rules(full, basket.n_transactions, min_confidence, min_lift, max_side_len))
+        full_times.append(time.perf_counter() - t0)
+
+        names = {frozenset(basket.items[i] for i in s): c for s, c in full.items()}
+        ours = {frozenset(items[i] for i in s): c for s, c in miner.frequent_itemsets().items()}
+        consistent &= names == ours
+
+    result = {
+        "steps": len(inc_times),
+        "window_transactions": miner.n,
+        "incremental_ms_median": float(np.median(inc_times) * 1e3) if inc_times else None,
+        "full_ms_median": float(np.median(full_times) * 1e3) if full_times else None,
+        "consistent": bool(consistent),
+    }
+    if inc_times:
+        result["speedup"] = result["full_ms_median"] / max(result["incremental_ms_median"], 1e-9)
+    if verbose:
+        print(f"Incremental vs full re-mine over {result['steps']} days: "
+              f"{result['incremental_ms_median']:.1f} ms vs {result['full_ms_median']:.1f} ms "
+              f"(x{result.get('speedup', 0):.1f}), consistent={result['consistent']}")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .store import open_clean_store
+
+    parser = argparse.ArgumentParser(description="Incremental vs full frequent-pattern mining benchmark")
+    parser.add_argument("--initial-days", type=int, default=365)
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--window-days", type=int, default=None)
+    parser.add_argument("--min-support", type=float, default=0.01)
+    args = parser.parse_args()
+    frame = open_clean_store().read(columns=["police_district", "incident_date", "incident_category"])
+    benchmark_incremental(frame, args.initial_days, args.steps, args.window_days, args.min_support)
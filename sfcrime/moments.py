@@ -0,0 +1,361 @@
+"""
+One-pass, mergeable summary statistics and correlations for the EDA section.
+
+The EDA cells scan the frame once each for `describe()`, median, variance,
+skew and kurtosis. They build `df[numerical_cols].corr()` twice: before and
+after dropping `row_id` / `incident_year` / `incident_number` /
+`supervisor_district_2012`. High-correlation pairs come from a nested loop
+over `iloc[i, j]`. Here a single pass per partition fills a `Moments`
+accumulator:
+
+- per column: count, mean, M2, M3, M4 (Pébay's pairwise update), min, max,
+  and a `QuantileSketch` for the median and quartiles
+- per column pair: pairwise-complete count, means, co-moment and the two
+  variances (Chan's update, vectorized as d x d matrix products per chunk),
+  so `corr()` matches pandas' pairwise NaN handling and any column subset
+  (e.g. the "cleaned" heatmap) is just an index into the same matrices
+
+Accumulators are merged exactly. Partitions are scanned in parallel
+processes and the per-partition results are cached by partition version.
+After a sync only the partitions that changed are rescanned.
+
+Usage:
+    m = store_moments()                   # incremental over the cleaned store
+    m.describe(); m.additional()          # describe() / Median, Variance, Skewness, Kurtosis
+    corr = m.corr(MODEL_NUMERIC_COLS)     # after dropping the redundant id columns
+    high_corr_pairs(corr)                 # |r| > 0.7
+    python -m sfcrime.moments --publish   # coorelation_heatmap(_cleaned) artifacts
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .config import CLEAN_STORE_DIR, DATA_DIR, MODEL_NUMERIC_COLS, NUMERIC_COLS
+from .sketches import QuantileSketch
+
+# Columns the notebook drops before the second correlation matrix
+EDA_DROPPED_COLS = ['row_id', 'incident_year', 'incident_number', 'supervisor_district_2012']
+HIGH_CORR = 0.7
+MOMENTS_CACHE = os.path.join(DATA_DIR, "eda", "moments.pkl")
+
+
+def _div(a, b):
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b > 0)
+
+
+class Moments:
+    """
+    Mergeable univariate moments, pairwise co-moments and quantile sketches over `columns`.
+    - sketch_k: QuantileSketch accuracy parameter (median / quartiles)
+    """
+    def __init__(self, columns=NUMERIC_COLS, sketch_k=400):
+        self.columns = list(columns)
+        d = len(self.columns)
+        self.n = np.zeros(d)
+        self.mean = np.zeros(d)
+        self.m2, self.m3, self.m4 = np.zeros(d), np.zeros(d), np.zeros(d)
+        self.min = np.full(d, np.inf)
+        self.max = np.full(d, -np.inf)
+        # Pairwise-complete statistics: [i, j] describes column i over rows where i and j are both present
+        self.pair_n = np.zeros((d, d))
+        self.pair_mean = np.zeros((d, d))
+        self.pair_m2 = np.zeros((d, d))
+        self.comoment = np.zeros((d, d))
+        self.sketches = [QuantileSketch(sketch_k, seed=i) for i in range(d)]
+
+    # -----------------------------
+    # Accumulation
+    # -----------------------------
+    def update(self, X):
+        """Add one chunk (DataFrame with `columns`, or a 2-D array in that order)."""
+        if isinstance(X, pd.DataFrame):
+            X = X[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return self
+        chunk = Moments.__new__(Moments)
+        chunk.columns = self.columns
+        valid = ~np.isnan(X)
+        V = valid.astype(np.float64)
+        chunk.n = V.sum(axis=0)
+        chunk.mean = _div(np.where(valid, X, 0.0).sum(axis=0), chunk.n)
+        # Centre on the chunk means first so the raw-sum formulas below don't cancel catastrophically
+        D = np.where(valid, X - chunk.mean, 0.0)
+        D2 = D * D
+        chunk.m2, chunk.m3, chunk.m4 = D2.sum(axis=0), (D2 * D).sum(axis=0), (D2 * D2).sum(axis=0)
+        chunk.min = np.where(valid, X, np.inf).min(axis=0)
+        chunk.max = np.where(valid, X, -np.inf).max(axis=0)
+        chunk.pair_n = V.T @ V
+        S = D.T @ V                                   # sum of centred x_i over rows where i and j are present
+        chunk.pair_mean = chunk.mean[:, None] + _div(S, chunk.pair_n)
+        chunk.pair_m2 = D2.T @ V - _div(S * S, chunk.pair_n)
+        chunk.comoment = D.T @ D - _div(S * S.T, chunk.pair_n)
+        chunk.sketches = []
+        self._merge_arrays(chunk)
+        for sketch, values in zip(self.sketches, X.T):
+            sketch.update(values)
+        return self
+
+    def merge(self, other):
+        """Fold `other` (same columns) into this accumulator."""
+        if other.columns != self.columns:
+            raise ValueError("cannot merge moments over different columns")
+        self._merge_arrays(other)
+        for mine, theirs in zip(self.sketches, other.sketches):
+            mine.merge(theirs)
+        return self
+
+    def _merge_arrays(self, b):
+        na, nb = self.n, b.n
+        n = na + nb
+        delta = b.mean - self.mean
+        d2 = delta * delta
+        m2 = self.m2 + b.m2 + _div(d2 * na * nb, n)
+        m3 = (self.m3 + b.m3 + _div(d2 * delta * na * nb * (na - nb), n * n)
+              + _div(3 * delta * (na * b.m2 - nb * self.m2), n))
+        m4 = (self.m4 + b.m4 + _div(d2 * d2 * na * nb * (na * na - na * nb + nb * nb), n ** 3)
+              + _div(6 * d2 * (na * na * b.m2 + nb * nb * self.m2), n * n)
+              + _div(4 * delta * (na * b.m3 - nb * self.m3), n))
+        self.mean = self.mean + _div(delta * nb, n)
+        self.m2, self.m3, self.m4, self.n = m2, m3, m4, n
+        self.min, self.max = np.minimum(self.min, b.min), np.maximum(self.max, b.max)
+
+        pa_, pb_ = self.pair_n, b.pair_n
+        pn = pa_ + pb_
+        f = _div(pa_ * pb_, pn)
+        pdelta = b.pair_mean - self.pair_mean
+        self.comoment = self.comoment + b.comoment + pdelta * pdelta.T * f
+        self.pair_m2 = self.pair_m2 + b.pair_m2 + pdelta * pdelta * f
+        self.pair_mean = self.pair_mean + _div(pdelta * pb_, pn)
+        self.pair_n = pn
+
+    # -----------------------------
+    # Statistics (pandas conventions: ddof=1, bias-corrected skew / excess kurtosis)
+    # -----------------------------
+    def _series(self, values, columns=None):
+        s = pd.Series(values, index=self.columns)
+        return s[list(columns)] if columns is not None else s
+
+    def count(self, columns=None):
+        return self._series(self.n.astype(np.int64), columns)
+
+    def var(self, columns=None):
+        return self._series(np.where(self.n > 1, _div(self.m2, self.n - 1), np.nan), columns)
+
+    def std(self, columns=None):
+        return np.sqrt(self.var(columns))
+
+    def skew(self, columns=None):
+        n, m2, m3 = self.n, self.m2, self.m3
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g = np.sqrt(n - 1) * n * m3 / ((n - 2) * m2 ** 1.5)
+        return self._series(np.where((n > 2) & (m2 > 0), g, np.nan), columns)
+
+    def kurtosis(self, columns=None):
+        n, m2, m4 = self.n, self.m2, self.m4
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g = n * (n + 1) * (n - 1) * m4 / ((n - 2) * (n - 3) * m2 ** 2) - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        return self._series(np.where((n > 3) & (m2 > 0), g, np.nan), columns)
+
+    def quantile(self, q, columns=None):
+        return self._series([s.quantile(q) if s.n else np.nan for s in self.sketches], columns)
+
+    def median(self, columns=None):
+        return self.quantile(0.5, columns)
+
+    def describe(self, columns=None):
+        """`DataFrame.describe()` layout; quartiles come from the sketches (rank error ~0.5%)."""
+        mean = np.where(self.n > 0, self.mean, np.nan)
+        return pd.DataFrame({
+            'count': self.count(), 'mean': self._series(mean), 'std': self.std(),
+            'min': self._series(np.where(self.n > 0, self.min, np.nan)),
+            '25%': self.quantile(0.25), '50%': self.quantile(0.5), '75%': self.quantile(0.75),
+            'max': self._series(np.where(self.n > 0, self.max, np.nan)),
+        }).T[list(columns) if columns is not None else self.columns]
+
+    def additional(self, columns=None):
+        """The notebook's "Additional Statistics" table."""
+        return pd.DataFrame({'Median': self.median(columns), 'Variance': self.var(columns),
+                             'Skewness': self.skew(columns), 'Kurtosis': self.kurtosis(columns)})
+
+    def corr(self, columns=None):
+        """Pearson correlation with pairwise-complete observations, like `DataFrame.corr()`."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = self.comoment / np.sqrt(self.pair_m2 * self.pair_m2.T)
+        r = np.where(self.pair_n > 1, np.clip(r, -1, 1), np.nan)
+        frame = pd.DataFrame(r, index=self.columns, columns=self.columns)
+        return frame.loc[list(columns), list(columns)] if columns is not None else frame
+
+
+def high_corr_pairs(corr, threshold=HIGH_CORR):
+    """Feature pairs above |threshold| in the upper triangle (the notebook's loop, vectorized)."""
+    values = corr.to_numpy()
+    i, j = np.triu_indices(len(values), k=1)
+    hit = np.abs(values[i, j]) > threshold
+    return pd.DataFrame({'Feature 1': corr.columns[i[hit]], 'Feature 2': corr.columns[j[hit]],
+                         'Correlation': values[i[hit], j[hit]]})
+
+
+def plot_heatmap(corr, title='Correlation Matrix Heatmap'):
+    """The notebook's seaborn heatmap of a correlation matrix."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    sns.heatmap(corr, annot=True, cmap='coolwarm', center=0, square=True, linewidths=1, fmt='.2f',
+                cbar_kws={"shrink": 0.8}, ax=ax)
+    ax.set_title(title)
+    fig.tight_layout()
+    return fig
+
+
+def box_stats(m, columns, whisker=1.5):
+    """
+    `Axes.bxp` statistics per column from the sketch quartiles. Whiskers end at the IQR fences
+    (clipped to min / max); the min and max are the fliers when they lie beyond them.
+    """
+    stats = []
+    q1, med, q3 = m.quantile(0.25, columns), m.median(columns), m.quantile(0.75, columns)
+    lo, hi = m._series(m.min, columns), m._series(m.max, columns)
+    for col in columns:
+        iqr = q3[col] - q1[col]
+        whislo, whishi = max(lo[col], q1[col] - whisker * iqr), min(hi[col], q3[col] + whisker * iqr)
+        stats.append({'label': col, 'q1': q1[col], 'med': med[col], 'q3': q3[col], 'whislo': whislo,
+                      'whishi': whishi, 'fliers': [v for v in (lo[col], hi[col]) if v < whislo or v > whishi]})
+    return stats
+
+
+def qq_points(m, columns, n_points=99, whisker=1.5):
+    """
+    Normal QQ points per column: sketch quantiles at `n_points` probabilities against the
+    standard normal quantiles, keeping the points inside the IQR fences like the notebook.
+    """
+    from scipy import stats
+
+    p = np.arange(1, n_points + 1) / (n_points + 1)
+    theoretical = stats.norm.ppf(p)
+    points = {}
+    for col, sketch in zip(m.columns, m.sketches):
+        if col not in columns or not sketch.n:
+            continue
+        sample = sketch.quantile(p)
+        q1, q3 = sketch.quantile([0.25, 0.75])
+        keep = (sample >= q1 - whisker * (q3 - q1)) & (sample <= q3 + whisker * (q3 - q1))
+        points[col] = (theoretical[keep], sample[keep])
+    return points
+
+
+def _grid(n, n_cols=3):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    n_rows = max(1, -(-n // n_cols))
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=(15, 5 * n_rows), squeeze=False)
+    for ax in axes.flat[n:]:
+        ax.set_visible(False)
+    return fig, axes.flat
+
+
+def plot_boxplots(stats):
+    """One box per numeric column (own scale each), from `box_stats`."""
+    fig, axes = _grid(len(stats))
+    for ax, box in zip(axes, stats):
+        ax.bxp([box], showfliers=True)
+        ax.set_title(f'Box Plot: {box["label"]}')
+        ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    return fig
+
+
+def plot_qq(points):
+    """The notebook's QQ plot grid, from `qq_points`."""
+    fig, axes = _grid(len(points))
+    for ax, (col, (x, y)) in zip(axes, points.items()):
+        ax.plot(x, y, 'o', markersize=4)
+        if len(x) > 1:
+            slope, intercept = np.polyfit(x, y, 1)
+            ax.plot(x, slope * x + intercept, 'r-')
+        ax.set_title(f'QQ Plot: {col}')
+        ax.set_xlabel('Theoretical quantiles')
+        ax.set_ylabel('Ordered Values')
+        ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    return fig
+
+
+# -----------------------------
+# Store scan
+# -----------------------------
+def partition_moments(root, part, columns, present, sketch_k=400):
+    """Worker: moments of one store partition (`present`: the subset of `columns` the store has)."""
+    from .store import open_clean_store
+
+    df = open_clean_store(root).read_partition(part, columns=present)
+    for c in columns:
+        if c not in df.columns:
+            df[c] = np.nan
+    return Moments(columns, sketch_k).update(df)
+
+
+def store_moments(store=None, columns=NUMERIC_COLS, sketch_k=400, max_workers=None, cache_path=MOMENTS_CACHE,
+                  verbose=True):
+    """
+    Moments of `columns` over the cleaned store. Per-partition accumulators are cached with the
+    partition version, so only partitions written since the last call are rescanned (in parallel).
+    """
+    from .store import open_clean_store
+
+    t0 = time.perf_counter()
+    store = store or open_clean_store()
+    columns = list(columns)
+    present = [c for c in columns if c in store.dataset().schema.names]
+    results, stale = store.map_partitions(partition_moments, (columns, present, sketch_k), cache_path=cache_path,
+                                          cache_key=(columns, sketch_k), max_workers=max_workers)
+    total = Moments(columns, sketch_k)
+    for moments in results.values():
+        total.merge(moments)
+    if verbose:
+        print(f"Moments ✅ {int(total.n.max()) if len(total.n) else 0:,} rows, {len(stale)} of {len(results)} "
+              f"partitions rescanned in {time.perf_counter() - t0:.1f}s")
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .store import open_clean_store
+
+    parser = argparse.ArgumentParser(description="Streaming summary statistics and correlations of the cleaned store")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--publish", action="store_true", help="publish the two correlation heatmaps")
+    args = parser.parse_args()
+
+    store = open_clean_store(CLEAN_STORE_DIR)
+    m = store_moments(store, max_workers=args.workers)
+    present = [c for c in m.columns if m.n[m.columns.index(c)] > 0]
+    cleaned = [c for c in MODEL_NUMERIC_COLS if c in present]
+    pd.set_option('display.width', 200)
+    print("\nNumerical Features Summary:")
+    print(m.describe(present))
+    print("\nAdditional Statistics:")
+    print(m.additional(present))
+    corr, corr_cleaned = m.corr(present), m.corr(cleaned)
+    print("\nHighly Correlated Features (|r| > 0.7):")
+    pairs = high_corr_pairs(corr)
+    print(pairs.to_string(index=False) if len(pairs) else "  No highly correlated pairs found")
+    print("\n--- New Correlation Matrix ---")
+    print(corr_cleaned)
+    if args.publish:
+        from .artifacts import ArtifactStore
+
+        artifacts = ArtifactStore()
+        artifacts.publish("coorelation_heatmap", figure=plot_heatmap(corr), caption="Correlation Matrix Heatmap",
+                          data_version=store.version)
+        artifacts.publish("coorelation_heatmap_cleaned", figure=plot_heatmap(corr_cleaned),
+                          caption="Correlation Matrix Heatmap (after dropping redundant columns)",
+                          data_version=store.version)
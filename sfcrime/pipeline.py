@@ -0,0 +1,485 @@
+"""
+Cached, resumable stage DAG for the notebook pipeline.
+
+The notebooks run top to bottom and hand results from cell to cell through
+kernel globals (the LightGBM cell even checks `missing = [v for v in required
+if v not in globals()]`), so any change means re-running everything by hand.
+Here the same pipeline is a DAG of named stages:
+
+    ingest -> clean -> features -> xgb, lgbm ------+
+                    -> pca -> svm, kmeans ---------+-> artifacts
+                    -> apriori --------------------+
+
+- a stage's cache key hashes its name, code version, parameters and the
+  content hashes (digests) of its inputs. A finished stage is pickled to
+  `data/pipeline/<stage>/<key>.pkl` with a small `.json` holding its digest,
+  so a stage whose key is cached is skipped without loading its output
+- `ingest` reads an external source and always runs (an incremental pull
+  into the raw store); when it brings nothing new its digest is unchanged
+  and everything downstream stays cached
+- a stage starts as soon as its inputs are ready. The model branches run
+  concurrently in a process pool and load their inputs from the cache
+  rather than through the pool's pipes
+- every finished stage is cached on its own: re-running after a failure
+  resumes at the failed stage (branches that did not depend on it still
+  finish), and overriding one parameter (`--set xgb.max_depth=6`) re-runs
+  only that stage and what depends on it
+
+Usage:
+    result = run()                                    # everything, from the cache where possible
+    result = run(targets=["svm"], fetch=False)        # svm and its upstream stages, no SODA pull
+    result = run(overrides={"xgb": {"max_depth": 6}})
+    result.output("xgb")                              # the ModelBundle
+    python -m sfcrime.pipeline --plan                 # what would run
+    python -m sfcrime.pipeline --no-fetch --set xgb.max_depth=6 --set kmeans.k_max=12
+"""
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from .config import (API_ENDPOINT, CLEAN_STORE_DIR, DATA_DIR, MAX_PAGE_SIZE, MODEL_NUMERIC_COLS, NUMERIC_COLS,
+                     RAW_STORE_DIR, WATERMARK_PATH)
+from .telemetry import span
+
+PIPELINE_DIR = os.path.join(DATA_DIR, "pipeline")
+# Cached outputs kept per stage; older keys are pruned after each run of the stage
+KEEP_PER_STAGE = 3
+
+
+# -----------------------------
+# Stage functions
+# -----------------------------
+# Each takes the outputs of its dependencies as a dict plus its parameters as keywords,
+# and returns a picklable output. They are module-level so the process pool can import them.
+def ingest_stage(inputs, root=RAW_STORE_DIR, endpoint=API_ENDPOINT, fetch=True, watermark_path=WATERMARK_PATH,
+                 page_size=MAX_PAGE_SIZE, max_workers=8):
+    from .store import open_raw_store
+    from .sync import Watermark, pull_delta
+
+    raw_store = open_raw_store(root)
+    if fetch:
+        # The clean stage re-cleans from raw store versions, so the mark can be saved right away
+        _, _, mark = pull_delta(raw_store, Watermark.load(watermark_path), endpoint, page_size=page_size,
+                                max_workers=max_workers, verbose=False)
+        mark.save(watermark_path)
+    return {'root': raw_store.root, 'version': raw_store.version}
+
+
+def clean_stage(inputs, root=CLEAN_STORE_DIR, iqr_cols=NUMERIC_COLS, previous=None):
+    from .cleaning import clean_store_from_raw, load_bounds
+    from .store import open_clean_store, open_raw_store
+    from .sync import reclean_partitions
+
+    raw_store, clean_store = open_raw_store(inputs['ingest']['root']), open_clean_store(root)
+    if (previous is not None and previous['iqr_cols'] == list(iqr_cols) and previous['version'] == clean_store.version
+            and load_bounds(clean_store.root) is not None):
+        # Only raw partitions written since the last clean, with the saved IQR bounds (as `sync` does)
+        reclean_partitions(raw_store, clean_store, raw_store.changed_since(previous['raw_version']))
+    else:
+        clean_store_from_raw(raw_store, clean_store, list(iqr_cols), verbose=False)
+    return {'root': clean_store.root, 'version': clean_store.version, 'raw_version': raw_store.version,
+            'iqr_cols': list(iqr_cols)}
+
+
+def features_stage(inputs, cap_percentile=95.0, test_size=0.2, seed=42, n_folds=5):
+    from .response import load_response_frame, prepare
+    from .store import open_clean_store
+
+    frame = load_response_frame(open_clean_store(inputs['clean']['root']))
+    return prepare(frame, cap_percentile, test_size, seed, n_folds)
+
+
+def pca_stage(inputs, columns=MODEL_NUMERIC_COLS, variance=0.95):
+    from .clustering import GEO_FEATURES
+    from .features import load_or_fit
+    from .store import open_clean_store
+
+    # Both transforms are fitted here, in the main process, so only one process publishes artifacts
+    store = open_clean_store(inputs['clean']['root'])
+    return {'features': load_or_fit(store, list(columns), variance, verbose=False),
+            'geo': load_or_fit(store, GEO_FEATURES, name="geo_transform", verbose=False)}
+
+
+def apriori_stage(inputs, min_support=0.01, min_confidence=0.3, min_lift=1.2, max_side_len=2):
+    from .mining import basket_from_store, frequent_itemsets, itemsets_frame, rules_frame
+    from .store import open_clean_store
+
+    basket = basket_from_store(open_clean_store(inputs['clean']['root']))
+    itemsets = frequent_itemsets(basket, min_support)
+    return {'itemsets': itemsets_frame(basket, itemsets),
+            'rules': rules_frame(basket, itemsets, min_confidence, min_lift, max_side_len)}
+
+
+def kmeans_stage(inputs, k_min=2, k_max=10, epochs=1, max_workers=1):
+    from .clustering import StoreBatches, sweep_k
+
+    results, _ = sweep_k(StoreBatches(inputs['clean']['root']), range(k_min, k_max + 1), max_workers, epochs,
+                         transform=inputs['pca']['geo'], verbose=False)
+    return results
+
+
+def svm_stage(inputs, kernel="rff", n_components=500, epochs=2, sample_rows=20_000):
+    from .classify import KernelSGDClassifier
+    from .config import DISTRICT_COL
+    from .store import open_clean_store
+
+    store = open_clean_store(inputs['clean']['root'])
+    chunks = lambda: store.iter_frames(columns=MODEL_NUMERIC_COLS + [DISTRICT_COL])  # noqa: E731
+    model = KernelSGDClassifier(kernel=kernel, n_components=n_components, epochs=epochs,
+                                transform=inputs['pca']['features']).fit(chunks, verbose=False)
+    # A slice of rows for the decision-boundary plot, so the artifacts stage does not rescan the store
+    return {'model': model, 'evaluation': model.evaluate(chunks),
+            'sample': next(iter(chunks())).head(sample_rows)}
+
+
+def boosting_stage(inputs, kind="xgb", cpu_budget=1, **params):
+    from .serving import train_bundle
+
+    return train_bundle(kind, cpu_budget=cpu_budget, publish=False, verbose=False, data=inputs['features'],
+                        data_version=inputs['clean']['version'], params=params)
+
+
+def artifacts_stage(inputs, max_workers=None):
+    from .artifacts import ArtifactStore
+    from .report import render_report
+    from .serving import publish_bundle
+    from .store import open_clean_store
+
+    artifacts = ArtifactStore()
+    # Report images whose inputs changed, drawn in parallel from this run's model outputs
+    report = render_report(open_clean_store(inputs['clean']['root']), artifacts=artifacts, max_workers=max_workers,
+                           models={stage: inputs[stage] for stage in ("apriori", "kmeans", "svm", "pca")},
+                           verbose=False)
+    if report.errors:
+        raise RuntimeError("report figures failed: " + "; ".join(f"{n}: {e}" for n, e in report.errors.items()))
+    # The app serves one response-time model: the regressor with the lower test RMSE
+    best = min((inputs['xgb'], inputs['lgbm']), key=lambda bundle: bundle.metrics['rmse'])
+    published = {name: artifacts.entry(name)['version'] for name in report.status}
+    published['response_time_model'] = publish_bundle(best, artifacts)['version']
+    return published
+
+
+def store_current(output):
+    """The store a stage wrote is still at the version its cached output describes (no other run rewrote it)."""
+    from .store import IncidentStore
+
+    return IncidentStore(output['root']).version == output['version']
+
+
+def artifacts_current(output):
+    """The images and model published by `artifacts_stage` are still the current versions."""
+    from .artifacts import ArtifactStore
+
+    artifacts = ArtifactStore()
+    return all((artifacts.entry(name) or {}).get('version') == version for name, version in output.items())
+
+
+# -----------------------------
+# DAG
+# -----------------------------
+@dataclass
+class Stage:
+    """
+    One node of the DAG.
+    - process: run in the process pool (independent, CPU-bound branches)
+    - volatile: reads an external source, so it runs every time; downstream keys follow its digest
+    - incremental: `fn` also receives the stage's last cached output as `previous`
+    - valid: predicate on a cached output; False re-runs the stage (its outputs live outside the cache)
+    - version: bump when the stage's code changes what it produces
+    """
+    name: str
+    fn: callable
+    deps: tuple = ()
+    params: dict = field(default_factory=dict)
+    process: bool = False
+    volatile: bool = False
+    incremental: bool = False
+    valid: callable = None
+    version: int = 1
+
+
+STAGES = [
+    Stage("ingest", ingest_stage, volatile=True, valid=store_current),
+    Stage("clean", clean_stage, ("ingest",), incremental=True, valid=store_current),
+    Stage("features", features_stage, ("clean",)),
+    Stage("pca", pca_stage, ("clean",)),
+    Stage("apriori", apriori_stage, ("clean",), process=True),
+    Stage("kmeans", kmeans_stage, ("clean", "pca"), process=True),
+    Stage("svm", svm_stage, ("clean", "pca"), process=True),
+    Stage("xgb", boosting_stage, ("clean", "features"), {'kind': "xgb"}, process=True),
+    Stage("lgbm", boosting_stage, ("clean", "features"), {'kind': "lgbm"}, process=True),
+    Stage("artifacts", artifacts_stage, ("clean", "pca", "apriori", "kmeans", "svm", "xgb", "lgbm"),
+          valid=artifacts_current),
+]
+
+
+def _digest(payload):
+    return hashlib.sha256(payload).hexdigest()
+
+
+def stage_key(stage, params, input_digests):
+    """Content hash of everything a stage's output depends on."""
+    spec = {'stage': stage.name, 'version': stage.version, 'params': params,
+            'inputs': {dep: input_digests[dep] for dep in stage.deps}}
+    return _digest(json.dumps(spec, sort_keys=True, default=str).encode())[:24]
+
+
+class StageCache:
+    """`<root>/<stage>/<key>.pkl` (the pickled output) plus `<key>.json` (digest, timing, parameters)."""
+    def __init__(self, root=PIPELINE_DIR, keep=KEEP_PER_STAGE):
+        self.root = root
+        self.keep = keep
+
+    def path(self, stage, key, ext=".pkl"):
+        return os.path.join(self.root, stage, key + ext)
+
+    def meta(self, stage, key):
+        path = self.path(stage, key, ".json")
+        if not (os.path.exists(path) and os.path.exists(self.path(stage, key))):
+            return None
+        with open(path) as fh:
+            return json.load(fh)
+
+    def latest(self, stage):
+        """Metadata of the most recently written entry of `stage` (None if there is none)."""
+        directory = os.path.join(self.root, stage)
+        if not os.path.isdir(directory):
+            return None
+        metas = [m for m in (self.meta(stage, f[:-5]) for f in os.listdir(directory) if f.endswith(".json")) if m]
+        return max(metas, key=lambda m: m['finished_at']) if metas else None
+
+    def load(self, stage, key):
+        with open(self.path(stage, key), "rb") as fh:
+            return pickle.load(fh)
+
+    def save(self, stage, key, output, meta):
+        """Write `output` atomically (pickle first, then the metadata that marks it complete)."""
+        os.makedirs(os.path.join(self.root, stage), exist_ok=True)
+        payload = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {**meta, 'stage': stage, 'key': key, 'digest': _digest(payload), 'bytes': len(payload),
+                'finished_at': time.time()}
+        for ext, data, mode in ((".pkl", payload, "wb"), (".json", json.dumps(meta, indent=2, default=str), "w")):
+            path = self.path(stage, key, ext)
+            with open(path + ".tmp", mode) as fh:
+                fh.write(data)
+            os.replace(path + ".tmp", path)
+        self._prune(stage)
+        return meta
+
+    def _prune(self, stage):
+        directory = os.path.join(self.root, stage)
+        keys = sorted((f[:-5] for f in os.listdir(directory) if f.endswith(".json")),
+                      key=lambda k: os.path.getmtime(self.path(stage, k, ".json")))
+        for key in keys[:-self.keep]:
+            for ext in (".pkl", ".json"):
+                if os.path.exists(self.path(stage, key, ext)):
+                    os.remove(self.path(stage, key, ext))
+
+
+def _execute(cache_root, stage, key, params, input_keys, previous_key):
+    """Run one stage (in this process or a pool worker): load inputs from the cache, run, cache the output."""
+    cache = StageCache(cache_root)
+    inputs = {dep: cache.load(dep, k) for dep, k in input_keys.items()}
+    kwargs = dict(params)
+    if stage.incremental:
+        kwargs['previous'] = cache.load(stage.name, previous_key) if previous_key else None
+    t0 = time.perf_counter()
+    with span(f"pipeline.{stage.name}"):
+        output = stage.fn(inputs, **kwargs)
+    return cache.save(stage.name, key, output, {'seconds': time.perf_counter() - t0, 'params': params,
+                                                 'inputs': input_keys})
+
+
+@dataclass
+class StageRun:
+    name: str
+    status: str            # 'cached', 'ran', 'failed' or 'blocked' (an upstream stage failed)
+    key: str = None
+    seconds: float = 0.0
+    error: str = None
+
+
+@dataclass
+class RunResult:
+    stages: dict                        # name -> StageRun, in completion order
+    cache_root: str = PIPELINE_DIR
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return all(run.status in ('cached', 'ran') for run in self.stages.values())
+
+    def output(self, name):
+        """Output of a finished stage, loaded from the cache."""
+        return StageCache(self.cache_root).load(name, self.stages[name].key)
+
+
+def _select(stages, targets):
+    """`stages` restricted to `targets` and everything upstream of them, in declaration order."""
+    by_name = {s.name: s for s in stages}
+    if not targets:
+        return list(stages)
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in by_name:
+            raise KeyError(f"unknown stage {name!r} (stages: {', '.join(by_name)})")
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].deps)
+    return [s for s in stages if s.name in needed]
+
+
+def plan(stages=STAGES, targets=None, overrides=None, cache_root=PIPELINE_DIR):
+    """
+    {stage: 'cached' | 'run'} without running anything. Volatile stages are assumed
+    to reproduce their last output, so this is what a run with no new data would do.
+    """
+    cache, overrides = StageCache(cache_root), overrides or {}
+    digests, status = {}, {}
+    for stage in _select(stages, targets):
+        if any(digests.get(dep) is None for dep in stage.deps):
+            status[stage.name], digests[stage.name] = 'run', None
+            continue
+        if stage.volatile:
+            latest = cache.latest(stage.name)
+            status[stage.name], digests[stage.name] = 'run', latest and latest['digest']
+            continue
+        key = stage_key(stage, {**stage.params, **overrides.get(stage.name, {})}, digests)
+        meta = cache.meta(stage.name, key)
+        if meta and stage.valid is not None and not stage.valid(cache.load(stage.name, key)):
+            meta = None
+        status[stage.name], digests[stage.name] = ('cached', meta['digest']) if meta else ('run', None)
+    return status
+
+
+def run(stages=STAGES, targets=None, overrides=None, force=(), fetch=True, max_workers=None,
+        cache_root=PIPELINE_DIR, verbose=True):
+    """
+    Run the DAG (or `targets` and their upstream stages), skipping stages whose key is cached.
+    - overrides: {stage: {param: value}} on top of each stage's defaults
+    - force: stage names to re-run even when cached (their dependents follow their new digest)
+    - fetch: False keeps `ingest` to the raw store as it is (no SODA request)
+    - max_workers: process pool size for the `process` stages (default: one per CPU, at most one per branch)
+    Failed stages are reported, not raised; their dependents are 'blocked' and everything else finishes.
+    """
+    t0 = time.perf_counter()
+    cache = StageCache(cache_root)
+    overrides = {name: dict(values) for name, values in (overrides or {}).items()}
+    overrides.setdefault("ingest", {}).setdefault('fetch', fetch)
+    selected = _select(stages, targets)
+    pending = {s.name: s for s in selected}
+    done = {}       # name -> (key, digest)
+    runs = {}
+    running = {}    # future -> stage
+
+    def log(run_):
+        runs[run_.name] = run_
+        if verbose:
+            detail = f" ({run_.seconds:.1f}s)" if run_.status == 'ran' else ""
+            detail += f": {run_.error}" if run_.error else ""
+            print(f"  {run_.name:<10} {run_.status}{detail}")
+
+    def schedule(stage):
+        """Key, parameters and input keys of a ready stage; None (after logging it) when it is cached."""
+        params = {**stage.params, **overrides.get(stage.name, {})}
+        key = stage_key(stage, params, {dep: done[dep][1] for dep in stage.deps})
+        meta = cache.meta(stage.name, key)
+        if (meta and not stage.volatile and stage.name not in force
+                and (stage.valid is None or stage.valid(cache.load(stage.name, key)))):
+            done[stage.name] = (key, meta['digest'])
+            log(StageRun(stage.name, 'cached', key))
+            return None
+        previous = cache.latest(stage.name) if stage.incremental else None
+        return key, params, {dep: done[dep][0] for dep in stage.deps}, previous and previous['key']
+
+    def finish(stage, key, meta=None, error=None):
+        if error is None:
+            done[stage.name] = (key, meta['digest'])
+            log(StageRun(stage.name, 'ran', key, meta['seconds']))
+        else:
+            log(StageRun(stage.name, 'failed', key, error=error))
+
+    n_process = sum(s.process for s in selected)
+    max_workers = max_workers or max(1, min(n_process, os.cpu_count() or 1))
+    with span("pipeline.run"), ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            progressed = False
+            for stage in list(pending.values()):
+                if any(dep in runs and runs[dep].status in ('failed', 'blocked') for dep in stage.deps):
+                    del pending[stage.name]
+                    log(StageRun(stage.name, 'blocked'))
+                    progressed = True
+                    continue
+                if not all(dep in done for dep in stage.deps):
+                    continue
+                del pending[stage.name]
+                progressed = True
+                job = schedule(stage)
+                if job is None:
+                    continue
+                if stage.process:
+                    running[pool.submit(_execute, cache_root, stage, *job)] = (stage, job[0])
+                    continue
+                try:
+                    finish(stage, job[0], _execute(cache_root, stage, *job))
+                except Exception as exc:
+                    finish(stage, job[0], error=f"{type(exc).__name__}: {exc}")
+            if progressed or not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key = running.pop(future)
+                error = future.exception()
+                finish(stage, key, None if error else future.result(),
+                       None if error is None else f"{type(error).__name__}: {error}")
+    result = RunResult(runs, cache_root, time.perf_counter() - t0)
+    if verbose:
+        counts = {status: sum(r.status == status for r in runs.values())
+                  for status in ('ran', 'cached', 'failed', 'blocked')}
+        summary = ", ".join(f"{n} {status}" for status, n in counts.items() if n)
+        print(f"Pipeline {'complete ✅' if result.ok else 'incomplete ❌'} {summary} in {result.seconds:.1f}s")
+    return result
+
+
+def _parse_overrides(items):
+    """`stage.param=value` strings -> {stage: {param: value}} (values parsed as JSON where possible)."""
+    overrides = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        stage, _, param = name.partition(".")
+        if not param or not _:
+            raise ValueError(f"expected stage.param=value, got {item!r}")
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        overrides.setdefault(stage, {})[param] = value
+    return overrides
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the cached ingest -> clean -> models -> artifacts DAG")
+    parser.add_argument("targets", nargs="*", help="stages to bring up to date (default: all)")
+    parser.add_argument("--set", action="append", default=[], metavar="STAGE.PARAM=VALUE",
+                        help="override a stage parameter, e.g. xgb.max_depth=6 (repeatable)")
+    parser.add_argument("--force", nargs="+", default=[], help="re-run these stages even when cached")
+    parser.add_argument("--no-fetch", action="store_true", help="use the raw store as it is (no SODA pull)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-dir", default=PIPELINE_DIR)
+    parser.add_argument("--plan", action="store_true", help="print what would run, without running it")
+    args = parser.parse_args()
+
+    overrides = _parse_overrides(args.set)
+    if args.plan:
+        for name, status in plan(STAGES, args.targets, overrides, args.cache_dir).items():
+            print(f"  {name:<10} {status}")
+    else:
+        result = run(STAGES, args.targets, overrides, args.force, not args.no_fetch, args.workers, args.cache_dir)
+        raise SystemExit(0 if result.ok else 1)
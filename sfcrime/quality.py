@@ -0,0 +1,304 @@
+"""
+Single-pass data-quality profile of the cleaned store.
+
+The quality section of the cleaning notebooks scans the frame once per check:
+overall and column-wise completeness, `str.lower().nunique()` vs `nunique()`
+on the object columns, min / max / future dates per datetime column, the San
+Francisco bounding box, the required-fields table, and the quality score
+built from them. A `QualityProfile` collects everything those checks need in
+one vectorized pass over a partition:
+
+- non-null counts per column, row count, datetime min / max / future counts,
+  rows outside the SF bounds
+- distinct and case-folded distinct counts per text column as `HyperLogLog`
+  sketches over the hashed unique values (exact while a column has few
+  distinct values, approximate for free text like `intersection`)
+
+Profiles merge exactly, and the per-partition profiles are cached by
+partition version, so after a sync only the new or rewritten months are
+profiled. Partitions with future-dated rows are re-profiled on every run,
+because a date that was in the future may no longer be.
+
+Usage:
+    report = store_quality()                 # incremental over the cleaned store
+    print_report(report)                     # the notebook's printout
+    report.overall_score, report.rating
+    python -m sfcrime.quality
+"""
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR
+from .sketches import HyperLogLog, hash_values
+
+# San Francisco approximate boundaries (the notebook's geographic check)
+SF_LAT_MIN, SF_LAT_MAX = 37.70, 37.83
+SF_LON_MIN, SF_LON_MAX = -122.52, -122.35
+REQUIRED_FIELDS = {
+    'incident_category': 'Crime classification',
+    'incident_datetime': 'Temporal analysis',
+    'latitude': 'Spatial analysis',
+    'longitude': 'Spatial analysis',
+    'police_district': 'District-level analysis',
+    'resolution': 'Case resolution tracking',
+}
+QUALITY_CACHE = os.path.join(DATA_DIR, "eda", "quality.pkl")
+
+
+def _is_text(series):
+    return isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series.dtype)
+
+
+class QualityProfile:
+    """
+    Mergeable counts behind the notebook's quality checks.
+    - hll_p: HyperLogLog precision for the distinct counts
+    """
+    def __init__(self, hll_p=14):
+        self.hll_p = hll_p
+        self.rows = 0
+        self.columns = []
+        self.non_null = {}
+        self.distinct = {}
+        self.distinct_folded = {}
+        self.dt_min, self.dt_max, self.future = {}, {}, {}
+        self.coord_rows = 0
+        self.outside_sf = 0
+
+    def _add_column(self, col):
+        if col not in self.non_null:
+            self.columns.append(col)
+            self.non_null[col] = 0
+
+    def update(self, df, now=None):
+        """Profile one frame; dates after `now` (default: the current time) count as future."""
+        now = pd.Timestamp.now() if now is None else now
+        self.rows += len(df)
+        for col in df.columns:
+            s = df[col]
+            self._add_column(col)
+            self.non_null[col] += int(s.notna().sum())
+            if pd.api.types.is_datetime64_any_dtype(s.dtype):
+                lo, hi = s.min(), s.max()
+                if pd.notna(lo):
+                    self.dt_min[col] = min(self.dt_min.get(col, lo), lo)
+                    self.dt_max[col] = max(self.dt_max.get(col, hi), hi)
+                self.future[col] = self.future.get(col, 0) + int((s > now).sum())
+            elif _is_text(s):
+                uniques = pd.Series(np.asarray(s.dropna().unique(), dtype=object))
+                self.distinct.setdefault(col, HyperLogLog(self.hll_p)).update_hashes(hash_values(uniques))
+                folded = uniques.astype(str).str.lower().unique()
+                self.distinct_folded.setdefault(col, HyperLogLog(self.hll_p)).update_hashes(hash_values(folded))
+        if 'latitude' in df.columns and 'longitude' in df.columns:
+            lat, lon = df['latitude'], df['longitude']
+            self.coord_rows += int((lat.notna() & lon.notna()).sum())
+            self.outside_sf += int(((lat < SF_LAT_MIN) | (lat > SF_LAT_MAX)
+                                    | (lon < SF_LON_MIN) | (lon > SF_LON_MAX)).sum())
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        for col in other.columns:
+            self._add_column(col)
+            self.non_null[col] += other.non_null[col]
+        for mine, theirs in ((self.distinct, other.distinct), (self.distinct_folded, other.distinct_folded)):
+            for col, sketch in theirs.items():
+                mine.setdefault(col, HyperLogLog(self.hll_p)).merge(sketch)
+        for col, lo in other.dt_min.items():
+            self.dt_min[col] = min(self.dt_min.get(col, lo), lo)
+            self.dt_max[col] = max(self.dt_max.get(col, other.dt_max[col]), other.dt_max[col])
+        for col, n in other.future.items():
+            self.future[col] = self.future.get(col, 0) + n
+        self.coord_rows += other.coord_rows
+        self.outside_sf += other.outside_sf
+        return self
+
+    @property
+    def has_future_dates(self):
+        return any(self.future.values())
+
+    def report(self):
+        return QualityReport.from_profile(self)
+
+
+# -----------------------------
+# Assessment
+# -----------------------------
+@dataclass
+class QualityReport:
+    total_records: int
+    total_cells: int
+    missing_cells: int
+    completeness_pct: float
+    completeness: pd.DataFrame              # Column, Complete, Missing, Completeness_%
+    distinct: pd.DataFrame                  # Column, Distinct, Case-folded distinct, Exact
+    case_issues: dict
+    date_ranges: dict                       # column -> (min, max, future count)
+    outside_sf: int
+    outside_sf_pct: float
+    required: pd.DataFrame                  # Field, Purpose, Completeness_% (NaN if missing)
+    temporal_days: int = None
+    districts: int = None
+    scores: dict = field(default_factory=dict)
+
+    @property
+    def overall_score(self):
+        return sum(self.scores.values()) / len(self.scores) * 100
+
+    @property
+    def rating(self):
+        score = self.overall_score
+        if score >= 90:
+            return "EXCELLENT - Suitable for research"
+        if score >= 80:
+            return "GOOD - Suitable with minor caveats"
+        if score >= 70:
+            return "FAIR - Usable with limitations noted"
+        return "POOR - Significant issues require attention"
+
+    @classmethod
+    def from_profile(cls, profile):
+        rows, cols = profile.rows, profile.columns
+        complete = pd.Series([profile.non_null[c] for c in cols], index=cols, dtype=np.int64)
+        total_cells = rows * len(cols)
+        missing_cells = int(total_cells - complete.sum())
+        completeness_pct = (total_cells - missing_cells) / total_cells * 100 if total_cells else 0.0
+        completeness = pd.DataFrame({
+            'Column': cols, 'Complete': complete.values, 'Missing': rows - complete.values,
+            'Completeness_%': complete.values / max(rows, 1) * 100,
+        }).sort_values('Completeness_%')
+
+        distinct, case_issues = [], {}
+        for col, sketch in profile.distinct.items():
+            folded = profile.distinct_folded[col]
+            actual, lower = sketch.count(), folded.count()
+            exact = sketch.exact and folded.exact
+            distinct.append({'Column': col, 'Distinct': actual, 'Case-folded distinct': lower, 'Exact': exact})
+            # Approximate counts only flag a gap larger than the sketches' noise (3 standard errors)
+            if actual - lower > (0 if exact else 3 * sketch.relative_error * actual):
+                case_issues[col] = {'actual_unique': actual, 'case_insensitive_unique': lower,
+                                    'difference': actual - lower, 'exact': exact}
+
+        date_ranges = {col: (profile.dt_min[col], profile.dt_max[col], profile.future.get(col, 0))
+                       for col in profile.dt_min}
+        required = pd.DataFrame({
+            'Field': list(REQUIRED_FIELDS), 'Purpose': list(REQUIRED_FIELDS.values()),
+            'Completeness_%': [profile.non_null[f] / max(rows, 1) * 100 if f in profile.non_null else np.nan
+                               for f in REQUIRED_FIELDS],
+        })
+        temporal_days = None
+        if 'incident_datetime' in date_ranges:
+            lo, hi, _ = date_ranges['incident_datetime']
+            temporal_days = (hi - lo).days
+        districts = profile.distinct['police_district'].count() if 'police_district' in profile.distinct else None
+
+        scores = {
+            'Completeness': min(completeness_pct / 100, 1.0),
+            'Consistency': 1.0 if not case_issues else 0.9,
+            'Temporal Coverage': 1.0 if (temporal_days or 0) > 365 else 0.8,
+        }
+        return cls(total_records=rows, total_cells=total_cells, missing_cells=missing_cells,
+                   completeness_pct=completeness_pct, completeness=completeness, distinct=pd.DataFrame(distinct),
+                   case_issues=case_issues, date_ranges=date_ranges, outside_sf=profile.outside_sf,
+                   outside_sf_pct=profile.outside_sf / max(rows, 1) * 100, required=required,
+                   temporal_days=temporal_days, districts=districts, scores=scores)
+
+
+def print_report(report):
+    print(f"Overall Data Completeness: {report.completeness_pct:.2f}%")
+    print(f"Total cells: {report.total_cells:,}")
+    print(f"Missing cells: {report.missing_cells:,}")
+    print(f"Complete cells: {(report.total_cells - report.missing_cells):,}")
+    print("\nColumn-wise Completeness:")
+    print(report.completeness.to_string(index=False))
+
+    if report.case_issues:
+        print("\nColumns with case inconsistencies:")
+        for col, info in report.case_issues.items():
+            approx = "" if info['exact'] else " (approximate)"
+            print(f"  {col}: {info['difference']} duplicate categories due to case{approx}")
+    else:
+        print("\n✓ No case inconsistencies found")
+
+    if report.date_ranges:
+        print("\n\nDate Range Consistency:")
+        for col, (lo, hi, future) in report.date_ranges.items():
+            print(f"\n{col}:\n  Min: {lo}\n  Max: {hi}")
+            if future:
+                print(f"  ⚠ Warning: {future} future dates detected")
+    print("\n\nGeographic Data Consistency:")
+    print(f"  Records outside SF boundaries: {report.outside_sf:,}")
+    print(f"  Percentage: {report.outside_sf_pct:.2f}%")
+
+    print("\nRequired Fields Assessment:")
+    for _, row in report.required.iterrows():
+        if pd.isna(row['Completeness_%']):
+            print(f"✗ {row['Field']}: MISSING - {row['Purpose']}")
+        else:
+            status = "✓" if row['Completeness_%'] > 90 else "⚠"
+            print(f"{status} {row['Field']}: {row['Completeness_%']:.1f}% complete - {row['Purpose']}")
+    if report.temporal_days is not None:
+        print(f"\nTemporal Coverage: {report.temporal_days} days ({report.temporal_days / 365:.1f} years)")
+    if report.districts is not None:
+        print(f"Spatial Coverage: {report.districts} police districts")
+
+    print("\nQuality Metrics:")
+    for metric, score in report.scores.items():
+        print(f"  {metric}: {score * 100:.1f}%")
+    print(f"\nOverall Data Quality Score: {report.overall_score:.1f}%")
+    print(f"Quality Rating: {report.rating}")
+
+
+# -----------------------------
+# Store scan
+# -----------------------------
+def partition_profile(root, part, hll_p=14):
+    """Worker: quality profile of one store partition."""
+    from .store import open_clean_store
+
+    return QualityProfile(hll_p).update(open_clean_store(root).read_partition(part))
+
+
+def _has_future_dates(profile):
+    return profile.has_future_dates
+
+
+def store_profile(store=None, hll_p=14, max_workers=None, cache_path=QUALITY_CACHE, verbose=True):
+    """Merged `QualityProfile` of the cleaned store; only new or rewritten partitions are profiled."""
+    from .store import open_clean_store
+
+    t0 = time.perf_counter()
+    store = store or open_clean_store()
+    results, stale = store.map_partitions(partition_profile, (hll_p,), cache_path=cache_path, cache_key=hll_p,
+                                          max_workers=max_workers, refresh=_has_future_dates)
+    total = QualityProfile(hll_p)
+    for profile in results.values():
+        total.merge(profile)
+    if verbose:
+        print(f"Quality profile ✅ {total.rows:,} rows, {len(stale)} of {len(results)} partitions profiled "
+              f"in {time.perf_counter() - t0:.1f}s")
+    return total
+
+
+def store_quality(store=None, **kwargs):
+    """`QualityReport` of the cleaned store (see `store_profile` for the arguments)."""
+    return store_profile(store, **kwargs).report()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incremental data-quality assessment of the cleaned store")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--distinct", action="store_true", help="also print the distinct-count table")
+    args = parser.parse_args()
+
+    report = store_quality(max_workers=args.workers)
+    print_report(report)
+    if args.distinct:
+        print("\nDistinct values per text column:")
+        print(report.distinct.to_string(index=False))
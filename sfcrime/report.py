@@ -0,0 +1,362 @@
+"""
+Parallel, change-aware rendering of the report images.
+
+The app shows about 15 pre-rendered PNGs. The notebooks draw them one after
+another with matplotlib / seaborn cells that each re-scan the full frame, and
+the Apriori scatter resamples 10,000 rules on every render. Here each image
+is a `Figure`:
+
+- `data(sources, **params)` reduces precomputed inputs to what the figure
+  draws: the materialized count tables (EDA charts), the moments
+  accumulator (heatmaps, box plots, QQ plots), the term counts (word cloud)
+  and the pipeline's cached Apriori / K-Means / SVM outputs (model figures).
+  Samples are seeded, so the same data always gives the same figure
+- a figure's hash covers that data, its parameters and the render settings.
+  A figure whose hash is in the report manifest, and whose published
+  version is still the current one, is skipped
+- the changed figures are drawn in worker processes and come back as PNG
+  bytes; only this process publishes them to the artifact store, and it
+  then rewrites `_report.json` next to the artifact manifest
+
+After a sync, a refresh therefore re-draws only the figures whose inputs
+moved. The app reads the report manifest to show the data version each image
+was last checked against.
+
+Usage:
+    result = render_report()                      # changed figures only
+    result = render_report(names=["qqplots"], force=True)
+    load_report_manifest()["figures"]["qqplots"]  # hash, artifact version, data version checked
+    python -m sfcrime.report --workers 4
+"""
+import dataclasses
+import hashlib
+import io
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from .config import ARTIFACT_DIR, MODEL_NUMERIC_COLS
+from .telemetry import span
+
+REPORT_MANIFEST = "_report.json"
+DPI = 100
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+class MissingInput(LookupError):
+    """A figure's source has not been built yet (e.g. the pipeline's model stages never ran)."""
+
+
+class ReportSources:
+    """
+    Inputs of the report figures, each loaded on first use.
+    - models: outputs of the pipeline stages (`apriori`, `kmeans`, `svm`, `pca`); stages not given
+      are read from the latest cached pipeline run
+    """
+    def __init__(self, store=None, models=None, pipeline_dir=None):
+        from .store import open_clean_store
+
+        self.store = store or open_clean_store()
+        self.models = dict(models or {})
+        self.pipeline_dir = pipeline_dir
+
+    @cached_property
+    def tables(self):
+        from .aggregates import load_aggregates
+
+        return load_aggregates(self.store)
+
+    @cached_property
+    def moments(self):
+        from .moments import store_moments
+
+        return store_moments(self.store, verbose=False)
+
+    @cached_property
+    def present(self):
+        """Numeric columns with at least one value, and the model subset of them."""
+        m = self.moments
+        present = [c for c in m.columns if m.n[m.columns.index(c)] > 0]
+        return present, [c for c in MODEL_NUMERIC_COLS if c in present]
+
+    @cached_property
+    def terms(self):
+        from .terms import store_terms
+
+        return store_terms(self.store, verbose=False)
+
+    def model(self, stage):
+        if stage not in self.models:
+            from .pipeline import PIPELINE_DIR, StageCache
+
+            cache = StageCache(self.pipeline_dir or PIPELINE_DIR)
+            meta = cache.latest(stage)
+            self.models[stage] = cache.load(stage, meta['key']) if meta else None
+        if self.models[stage] is None:
+            raise MissingInput(f"no '{stage}' output (run `python -m sfcrime.pipeline {stage}`)")
+        return self.models[stage]
+
+
+# -----------------------------
+# Figures
+# -----------------------------
+@dataclass
+class Figure:
+    """
+    One report image.
+    - data: `data(sources, **params)` -> tuple of arguments for `plot` (runs in this process)
+    - plot: module-level function returning a matplotlib figure (runs in a worker process)
+    - version: bump when `plot` changes, so published images are re-drawn
+    """
+    name: str
+    caption: str
+    data: callable
+    plot: callable
+    params: dict = field(default_factory=dict)
+    version: int = 1
+
+
+def _chart(name):
+    from .aggregates import CHARTS
+
+    return lambda sources: (CHARTS[name][0](sources.tables),)
+
+
+def _elbow_data(sources):
+    # Fit times vary from run to run but are not drawn
+    return ([dataclasses.replace(r, seconds=0.0) for r in sources.model('kmeans')],)
+
+
+def _cluster_map_data(sources, k=3, sample=50_000, seed=42):
+    result = next((r for r in sources.model('kmeans') if r.k == k), None)
+    if result is None:
+        raise MissingInput(f"the K-Means sweep has no k={k}")
+    geo = sources.model('pca')['geo']
+    points = sources.store.read(columns=list(geo.columns)).dropna()
+    points = points.sample(n=min(sample, len(points)), random_state=seed).to_numpy(dtype=np.float64)
+    d2 = ((geo.transform(points)[:, None, :] - result.centroids[None, :, :]) ** 2).sum(axis=2)
+    return points, d2.argmin(axis=1), result.centroids * geo.scale_ + geo.mean_
+
+
+def _rules_data(sources, sample=10_000, seed=42):
+    rules = sources.model('apriori')['rules'][['support', 'confidence', 'lift']]
+    return (rules.sample(n=min(sample, len(rules)), random_state=seed, ignore_index=True),)
+
+
+def plot_decision_boundary(model, sample):
+    """Module-level wrapper, so the worker process can unpickle the plot function."""
+    return model.plot_decision_boundary(sample)
+
+
+def report_figures():
+    """Every report image, in the order the app shows them."""
+    from .aggregates import CHARTS
+    from .classify import plot_confusion
+    from .clustering import plot_cluster_map, plot_elbow
+    from .mining import plot_rules_scatter
+    from .moments import box_stats, plot_boxplots, plot_heatmap, plot_qq, qq_points
+    from .terms import plot_wordcloud
+
+    figures = [
+        Figure("coorelation_heatmap", "Correlation Matrix Heatmap",
+               lambda s: (s.moments.corr(s.present[0]),), plot_heatmap),
+        Figure("coorelation_heatmap_cleaned", "Correlation Matrix Heatmap (after dropping redundant columns)",
+               lambda s: (s.moments.corr(s.present[1]),), plot_heatmap),
+        Figure("outliers_boxplot", "Box Plots of the Numeric Features (IQR whiskers)",
+               lambda s: (box_stats(s.moments, s.present[1]),), plot_boxplots),
+        Figure("qqplots", "Normal QQ Plots of the Numeric Features",
+               lambda s: (qq_points(s.moments, s.present[1]),), plot_qq),
+    ]
+    figures += [Figure(name, caption, _chart(name), plot) for name, (_, plot, caption) in CHARTS.items()]
+    figures += [
+        Figure("wordcloud", "Most Common Words in Incident Descriptions",
+               lambda s: (s.terms.frequencies(),), plot_wordcloud),
+        Figure("apriori_scatter_plot", "Apriori Association Rules – Confidence vs Lift (colored by Support)",
+               _rules_data, plot_rules_scatter, {'sample': 10_000, 'seed': 42}),
+        Figure("kmeans_elbow_plot", "K-Means Elbow Plot – Choosing Number of Clusters", _elbow_data, plot_elbow),
+        Figure("kmeans_cluster_map", "K-Means Cluster Map – Spatial Distribution of Clusters", _cluster_map_data,
+               plot_cluster_map, {'k': 3, 'sample': 50_000, 'seed': 42}),
+        Figure("svm_decision_boundary", "SVM Decision Boundary (Slice in PCA Space: PC1 vs PC2)",
+               lambda s: (s.model('svm')['model'], s.model('svm')['sample']), plot_decision_boundary),
+        Figure("svm_confusion_matrix", "Confusion Matrix for SVM (Police District Prediction)",
+               lambda s: (s.model('svm')['evaluation'],), plot_confusion),
+    ]
+    return figures
+
+
+def _hash_into(h, obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        labels = list(obj.columns) if isinstance(obj, pd.DataFrame) else [obj.name]
+        h.update(repr((type(obj).__name__, obj.shape, labels, list(obj.index.names))).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b"dict")
+        for key in sorted(obj, key=repr):
+            _hash_into(h, key)
+            _hash_into(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for item in obj:
+            _hash_into(h, item)
+    elif obj is None or isinstance(obj, (str, int, float, bool, np.generic)):
+        h.update(repr(obj).encode())
+    else:
+        h.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def figure_hash(figure, args, dpi=DPI):
+    """Hash of what a figure is drawn from: its data, parameters, plot version and the render settings."""
+    h = hashlib.sha256()
+    _hash_into(h, (figure.name, figure.version, figure.params, dpi))
+    _hash_into(h, args)
+    return h.hexdigest()[:32]
+
+
+def _render(plot, args, dpi):
+    """Worker: draw one figure and return it as PNG bytes."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    t0 = time.perf_counter()
+    with span("report.plot"):
+        fig = plot(*args)
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+        plt.close(fig)
+    return buf.getvalue(), time.perf_counter() - t0
+
+
+# -----------------------------
+# Manifest
+# -----------------------------
+def load_report_manifest(root=ARTIFACT_DIR):
+    """{"rendered_at", "data_version", "figures": {name: entry}}; empty before the first render."""
+    path = os.path.join(root, REPORT_MANIFEST)
+    if not os.path.exists(path):
+        return {"rendered_at": None, "data_version": None, "figures": {}}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _save_report_manifest(manifest, root):
+    path = os.path.join(root, REPORT_MANIFEST)
+    os.makedirs(root, exist_ok=True)
+    with open(path + ".tmp", "w") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+@dataclass
+class ReportResult:
+    status: dict = field(default_factory=dict)    # name -> 'rendered' | 'unchanged' | 'missing' | 'failed'
+    errors: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def names(self, status):
+        return [name for name, s in self.status.items() if s == status]
+
+
+def render_report(store=None, names=None, models=None, artifacts=None, max_workers=None, dpi=DPI, force=False,
+                  pipeline_dir=None, verbose=True):
+    """
+    Re-draw and publish the report figures whose inputs changed.
+    - names: subset of figure names (default: all)
+    - models: pipeline stage outputs to draw the model figures from (default: the latest cached run)
+    - force: re-draw even when the hash is unchanged
+    """
+    from .artifacts import ArtifactStore
+
+    t0 = time.perf_counter()
+    artifacts = artifacts or ArtifactStore()
+    sources = ReportSources(store, models, pipeline_dir)
+    manifest = load_report_manifest(artifacts.root)
+    figures = [f for f in report_figures() if names is None or f.name in names]
+    result = ReportResult()
+    now = time.time()
+
+    todo = []
+    with span("report.render") as run:
+        for figure in figures:
+            try:
+                with span("report.data", figure=figure.name):
+                    args = figure.data(sources, **figure.params)
+            except MissingInput as exc:
+                result.status[figure.name], result.errors[figure.name] = 'missing', str(exc)
+                continue
+            except Exception as exc:
+                result.status[figure.name], result.errors[figure.name] = 'failed', f"{type(exc).__name__}: {exc}"
+                continue
+            digest = figure_hash(figure, args, dpi)
+            entry, current = manifest["figures"].get(figure.name), artifacts.entry(figure.name)
+            if (not force and entry is not None and entry["hash"] == digest and current is not None
+                    and current["version"] == entry["artifact_version"]):
+                entry.update(data_version=sources.store.version, checked_at=now)
+                result.status[figure.name] = 'unchanged'
+            else:
+                todo.append((figure, args, digest))
+
+        def publish(figure, digest, png, seconds):
+            published = artifacts.publish(figure.name, data=png, ext=".png", caption=figure.caption,
+                                          data_version=sources.store.version,
+                                          meta={"hash": digest, "params": figure.params})
+            manifest["figures"][figure.name] = {
+                "hash": digest, "artifact_version": published["version"], "data_version": sources.store.version,
+                "checked_at": now, "rendered_at": time.time(), "seconds": round(seconds, 3),
+            }
+            result.status[figure.name] = 'rendered'
+
+        max_workers = max_workers or min(len(todo), os.cpu_count() or 1)
+        if max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = {pool.submit(_render, f.plot, args, dpi): (f, digest) for f, args, digest in todo}
+                for future in as_completed(futures):
+                    figure, digest = futures[future]
+                    try:
+                        publish(figure, digest, *future.result())
+                    except Exception as exc:
+                        result.status[figure.name] = 'failed'
+                        result.errors[figure.name] = f"{type(exc).__name__}: {exc}"
+        else:
+            for figure, args, digest in todo:
+                try:
+                    publish(figure, digest, *_render(figure.plot, args, dpi))
+                except Exception as exc:
+                    result.status[figure.name] = 'failed'
+                    result.errors[figure.name] = f"{type(exc).__name__}: {exc}"
+        run.rows_in, run.rows_out = len(figures), len(result.names('rendered'))
+
+    manifest.update(rendered_at=now, data_version=sources.store.version)
+    _save_report_manifest(manifest, artifacts.root)
+    result.seconds = time.perf_counter() - t0
+    if verbose:
+        print(f"Report rendered ✅ {len(result.names('rendered'))} re-drawn, {len(result.names('unchanged'))} "
+              f"unchanged, {len(result.names('missing'))} missing inputs, {len(result.names('failed'))} failed "
+              f"in {result.seconds:.1f}s (data version {sources.store.version})")
+        for name, error in result.errors.items():
+            print(f"  {name}: {error}")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-draw the report images whose inputs changed")
+    parser.add_argument("names", nargs="*", help="figures to render (default: all)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=DPI)
+    parser.add_argument("--force", action="store_true", help="re-draw even unchanged figures")
+    args = parser.parse_args()
+    render_report(names=args.names or None, max_workers=args.workers, dpi=args.dpi, force=args.force)
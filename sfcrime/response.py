@@ -0,0 +1,145 @@
+"""
+Response-time regression data (the notebooks' XGBoost / LightGBM task).
+
+The notebooks predict the minutes between `incident_datetime` and
+`report_datetime` from location, time of day/week/month and three
+target-encoded categoricals. The target is capped at its 95th percentile and
+modelled as `log1p`. This module is that preprocessing cell as functions, so
+the tuning engine, the model bundle and the notebooks share one definition:
+
+- `response_frame`: target + time features, negative / missing rows dropped
+- `prepare`: cap, log target, 80/20 split, out-of-fold target encoding of the
+  categoricals (`sfcrime.encoding`), `StandardScaler` on the numerics
+- `evaluate`: the notebooks' train/test RMSE, MAE and R² on the original
+  (capped) scale, with predictions clipped at `log1p(cap)`
+
+Usage:
+    data = prepare(load_response_frame())
+    model.fit(data.X_train_final, data.y_train_log)
+    evaluate(model, data)
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from .encoding import TARGET_ENCODED_COLS, MeanTargetEncoder
+from .telemetry import instrumented, span
+
+NUMERIC_FEATURES = ['latitude', 'longitude', 'incident_hour', 'incident_weekday', 'incident_month']
+CATEGORICAL_FEATURES = TARGET_ENCODED_COLS
+RESPONSE_FEATURES = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+# Store columns needed to build the features and target
+RESPONSE_COLUMNS = ['incident_datetime', 'report_datetime', 'latitude', 'longitude'] + CATEGORICAL_FEATURES
+TARGET = 'response_time_minutes'
+CAP_PERCENTILE = 95.0
+RANDOM_STATE = 42
+
+
+def add_time_features(df):
+    """incident_hour / incident_weekday / incident_month from `incident_datetime` (in place)."""
+    dt = pd.to_datetime(df['incident_datetime'], errors='coerce')
+    df['incident_hour'] = dt.dt.hour
+    df['incident_weekday'] = dt.dt.dayofweek
+    df['incident_month'] = dt.dt.month
+    return df
+
+
+def response_frame(df):
+    """Features plus `response_time_minutes`, keeping rows with a complete, non-negative response."""
+    out = df[[c for c in RESPONSE_COLUMNS if c in df.columns]].copy()
+    minutes = (pd.to_datetime(out['report_datetime'], errors='coerce')
+               - pd.to_datetime(out['incident_datetime'], errors='coerce')).dt.total_seconds() / 60
+    out[TARGET] = minutes
+    out = out[minutes.notna() & (minutes >= 0)]
+    add_time_features(out)
+    return out.dropna(subset=RESPONSE_FEATURES + [TARGET])[RESPONSE_FEATURES + [TARGET]]
+
+
+def load_response_frame(store=None, **read_kwargs):
+    """`response_frame` of the cleaned store (all rows unless `read_kwargs` filter)."""
+    from .store import open_clean_store
+
+    store = store or open_clean_store()
+    return response_frame(store.read(columns=RESPONSE_COLUMNS, **read_kwargs))
+
+
+def cap_value(minutes, percentile=CAP_PERCENTILE):
+    return float(np.percentile(minutes, percentile))
+
+
+@dataclass
+class ResponseData:
+    X_train: pd.DataFrame
+    X_test: pd.DataFrame
+    X_train_final: pd.DataFrame
+    X_test_final: pd.DataFrame
+    y_train_log: pd.Series
+    y_test_log: pd.Series
+    y_test_orig: pd.Series
+    cap_val: float
+    encoder: MeanTargetEncoder
+    scaler: StandardScaler
+
+    @property
+    def feature_names(self):
+        return list(self.X_train_final.columns)
+
+
+def final_matrix(X, encoder, scaler):
+    """Scaled numerics followed by the `<col>_te` encodings (the notebook's column order)."""
+    num = pd.DataFrame(scaler.transform(X[NUMERIC_FEATURES]), index=X.index, columns=NUMERIC_FEATURES)
+    return pd.concat([num, encoder.transform(X[CATEGORICAL_FEATURES])], axis=1)
+
+
+@instrumented("response.prepare")
+def prepare(frame, cap_percentile=CAP_PERCENTILE, test_size=0.2, seed=RANDOM_STATE, n_folds=5):
+    """
+    The notebooks' preprocessing on a `response_frame`.
+    - n_folds: out-of-fold folds for the training-set target encoding
+    """
+    with span("response.split", rows_in=len(frame)):
+        cap_val = cap_value(frame[TARGET], cap_percentile)
+        y_log = np.log1p(np.minimum(frame[TARGET].astype(float), cap_val))
+        X_train, X_test, y_train_log, y_test_log = train_test_split(
+            frame[RESPONSE_FEATURES], y_log, test_size=test_size, random_state=seed
+        )
+    encoder = MeanTargetEncoder(cols=CATEGORICAL_FEATURES, n_folds=n_folds, seed=seed)
+    with span("response.target_encoding", rows_in=len(X_train)):
+        # Encoder on the original (capped) scale, as in the notebook
+        train_cat = encoder.fit_transform(X_train[CATEGORICAL_FEATURES], np.expm1(y_train_log))
+    with span("response.scale", rows_in=len(X_train)):
+        scaler = StandardScaler().fit(X_train[NUMERIC_FEATURES])
+        train_num = pd.DataFrame(scaler.transform(X_train[NUMERIC_FEATURES]), index=X_train.index,
+                                 columns=NUMERIC_FEATURES)
+    with span("response.transform_test", rows_in=len(X_test)):
+        X_test_final = final_matrix(X_test, encoder, scaler)
+    return ResponseData(
+        X_train=X_train, X_test=X_test,
+        X_train_final=pd.concat([train_num, train_cat], axis=1),
+        X_test_final=X_test_final,
+        y_train_log=y_train_log, y_test_log=y_test_log, y_test_orig=np.expm1(y_test_log),
+        cap_val=cap_val, encoder=encoder, scaler=scaler,
+    )
+
+
+def evaluate(model, data):
+    """Train/test RMSE, MAE and R² on the original (capped) scale."""
+    upper = np.log1p(data.cap_val)
+    metrics = {}
+    for suffix, X, y_log in (("_tr", data.X_train_final, data.y_train_log), ("", data.X_test_final, data.y_test_log)):
+        y_true = np.expm1(y_log)
+        y_pred = np.expm1(np.clip(model.predict(X), -50, upper))
+        metrics['rmse' + suffix] = float(np.sqrt(mean_squared_error(y_true, y_pred)))
+        metrics['mae' + suffix] = float(mean_absolute_error(y_true, y_pred))
+        metrics['r2' + suffix] = float(r2_score(y_true, y_pred))
+    return metrics
+
+
+def print_metrics(name, metrics):
+    print(f"\n{name} Performance (original scale, capped target):")
+    print(f"Train -> RMSE: {metrics['rmse_tr']:.3f}, MAE: {metrics['mae_tr']:.3f}, R²: {metrics['r2_tr']:.3f}")
+    print(f"Test  -> RMSE: {metrics['rmse']:.3f}, MAE: {metrics['mae']:.3f}, R²: {metrics['r2']:.3f}")
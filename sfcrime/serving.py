@@ -0,0 +1,558 @@
+"""
+Versioned response-time model bundle and a micro-batching scoring service.
+
+The notebooks' response-time model only exists as kernel globals
+(`X_test_final`, `cap_val`, `y_log`, `rs_xgb.best_estimator_`), and the app
+shows its metrics as static text. Here the whole prediction path is one
+persisted object:
+
+- `ModelBundle`: the target encoder's lookup tables and categories, the
+  scaler's mean / scale, the fitted regressor, the 95th-percentile cap, the
+  feature order and the train/test metrics. It is published as a versioned
+  artifact (`response_time_model/v*.pkl` in `sfcrime.artifacts`), next to the
+  data version it was trained on
+- `ResponseScorer`: preprocessing compiled to arrays (one `take` per
+  categorical, a float64 scale for the numerics) feeding a single
+  `inplace_predict` / `Booster.predict` call. Output is `expm1` of the
+  clipped log prediction, in minutes
+- `BatchScorer`: callers submit requests from any thread. A worker thread
+  merges whatever is queued (up to `max_batch_rows`, waiting at most
+  `max_wait_ms`) into one vectorized prediction and splits the result back.
+  It records p50 / p99 request latency and rows per second
+- `ScoringServer`: the same scorer behind a small local HTTP endpoint
+  (`POST /predict` with JSON columns/rows or an Arrow IPC stream,
+  `GET /stats`, `GET /health`)
+
+Inputs are columns named like the model features or by their short names:
+lat, lon, hour, weekday, month, district, neighborhood, category.
+
+Usage:
+    bundle = train_bundle("xgb")                      # fit on the store, publish
+    scorer = BatchScorer(ResponseScorer(load_bundle()))
+    minutes = scorer.predict({"lat": [...], "lon": [...], "hour": [...], ...})
+    python -m sfcrime.serving --train --serve --port 8765
+"""
+import io
+import json
+import pickle
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from .response import CATEGORICAL_FEATURES, NUMERIC_FEATURES, RESPONSE_FEATURES
+from .telemetry import span
+
+BUNDLE_ARTIFACT = "response_time_model"
+BUNDLE_FORMAT = 1
+_STOP = object()
+
+# Short request names -> model feature names
+ALIASES = {
+    'lat': 'latitude', 'lon': 'longitude', 'hour': 'incident_hour', 'weekday': 'incident_weekday',
+    'month': 'incident_month', 'district': 'police_district', 'neighborhood': 'analysis_neighborhood',
+    'category': 'incident_category',
+}
+
+# The notebooks' best RandomizedSearchCV parameters, used when training without a search
+NOTEBOOK_BEST = {
+    'xgb': ({'learning_rate': 0.01, 'max_depth': 4, 'subsample': 0.8, 'colsample_bytree': 0.8,
+             'reg_lambda': 5}, 400),
+    'lgbm': ({'learning_rate': 0.03, 'max_depth': 3, 'num_leaves': 31, 'reg_alpha': 1.0, 'reg_lambda': 1.0,
+              'min_child_samples': 10, 'min_split_gain': 0.1, 'subsample': 0.8, 'colsample_bytree': 1.0}, 100),
+}
+
+
+# -----------------------------
+# Bundle
+# -----------------------------
+@dataclass
+class ModelBundle:
+    kind: str
+    model: object
+    categories: dict          # column -> list of category labels (position = code)
+    tables: dict              # column -> smoothed means per code, global mean in the last slot
+    scaler_mean: np.ndarray
+    scaler_scale: np.ndarray
+    cap_val: float
+    features: list = field(default_factory=lambda: list(RESPONSE_FEATURES))
+    params: dict = field(default_factory=dict)
+    metrics: dict = field(default_factory=dict)
+    data_version: int = None
+    created_at: float = field(default_factory=time.time)
+    format: int = BUNDLE_FORMAT
+
+    @classmethod
+    def from_fitted(cls, kind, model, encoder, scaler, cap_val, params=None, metrics=None, data_version=None):
+        return cls(
+            kind=kind, model=model,
+            categories={col: list(encoder.categories_[col]) for col in encoder.cols_},
+            tables={col: np.asarray(encoder.tables_[col], dtype=np.float64) for col in encoder.cols_},
+            scaler_mean=np.asarray(scaler.mean_, dtype=np.float64),
+            scaler_scale=np.asarray(scaler.scale_, dtype=np.float64),
+            cap_val=float(cap_val), params=dict(params or {}), metrics=dict(metrics or {}),
+            data_version=data_version,
+        )
+
+    def dumps(self):
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data):
+        bundle = pickle.loads(data)
+        if getattr(bundle, "format", None) != BUNDLE_FORMAT:
+            raise ValueError(f"unsupported model bundle format {getattr(bundle, 'format', None)!r}")
+        return bundle
+
+
+def publish_bundle(bundle, artifacts=None):
+    """Publish `bundle` as the next version of the response-time model artifact; returns the manifest entry."""
+    from .artifacts import ArtifactStore
+
+    artifacts = artifacts or ArtifactStore()
+    return artifacts.publish(
+        BUNDLE_ARTIFACT, data=bundle.dumps(), ext=".pkl", data_version=bundle.data_version,
+        caption=f"Response-time model ({bundle.kind})",
+        meta={"kind": bundle.kind, "metrics": bundle.metrics, "params": bundle.params, "cap_val": bundle.cap_val},
+    )
+
+
+def load_bundle(artifacts=None, path=None):
+    """Current published bundle (or the one at `path`); None if nothing has been published."""
+    if path is None:
+        from .artifacts import ArtifactStore
+
+        path = (artifacts or ArtifactStore()).path(BUNDLE_ARTIFACT)
+        if path is None:
+            return None
+    with open(path, "rb") as fh:
+        return ModelBundle.loads(fh.read())
+
+
+def train_bundle(kind="xgb", frame=None, tune=False, max_trials=32, cpu_budget=None, publish=True, verbose=True,
+                 data=None, data_version=None, params=None):
+    """
+    Fit the response-time model on the store (or `frame`) and package it.
+    - tune: pick parameters with `sfcrime.tuning.search`; otherwise use the notebooks' best ones
+    - data: an already prepared `ResponseData` (skips loading and `prepare`)
+    - params: estimator parameters (and `n_estimators`) overriding the notebooks' best ones
+    """
+    from .response import evaluate, load_response_frame, prepare, print_metrics
+    from .store import open_clean_store
+    from .tuning import fit_best, make_estimator, search
+
+    if data is None:
+        if frame is None:
+            store = open_clean_store()
+            data_version = store.version
+            frame = load_response_frame(store)
+        data = prepare(frame)
+    if tune:
+        result = search(kind, data.X_train_final, data.y_train_log, max_trials=max_trials, cpu_budget=cpu_budget,
+                        verbose=verbose)
+        model = fit_best(result, data.X_train_final, data.y_train_log, n_jobs=cpu_budget)
+        params = {**result.best.params, 'n_estimators': result.best.best_iteration + 1}
+    else:
+        best, n_estimators = NOTEBOOK_BEST[kind]
+        params = {**best, **(params or {})}
+        n_estimators = params.pop('n_estimators', n_estimators)
+        with span(f"{kind}.fit", rows_in=len(data.X_train_final)):
+            model = make_estimator(kind, params, n_estimators, n_jobs=cpu_budget).fit(data.X_train_final,
+                                                                                        data.y_train_log)
+        params = {**params, 'n_estimators': n_estimators}
+    with span(f"{kind}.evaluate", rows_in=len(data.X_train_final) + len(data.X_test_final)):
+        metrics = evaluate(model, data)
+    if verbose:
+        print_metrics(kind, metrics)
+    bundle = ModelBundle.from_fitted(kind, model, data.encoder, data.scaler, data.cap_val, params, metrics,
+                                     data_version)
+    if publish:
+        entry = publish_bundle(bundle)
+        if verbose:
+            print(f"Published {BUNDLE_ARTIFACT} v{entry['version']} ✅")
+    return bundle
+
+
+# -----------------------------
+# Scoring
+# -----------------------------
+def normalize_columns(columns):
+    """
+    Dict of feature name -> array from a dict / DataFrame / Arrow RecordBatch or Table.
+    Arrow dictionary and pandas category columns are kept as (codes, dictionary) pairs so they can be
+    decoded by code.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:   # pragma: no cover - pyarrow is a pipeline requirement
+        pa = None
+
+    out = {}
+    if pa is not None and isinstance(columns, (pa.RecordBatch, pa.Table)):
+        for name in columns.schema.names:
+            col = columns.column(name)
+            if isinstance(col, pa.ChunkedArray):
+                col = col.combine_chunks()
+            if pa.types.is_dictionary(col.type):
+                out[ALIASES.get(name, name)] = (col.indices.to_numpy(zero_copy_only=False),
+                                                col.dictionary.to_pandas())
+            else:
+                out[ALIASES.get(name, name)] = col.to_numpy(zero_copy_only=False)
+    elif isinstance(columns, (dict, pd.DataFrame)):
+        items = columns.items() if isinstance(columns, dict) else ((c, columns[c]) for c in columns.columns)
+        for name, values in items:
+            if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+                # pandas category column: decode by code, like an Arrow dictionary
+                values = (np.asarray(values.cat.codes), values.cat.categories)
+            out[ALIASES.get(name, name)] = values if isinstance(values, tuple) else np.asarray(values)
+    else:
+        raise TypeError(f"feature columns must be a dict, DataFrame or Arrow batch, got {type(columns).__name__}")
+    missing = [f for f in RESPONSE_FEATURES if f not in out]
+    if missing:
+        raise KeyError(f"missing feature columns: {missing}")
+    out = {f: out[f] for f in RESPONSE_FEATURES}
+    # Requests are concatenated column by column in a batch, so a ragged one would misalign the others
+    lengths = {f: len(v[0]) if isinstance(v, tuple) else (len(v) if np.ndim(v) == 1 else None) for f, v in out.items()}
+    if len(set(lengths.values())) != 1 or None in lengths.values():
+        raise ValueError(f"feature columns must be 1-d and of equal length, got {lengths}")
+    return out
+
+
+def _decode(pair):
+    codes, dictionary = pair
+    return np.where(codes < 0, None, np.asarray(dictionary, dtype=object).take(np.maximum(codes, 0)))
+
+
+def _slice(values, start, stop):
+    if isinstance(values, tuple):
+        return values[0][start:stop], values[1]
+    return values[start:stop]
+
+
+def _n_rows(columns):
+    first = columns[RESPONSE_FEATURES[0]]
+    return len(first[0]) if isinstance(first, tuple) else len(first)
+
+
+class ResponseScorer:
+    """
+    Vectorized preprocessing + prediction for a `ModelBundle`.
+    - bundle: the model bundle
+    - threads: prediction threads (None = library default)
+    """
+    def __init__(self, bundle, threads=None):
+        self.bundle = bundle
+        self.index = {col: pd.Index(bundle.categories[col]) for col in CATEGORICAL_FEATURES}
+        self.upper = np.float32(np.log1p(bundle.cap_val))
+        self.mean = np.asarray(bundle.scaler_mean, dtype=np.float64)
+        self.scale = np.asarray(bundle.scaler_scale, dtype=np.float64)
+        # XGBoost splits on float32 values, LightGBM on float64 thresholds
+        self.dtype = np.float32 if bundle.kind == 'xgb' else np.float64
+        if bundle.kind == 'xgb':
+            booster = bundle.model.get_booster()
+            if threads:
+                booster.set_param({'nthread': threads})
+            self._predict = booster.inplace_predict
+        else:
+            booster = bundle.model.booster_
+            self._predict = (lambda X: booster.predict(X, num_threads=threads)) if threads else booster.predict
+
+    def codes(self, col, values):
+        if isinstance(values, tuple):
+            # Dictionary-encoded column: map the (small) dictionary, then take by code
+            indices, dictionary = values
+            lookup = np.append(self.index[col].get_indexer(dictionary), -1).astype(np.int32)
+            return lookup.take(np.where(indices < 0, -1, indices))
+        return self.index[col].get_indexer(values)
+
+    def matrix(self, columns):
+        """Feature matrix in the model's column order."""
+        n = _n_rows(columns)
+        X = np.empty((n, len(RESPONSE_FEATURES)), dtype=self.dtype)
+        for j, col in enumerate(NUMERIC_FEATURES):
+            # Scale in float64: latitude / longitude lose the split-relevant digits in float32
+            X[:, j] = (np.asarray(columns[col], dtype=np.float64) - self.mean[j]) / self.scale[j]
+        for j, col in enumerate(CATEGORICAL_FEATURES, start=len(NUMERIC_FEATURES)):
+            # Unseen categories (-1) land on the global mean in the table's last slot
+            X[:, j] = self.bundle.tables[col].take(self.codes(col, columns[col]))
+        return X
+
+    def predict(self, columns):
+        """Predicted response time in minutes for each row."""
+        columns = normalize_columns(columns)
+        X = self.matrix(columns)
+        with span(f"{self.bundle.kind}.predict", rows_in=len(X)) as step:
+            y_log = np.asarray(self._predict(X), dtype=np.float32)
+            step.rows_out = len(y_log)
+        return np.expm1(np.clip(y_log, -50, self.upper))
+
+
+class BatchScorer:
+    """
+    Thread-safe micro-batching front end for a `ResponseScorer`.
+    - max_batch_rows: rows merged into one prediction at most
+    - max_wait_ms: how long the first queued request waits for others to join
+    - window: recent request latencies kept for the percentiles
+    """
+    def __init__(self, scorer, max_batch_rows=65_536, max_wait_ms=2.0, window=10_000):
+        self.scorer = scorer
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.latencies = deque(maxlen=window)
+        self.rows = 0
+        self.requests = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, columns):
+        """Queue one request; returns a Future with the predictions in minutes."""
+        fut = Future()
+        try:
+            columns = normalize_columns(columns)
+        except Exception as exc:
+            fut.set_exception(exc)
+            return fut
+        self._queue.put((columns, _n_rows(columns), fut, time.perf_counter()))
+        return fut
+
+    def predict(self, columns, timeout=None):
+        return self.submit(columns).result(timeout)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        item = None
+        while True:
+            first = item if item is not None else self._queue.get()
+            item = None
+            if first is _STOP:
+                return
+            batch, rows = [first], first[1]
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_rows:
+                try:
+                    nxt = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if nxt is _STOP or rows + nxt[1] > self.max_batch_rows:
+                    item = nxt   # handled on the next iteration
+                    break
+                batch.append(nxt)
+                rows += nxt[1]
+            self._score(batch, rows)
+
+    def _score(self, batch, rows):
+        t0 = time.perf_counter()
+        try:
+            if len(batch) == 1:
+                merged = batch[0][0]
+            else:
+                merged = {col: self._concat([item[0][col] for item in batch]) for col in RESPONSE_FEATURES}
+            preds = self.scorer.predict(merged)
+        except Exception as exc:
+            if len(batch) > 1:
+                # One bad request must not fail the others: score each on its own
+                for item in batch:
+                    self._score([item], item[1])
+                return
+            batch[0][2].set_exception(exc)
+            return
+        done = time.perf_counter()
+        offset = 0
+        with self.lock:
+            self.rows += rows
+            self.requests += len(batch)
+            self.batches += 1
+            self.busy_seconds += done - t0
+            for _, n, fut, queued in batch:
+                self.latencies.append(done - queued)
+        for _, n, fut, _ in batch:
+            fut.set_result(preds[offset:offset + n])
+            offset += n
+
+    @staticmethod
+    def _concat(parts):
+        if all(isinstance(p, tuple) for p in parts) and all(p[1].equals(parts[0][1]) for p in parts[1:]):
+            return np.concatenate([p[0] for p in parts]), parts[0][1]
+        if any(isinstance(p, tuple) for p in parts):
+            # Different dictionaries: decode to labels before merging
+            parts = [_decode(p) if isinstance(p, tuple) else p for p in parts]
+        return np.concatenate(parts)
+
+    def stats(self):
+        """Request latency percentiles (ms), throughput and batching counters."""
+        with self.lock:
+            lat = np.asarray(self.latencies) * 1000.0
+            return {
+                "requests": self.requests, "batches": self.batches, "rows": self.rows,
+                "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+                "p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+                "p99_ms": float(np.percentile(lat, 99)) if len(lat) else None,
+                "rows_per_sec": self.rows / self.busy_seconds if self.busy_seconds else None,
+                "uptime_s": time.perf_counter() - self.started,
+            }
+
+
+# -----------------------------
+# HTTP endpoint
+# -----------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server.scoring
+        if self.path.startswith("/stats"):
+            self._send_json(200, server.batcher.stats())
+        elif self.path.startswith("/health"):
+            bundle = server.batcher.scorer.bundle
+            self._send_json(200, {"status": "ok", "kind": bundle.kind, "model_version": server.model_version,
+                                  "data_version": bundle.data_version, "features": bundle.features})
+        else:
+            self._send_json(404, {"message": "unknown path"})
+
+    def do_POST(self):
+        server = self.server.scoring
+        if not self.path.startswith("/predict"):
+            self._send_json(404, {"message": "unknown path"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/vnd.apache.arrow.stream"):
+                import pyarrow as pa
+
+                columns = pa.ipc.open_stream(io.BytesIO(body)).read_all()
+            else:
+                payload = json.loads(body)
+                columns = payload["columns"] if "columns" in payload else pd.DataFrame(payload["rows"])
+            preds = server.batcher.predict(columns)
+        except (KeyError, ValueError, TypeError) as exc:
+            self._send_json(400, {"message": str(exc)})
+            return
+        except Exception as exc:
+            # Anything else is still answered, rather than dropping the connection with the handler thread
+            self._send_json(500, {"message": f"{type(exc).__name__}: {exc}"})
+            return
+        self._send_json(200, {"predictions": preds.tolist(), "model_version": server.model_version})
+
+
+class ScoringServer:
+    """
+    Serve a `BatchScorer` on 127.0.0.1.
+    - port: 0 picks a free port
+    - model_version: artifact version reported by /health and /predict
+    """
+    def __init__(self, batcher, port=0, model_version=None):
+        self.batcher = batcher
+        self.port = port
+        self.model_version = model_version
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.scoring = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def load_test(batcher, frame, clients=8, requests_per_client=200, rows_per_request=64, seed=0):
+    """Score random slices of `frame` from concurrent threads; returns the batcher's stats."""
+    columns = normalize_columns(frame)
+    n = _n_rows(columns)
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, max(1, n - rows_per_request), size=(clients, requests_per_client))
+
+    def client(i):
+        for s in starts[i]:
+            batcher.predict({c: _slice(v, s, s + rows_per_request) for c, v in columns.items()})
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = batcher.stats()
+    stats["wall_rows_per_sec"] = clients * requests_per_client * rows_per_request / (time.perf_counter() - t0)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .response import load_response_frame
+
+    parser = argparse.ArgumentParser(description="Train, publish and serve the response-time model bundle")
+    parser.add_argument("--train", action="store_true", help="fit on the store and publish a new bundle")
+    parser.add_argument("--model", choices=["xgb", "lgbm"], default="xgb")
+    parser.add_argument("--tune", action="store_true", help="choose parameters with the ASHA search")
+    parser.add_argument("--benchmark", action="store_true", help="concurrent in-process load test")
+    parser.add_argument("--serve", action="store_true", help="serve POST /predict on 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.train:
+        train_bundle(args.model, tune=args.tune)
+    bundle = load_bundle()
+    if bundle is None:
+        raise SystemExit("No response_time_model published yet (run with --train)")
+    batcher = BatchScorer(ResponseScorer(bundle))
+    if args.benchmark:
+        frame = load_response_frame().head(200_000)
+        for clients, rows in ((1, 1), (8, 64), (32, 256)):
+            stats = load_test(BatchScorer(ResponseScorer(bundle)), frame, clients=clients, rows_per_request=rows)
+            print(f"{clients:3d} clients x {rows:4d} rows: p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+                  f"{stats['rows_per_sec']:,.0f} rows/s scoring, {stats['wall_rows_per_sec']:,.0f} rows/s wall, "
+                  f"{stats['mean_batch_rows']:.0f} rows/batch")
+    if args.serve:
+        from .artifacts import ArtifactStore
+
+        server = ScoringServer(batcher, port=args.port, model_version=ArtifactStore().entry(BUNDLE_ARTIFACT)["version"])
+        server.start()
+        print(f"Serving {bundle.kind} model on {server.url}/predict (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
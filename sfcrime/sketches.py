@@ -0,0 +1,254 @@
+"""
+Small, mergeable streaming sketches used by the chunked pipeline stages.
+
+- QuantileSketch: KLL-style quantile sketch (approximate Q1/Q3/median in
+  one pass, O(k log n) memory, mergeable across chunks and partitions)
+- HyperLogLog: distinct-count sketch (exact hash set while small, 2^p
+  registers after that; ~1.04 / sqrt(2^p) relative error, mergeable)
+- HeavyHitters: weighted term counts (exact while the vocabulary is small,
+  Count-Min sketch + top-k candidates after that, mergeable)
+"""
+import numpy as np
+import pandas as pd
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch over float values.
+    - k: accuracy parameter; max rank error is roughly 2 / k (k=400 -> ~0.5%)
+    NaNs are ignored. Two sketches built with the same k can be merged.
+    """
+    def __init__(self, k=400, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            buf = self.levels[level]
+            if len(buf) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                buf = np.sort(buf)
+                # An odd element stays behind so total weight is preserved exactly
+                keep = buf[-1:] if len(buf) % 2 else buf[:0]
+                even = buf[:len(buf) - len(keep)]
+                promoted = even[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, buf in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], buf])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Approximate quantile(s) for q in [0, 1] (scalar or array)."""
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(buf), 2 ** level, dtype=np.float64)
+                                  for level, buf in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cum = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(q) * cum[-1], side="left")
+        return items[np.clip(idx, 0, len(items) - 1)]
+
+    def __len__(self):
+        return self.n
+
+
+def hash_values(values):
+    """64-bit hashes of arbitrary values (strings, numbers), vectorized."""
+    return pd.util.hash_array(np.asarray(values, dtype=object), categorize=False)
+
+
+def _bit_length(x):
+    # Exact for uint64: each 32-bit half is representable as float64
+    hi, lo = (x >> np.uint64(32)).astype(np.float64), (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter over 64-bit hashes.
+    - p: register bits (2^p registers); p=14 -> 16 KiB, ~0.8% standard error
+    Up to 2^p / 4 distinct hashes are kept exactly (as in HLL++'s sparse mode), so low-cardinality
+    columns get exact counts. Sketches with the same p can be merged.
+    """
+    def __init__(self, p=14):
+        self.p = p
+        self.m = 1 << p
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.registers = None
+
+    @property
+    def exact(self):
+        return self.registers is None
+
+    def _add_registers(self, hashes):
+        q = 64 - self.p
+        idx = (hashes >> np.uint64(q)).astype(np.int64)
+        rest = hashes & np.uint64((1 << q) - 1)
+        rank = (q + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def _densify(self):
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self._add_registers(self.hashes)
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if self.exact:
+            self.hashes = np.union1d(self.hashes, hashes)
+            if len(self.hashes) > self.m // 4:
+                self._densify()
+        else:
+            self._add_registers(np.unique(hashes))
+        return self
+
+    def update(self, values):
+        """Add values (missing values are skipped)."""
+        values = pd.unique(pd.Series(values).dropna())
+        return self.update_hashes(hash_values(values))
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLog sketches with different precision")
+        if other.exact:
+            return self.update_hashes(other.hashes)
+        if self.exact:
+            hashes = self.hashes
+            self.registers = other.registers.copy()
+            self.hashes = np.empty(0, dtype=np.uint64)
+            self._add_registers(hashes)
+        else:
+            np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        if self.exact:
+            return len(self.hashes)
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)    # linear counting for the small range
+        return int(round(estimate))
+
+    @property
+    def relative_error(self):
+        return 0.0 if self.exact else 1.04 / np.sqrt(self.m)
+
+    def __len__(self):
+        return self.count()
+
+
+# Odd 64-bit multipliers deriving the Count-Min rows from one hash
+_CM_SEEDS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+                      0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x2545F4914F6CDD1D, 0x94D049BB133111EB],
+                     dtype=np.uint64)
+
+
+class HeavyHitters:
+    """
+    Top-k weighted counts over string terms.
+    - k: candidates kept once the sketch is approximate (`most_common` is reliable up to k)
+    - width, depth: Count-Min table shape (depth <= 8); overestimates by at most ~e/width of the total
+    - capacity: distinct terms counted exactly before switching to the Count-Min table
+    """
+    def __init__(self, k=256, width=4096, depth=4, capacity=4096):
+        self.k, self.width, self.depth, self.capacity = k, width, depth, capacity
+        self.n = 0
+        self.counts = {}
+        self.table = None
+
+    @property
+    def exact(self):
+        return self.table is None
+
+    def _cells(self, terms):
+        h = hash_values(terms)
+        return [((h * _CM_SEEDS[row]) >> np.uint64(32)) % np.uint64(self.width) for row in range(self.depth)]
+
+    def _add_table(self, terms, counts):
+        for row, cells in enumerate(self._cells(terms)):
+            np.add.at(self.table[row], cells.astype(np.int64), counts)
+
+    def estimate(self, terms):
+        """Count-Min estimates (exact counts while the sketch is exact)."""
+        if self.exact:
+            return np.array([self.counts.get(t, 0) for t in terms], dtype=np.int64)
+        return np.min([self.table[row][cells.astype(np.int64)] for row, cells in enumerate(self._cells(terms))],
+                      axis=0)
+
+    def _prune(self, candidates):
+        terms = np.asarray(list(candidates), dtype=object)
+        est = self.estimate(terms)
+        top = np.argsort(-est, kind="stable")[:self.k]
+        self.counts = dict(zip(terms[top].tolist(), est[top].tolist()))
+
+    def _densify(self):
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        terms = np.asarray(list(self.counts), dtype=object)
+        self._add_table(terms, np.fromiter(self.counts.values(), dtype=np.int64, count=len(terms)))
+        self._prune(self.counts)
+
+    def update(self, terms, counts=None):
+        """Add `terms` with weights `counts` (default 1 each); repeated terms are allowed."""
+        terms = np.asarray(terms, dtype=object)
+        counts = np.ones(len(terms), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        if len(terms) == 0:
+            return self
+        self.n += int(counts.sum())
+        if self.exact:
+            for term, count in zip(terms.tolist(), counts.tolist()):
+                self.counts[term] = self.counts.get(term, 0) + count
+            if len(self.counts) > self.capacity:
+                self._densify()
+        else:
+            totals = pd.Series(counts).groupby(terms, sort=False).sum()
+            self._add_table(totals.index.to_numpy(dtype=object), totals.to_numpy(dtype=np.int64))
+            self._prune(set(self.counts) | set(totals.index))
+        return self
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("cannot merge HeavyHitters sketches with different table shapes")
+        if other.exact:
+            terms = list(other.counts)
+            return self.update(terms, [other.counts[t] for t in terms])
+        if self.exact:
+            self._densify()
+        self.table += other.table
+        self.n += other.n
+        self._prune(set(self.counts) | set(other.counts))
+        return self
+
+    def most_common(self, n=None):
+        """[(term, count)] by decreasing count."""
+        items = sorted(self.counts.items(), key=lambda item: -item[1])
+        return items[:n] if n is not None else items
@@ -0,0 +1,440 @@
+"""
+Memory-mapped, struct-of-arrays incident snapshot for the app.
+
+Each Streamlit server process holds its own copies of what the dashboard
+reads: `SpatialIndex.from_store` materializes float64 coordinates, int64
+times and an object array of ids per row, and every app worker process (or
+replica on the same host) repeats that. The snapshot stores the incident
+columns the dashboard filters and aggregates on as fixed-width arrays, one
+`.npy` file per column, written once per store version:
+
+- `minutes`: int32 minutes since the Unix epoch (rows are sorted by it, so a
+  date range is one contiguous slice found by binary search)
+- `latitude` / `longitude`: float32 (NaN when missing)
+- `incident_category`, `incident_subcategory`, `police_district`,
+  `analysis_neighborhood`: uint8 / uint16 codes into small sorted string
+  dictionaries kept in `_snapshot.json` (the dtype's maximum = missing)
+- `cell`: 250 m grid cell of each point (`sfcrime.spatial.grid_params`), for
+  hotspot counts; the grid is kept across versions while every point still
+  falls on it, so cell ids are stable, and `SpatialIndex.from_snapshot`
+  builds radius / kNN queries on the same grid
+
+A new store version is built from the previous snapshot: rows are sorted by
+time and the store is partitioned by month, so each month written since then
+is one slice that is cut out and replaced by a fresh read of that month.
+Only the changed months are read and encoded.
+
+Readers open the files with `np.load(mmap_mode='r')`, i.e. read-only
+`np.memmap`s, so every session and every process on the host shares the same
+page-cache pages. Filters are lookup tables indexed by code and every
+aggregate is a `bincount` over the codes of the selected slice, processed in
+chunks, so an extra viewer adds close to nothing to the resident memory.
+
+Usage:
+    snap = load_snapshot()                               # written first if older than the store
+    snap.counts('incident_category', years=(2022, 2024), districts=['Mission'])
+    snap.top_cells(10, years=(2024, 2024), categories=['Robbery'])
+    cube = snap.cube()                                   # CrimeCube straight from the codes
+    update_snapshot()                                    # what `sync` runs: changed months only
+    python -m sfcrime.snapshot [--full]                  # data/snapshot/v<version>/
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR, DISTRICT_COL
+from .spatial import EARTH_M_PER_DEG, MINUTES_PER_DAY, grid_params
+from .telemetry import span
+
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshot")
+CODE_COLUMNS = ['incident_category', 'incident_subcategory', DISTRICT_COL, 'analysis_neighborhood']
+SOURCE_COLUMNS = ['incident_datetime', 'latitude', 'longitude'] + CODE_COLUMNS
+# Filter keyword -> code column
+FILTERS = {'categories': 'incident_category', 'subcategories': 'incident_subcategory', 'districts': DISTRICT_COL,
+           'neighborhoods': 'analysis_neighborhood'}
+CELL_M = 250.0
+# Rows per chunk of a scan: bounds the temporary arrays of one query
+CHUNK_ROWS = 1 << 20
+# Versions kept on disk, so processes still mapping the previous one can finish their reruns
+KEEP_VERSIONS = 2
+_META = "_snapshot.json"
+
+
+def _code_dtype(n_labels):
+    """Smallest unsigned dtype with room for `n_labels` codes plus the missing marker."""
+    for dtype in (np.uint8, np.uint16):
+        if n_labels < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError(f"{n_labels:,} labels do not fit a uint16 code column")
+
+
+def _minute(ts):
+    """Minutes since the epoch of a datetime-like scalar."""
+    return int(pd.Timestamp(ts).value // 60_000_000_000)
+
+
+# -----------------------------
+# Writing
+# -----------------------------
+class _Dictionary:
+    """Growing label -> code mapping of one column while batches stream in (`labels`: codes to start from)."""
+    def __init__(self, labels=()):
+        self.codes = {label: i for i, label in enumerate(labels)}
+
+    def encode(self, values):
+        """int32 codes of a batch (-1 = missing)."""
+        codes, uniques = pd.factorize(values)
+        lut = np.array([self.codes.setdefault(str(u), len(self.codes)) for u in uniques] + [-1], dtype=np.int32)
+        return lut[codes]
+
+    def finish(self, codes):
+        """(sorted labels, codes re-numbered in label order in the smallest dtype)."""
+        labels = sorted(self.codes)
+        dtype = _code_dtype(len(labels))
+        lut = np.empty(len(labels) + 1, dtype=dtype)
+        lut[[self.codes[label] for label in labels]] = np.arange(len(labels))
+        lut[-1] = np.iinfo(dtype).max
+        return labels, lut[codes]
+
+
+def _encode(frames, dictionaries):
+    """
+    Columns of a frame stream, sorted by time: int64 minutes, float32 coordinates and int32 codes
+    (-1 = missing) from `dictionaries`. Rows without an incident time are dropped.
+    """
+    parts = {name: [] for name in ['minutes', 'latitude', 'longitude'] + CODE_COLUMNS}
+    for df in frames:
+        dt = pd.to_datetime(df['incident_datetime'], errors='coerce')
+        df = df[dt.notna().to_numpy()]
+        parts['minutes'].append(dt.dropna().to_numpy().astype('datetime64[m]').astype(np.int64))
+        for col in ('latitude', 'longitude'):
+            parts[col].append(df[col].to_numpy(dtype=np.float32, na_value=np.nan) if col in df.columns
+                              else np.full(len(df), np.nan, dtype=np.float32))
+        for col in CODE_COLUMNS:
+            parts[col].append(dictionaries[col].encode(df[col]) if col in df.columns
+                              else np.full(len(df), -1, dtype=np.int32))
+    arrays = {name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32 if name in
+              ('latitude', 'longitude') else np.int64 if name == 'minutes' else np.int32)
+              for name, chunks in parts.items()}
+    order = np.argsort(arrays['minutes'], kind='stable')
+    return {name: values[order] for name, values in arrays.items()}
+
+
+def _cells(lat, lon, grid):
+    """uint16 / uint32 grid cell of every point (the dtype's maximum when missing); None if one is off the grid."""
+    lat, lon = lat.astype(np.float64), lon.astype(np.float64)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    ix = (lon[ok] - grid['lon0']) * grid['m_per_deg_lon'] // grid['cell_m']
+    iy = (lat[ok] - grid['lat0']) * EARTH_M_PER_DEG // grid['cell_m']
+    if ((ix < 0) | (ix >= grid['nx']) | (iy < 0) | (iy >= grid['ny'])).any():
+        return None
+    n_cells = grid['nx'] * grid['ny']
+    dtype = np.dtype(np.uint16 if n_cells < np.iinfo(np.uint16).max else np.uint32)
+    cell = np.full(len(lat), np.iinfo(dtype).max, dtype=dtype)
+    cell[ok] = (iy * grid['nx'] + ix).astype(dtype)
+    return cell
+
+
+def _finish(arrays, dictionaries, grid=None):
+    """Final column dtypes, sorted dictionaries, and the grid (`grid`: kept when every point is on it)."""
+    arrays = dict(arrays, minutes=arrays['minutes'].astype(np.int32))
+    labels = {}
+    for col in CODE_COLUMNS:
+        labels[col], arrays[col] = dictionaries[col].finish(arrays[col])
+    cell = _cells(arrays['latitude'], arrays['longitude'], grid) if grid is not None else None
+    if cell is None:
+        grid = grid_params(arrays['latitude'], arrays['longitude'], CELL_M)
+        cell = _cells(arrays['latitude'], arrays['longitude'], grid)
+    arrays['cell'] = cell
+    return arrays, labels, grid
+
+
+def _publish(arrays, labels, grid, store, root):
+    """
+    Write the columns to `root/v<version>/` and return its path. The files are built in a private
+    directory and renamed into place, so readers never see a partial snapshot; when another process
+    wins the race, its snapshot is kept.
+    """
+    final = os.path.join(root, f"v{store.version}")
+    tmp = os.path.join(root, f".v{store.version}.{os.getpid()}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), values)
+    # The store's month partitions, so the next update can tell which months were dropped
+    meta = {'version': store.version, 'rows': len(arrays['minutes']), 'dictionaries': labels, 'grid': grid,
+            'partitions': store.partitions(), 'dtypes': {name: str(values.dtype) for name, values in arrays.items()},
+            'written_at': time.time()}
+    with open(os.path.join(tmp, _META), "w") as fh:
+        json.dump(meta, fh, indent=2)
+    try:
+        os.rename(tmp, final)
+    except OSError:
+        # Another process published this version first
+        shutil.rmtree(tmp, ignore_errors=True)
+    _prune(root)
+    return final
+
+
+def _columns(store):
+    return [c for c in SOURCE_COLUMNS if c in store.dataset().schema.names] if store.version else []
+
+
+def write_snapshot(store=None, root=SNAPSHOT_DIR, batch_rows=262_144, verbose=True):
+    """Write the snapshot of the store's current version from a full scan, and return it opened."""
+    from .store import open_clean_store
+
+    t0 = time.perf_counter()
+    store = store or open_clean_store()
+    columns = _columns(store)
+    dictionaries = {col: _Dictionary() for col in CODE_COLUMNS}
+    with span("snapshot.write", version=store.version) as step:
+        frames = store.iter_frames(columns=columns, batch_rows=batch_rows) if columns else []
+        arrays, labels, grid = _finish(_encode(frames, dictionaries), dictionaries)
+        step.rows_out = len(arrays['minutes'])
+        path = _publish(arrays, labels, grid, store, root)
+    if verbose:
+        nbytes = sum(a.nbytes for a in arrays.values())
+        print(f"Snapshot written ✅ {len(arrays['minutes']):,} rows, {nbytes / 1e6:.1f} MB "
+              f"({time.perf_counter() - t0:.1f}s, store version {store.version})")
+    return Snapshot(path)
+
+
+def _month_minutes(part):
+    """[first, next month's first) minute of a `year=YYYY/month=MM` partition."""
+    year, month = (kv.split("=")[1] for kv in part.split("/")[:2])
+    start = np.datetime64(f"{year}-{month}", 'M')
+    return (np.array([start, start + 1]).astype('datetime64[m]').astype(np.int64))
+
+
+def update_snapshot(store=None, root=SNAPSHOT_DIR, verbose=True):
+    """
+    Snapshot of the store's version built from the newest older snapshot: only the months written
+    (or dropped) since then are read and encoded. Rows are sorted by time and a store partition is a
+    month, so each changed month is one slice of the old columns that is cut out and replaced;
+    the unchanged slices are copied as they are, with their codes mapped to the merged dictionaries.
+    Falls back to `write_snapshot` when there is no older snapshot.
+    """
+    from .store import open_clean_store
+
+    t0 = time.perf_counter()
+    store = store or open_clean_store()
+    path = os.path.join(root, f"v{store.version}")
+    if os.path.exists(os.path.join(path, _META)):
+        return Snapshot(path)
+    older = [v for v in _versions(root) if v < store.version]
+    prev = Snapshot(os.path.join(root, f"v{older[-1]}")) if older else None
+    if prev is None or prev.partitions is None:
+        return write_snapshot(store, root, verbose=verbose)
+
+    changed = sorted(set(store.changed_since(prev.version)) | (set(prev.partitions) - set(store.partitions())))
+    columns = _columns(store)
+    dictionaries = {col: _Dictionary(prev.labels[col]) for col in CODE_COLUMNS}
+    with span("snapshot.update", version=store.version, rows_in=prev.n) as step:
+        # Old rows outside the changed months, with codes back in the dictionaries' int32 form
+        keep = np.ones(prev.n, dtype=bool)
+        for part in changed:
+            lo, hi = np.searchsorted(prev.minutes, _month_minutes(part), side='left')
+            keep[lo:hi] = False
+        kept = {'minutes': prev.minutes[keep].astype(np.int64), 'latitude': prev.latitude[keep],
+                'longitude': prev.longitude[keep]}
+        for col in CODE_COLUMNS:
+            codes = prev.codes[col][keep].astype(np.int32)
+            codes[codes == np.iinfo(prev.codes[col].dtype).max] = -1
+            kept[col] = codes
+        frames = (df for _, df in store.iter_partitions(changed, columns=columns)) if columns else []
+        new = _encode(frames, dictionaries)
+        # Changed months do not overlap the kept ones, so inserting keeps the time order
+        at = np.searchsorted(kept['minutes'], new['minutes'], side='left')
+        arrays = {name: np.insert(kept[name], at, new[name]) for name in kept}
+        arrays, labels, grid = _finish(arrays, dictionaries, prev.grid)
+        step.rows_out = len(arrays['minutes'])
+        path = _publish(arrays, labels, grid, store, root)
+    if verbose:
+        print(f"Snapshot updated ✅ {len(changed)} changed months, {len(new['minutes']):,} rows re-read, "
+              f"{len(arrays['minutes']):,} rows ({time.perf_counter() - t0:.1f}s, store version {store.version})")
+    return Snapshot(path)
+
+
+def _versions(root):
+    """Published snapshot versions in `root`, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(d[1:]) for d in os.listdir(root) if d.startswith("v") and d[1:].isdigit())
+
+
+def _prune(root, keep=KEEP_VERSIONS):
+    # Unlinking a mapped file is safe on POSIX: the pages stay valid until the last map closes
+    for version in _versions(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, f"v{version}"), ignore_errors=True)
+
+
+def load_snapshot(store=None, root=SNAPSHOT_DIR, refresh=True):
+    """The snapshot of the store's version; brought up to date first when missing (unless `refresh=False`)."""
+    from .store import open_clean_store
+
+    store = store or open_clean_store()
+    path = os.path.join(root, f"v{store.version}")
+    if os.path.exists(os.path.join(path, _META)):
+        return Snapshot(path)
+    if refresh:
+        return update_snapshot(store, root, verbose=False)
+    raise FileNotFoundError(f"no snapshot of store version {store.version} in {root}; run `python -m sfcrime.snapshot`")
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+class Snapshot:
+    """
+    Read-only view of one snapshot directory.
+    - minutes / latitude / longitude / cell: memory-mapped columns
+    - codes: code column -> memory-mapped codes; labels: code column -> label list
+    Filters (`years`, `start` / `end`, and the keywords of FILTERS) are accepted by every query.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, _META)) as fh:
+            meta = json.load(fh)
+        self.version = meta['version']
+        self.n = meta['rows']
+        self.grid = meta['grid']
+        self.labels = meta['dictionaries']
+        self.partitions = meta.get('partitions')
+        self.minutes = self._map('minutes')
+        self.latitude, self.longitude, self.cell = self._map('latitude'), self._map('longitude'), self._map('cell')
+        self.codes = {col: self._map(col) for col in CODE_COLUMNS}
+
+    def _map(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+
+    @property
+    def nbytes(self):
+        """Bytes of the mapped columns (shared page cache, not per-process memory)."""
+        return sum(a.nbytes for a in (self.minutes, self.latitude, self.longitude, self.cell, *self.codes.values()))
+
+    @property
+    def years(self):
+        if self.n == 0:
+            return []
+        first, last = (np.array([self.minutes[0], self.minutes[-1]], dtype='datetime64[m]')
+                       .astype('datetime64[Y]').astype(np.int64) + 1970)
+        return list(range(int(first), int(last) + 1))
+
+    # -----------------------------
+    # Selection
+    # -----------------------------
+    def row_range(self, start=None, end=None, years=None):
+        """Half-open [lo, hi) row slice of incidents from `start` to `end` (inclusive) or a (first, last) year range."""
+        if years is not None:
+            start, end = f"{years[0]}-01-01", pd.Timestamp(f"{years[1] + 1}-01-01") - pd.Timedelta(minutes=1)
+        lo = 0 if start is None else int(np.searchsorted(self.minutes, _minute(start), side='left'))
+        hi = self.n if end is None else int(np.searchsorted(self.minutes, _minute(end), side='right'))
+        return lo, max(lo, hi)
+
+    def _lookups(self, selections):
+        """Code column -> boolean table indexed by code (True = selected), for the filters that are set."""
+        lookups = {}
+        for key, selected in selections.items():
+            if key not in FILTERS:
+                raise TypeError(f"unknown filter {key!r} (expected one of {sorted(FILTERS)})")
+            if selected is None:
+                continue
+            col = FILTERS[key]
+            lut = np.zeros(np.iinfo(self.codes[col].dtype).max + 1, dtype=bool)
+            idx = pd.Index(self.labels[col]).get_indexer(list(selected))
+            lut[idx[idx >= 0]] = True
+            lookups[col] = lut
+        return lookups
+
+    def chunks(self, start=None, end=None, years=None, **selections):
+        """(lo, hi, keep) per chunk of the date slice; `keep` is the boolean row mask, or None when unfiltered."""
+        lo, hi = self.row_range(start, end, years)
+        lookups = self._lookups(selections)
+        for a in range(lo, hi, CHUNK_ROWS):
+            b = min(a + CHUNK_ROWS, hi)
+            keep = None
+            for col, lut in lookups.items():
+                selected = lut[self.codes[col][a:b]]
+                keep = selected if keep is None else keep & selected
+            yield a, b, keep
+
+    # -----------------------------
+    # Aggregates
+    # -----------------------------
+    def count(self, **filters):
+        """Number of incidents matching the filters."""
+        return sum(b - a if keep is None else int(np.count_nonzero(keep)) for a, b, keep in self.chunks(**filters))
+
+    def counts(self, column, **filters):
+        """`value_counts()` of a code column over the filtered rows (labels without incidents omitted)."""
+        labels = self.labels[column]
+        total = np.zeros(len(labels), dtype=np.int64)
+        for a, b, keep in self.chunks(**filters):
+            codes = self.codes[column][a:b]
+            total += np.bincount(codes if keep is None else codes[keep], minlength=len(labels))[:len(labels)]
+        series = pd.Series(total, index=pd.Index(labels, name=column), name='count')
+        return series[series > 0].sort_values(ascending=False, kind='stable')
+
+    def top_cells(self, k=10, **filters):
+        """The k grid cells with most incidents: cell, centre lat/lon, count (as `SpatialIndex.top_cells`)."""
+        g = self.grid
+        n_cells = g['nx'] * g['ny']
+        counts = np.zeros(n_cells, dtype=np.int64)
+        for a, b, keep in self.chunks(**filters):
+            cell = self.cell[a:b] if keep is None else self.cell[a:b][keep]
+            # Dropped before counting: the missing marker is the dtype's maximum, which as a uint32
+            # would size the bincount at 2^32 bins
+            counts += np.bincount(cell[cell < n_cells], minlength=n_cells)
+        k = min(k, int(np.count_nonzero(counts)))
+        top = np.argpartition(-counts, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+        top = top[np.argsort(-counts[top], kind='stable')]
+        lat = g['lat0'] + (top // g['nx'] + 0.5) * g['cell_m'] / EARTH_M_PER_DEG
+        lon = g['lon0'] + (top % g['nx'] + 0.5) * g['cell_m'] / g['m_per_deg_lon']
+        return pd.DataFrame({'cell': top, 'latitude': lat, 'longitude': lon, 'count': counts[top]})
+
+    def cube(self):
+        """CrimeCube (day and year x weekday x hour axes) from the code arrays, without a frame."""
+        from .cube import CrimeCube
+
+        categories, districts = self.labels['incident_category'], self.labels[DISTRICT_COL]
+        n_cat, n_dist = len(categories), len(districts)
+        if self.n == 0:
+            return CrimeCube(np.datetime64('1970-01-01'), categories, districts,
+                             np.zeros((0, n_cat, n_dist), dtype=np.int64))
+        day0 = int(self.minutes[0]) // MINUTES_PER_DAY
+        n_days = int(self.minutes[-1]) // MINUTES_PER_DAY - day0 + 1
+        years = self.years
+        counts = np.zeros(n_days * n_cat * n_dist, dtype=np.int64)
+        hourly = np.zeros(len(years) * 7 * 24 * n_cat * n_dist, dtype=np.int64)
+        for a, b, _ in self.chunks():
+            minutes = self.minutes[a:b].astype(np.int64)
+            cat = self.codes['incident_category'][a:b].astype(np.int64)
+            dist = self.codes[DISTRICT_COL][a:b].astype(np.int64)
+            ok = (cat < n_cat) & (dist < n_dist)
+            minutes, cat, dist = minutes[ok], cat[ok], dist[ok]
+            day = minutes // MINUTES_PER_DAY
+            counts += np.bincount(((day - day0) * n_cat + cat) * n_dist + dist, minlength=len(counts))
+            year = day.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970 - years[0]
+            # 1970-01-01 was a Thursday (Monday = 0)
+            dow, hour = (day + 3) % 7, minutes % MINUTES_PER_DAY // 60
+            hourly += np.bincount(((((year * 7 + dow) * 24 + hour) * n_cat + cat) * n_dist + dist),
+                                  minlength=len(hourly))
+        return CrimeCube(np.datetime64(day0, 'D'), categories, districts, counts.reshape(n_days, n_cat, n_dist),
+                         hourly.reshape(len(years), 7, 24, n_cat, n_dist))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write the memory-mapped incident snapshot of the cleaned store.")
+    parser.add_argument("--root", default=SNAPSHOT_DIR, help="snapshot directory")
+    parser.add_argument("--full", action="store_true", help="rescan the whole store instead of the changed months")
+    args = parser.parse_args()
+    if args.full:
+        write_snapshot(root=args.root)
+    else:
+        update_snapshot(root=args.root)
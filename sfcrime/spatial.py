@@ -0,0 +1,311 @@
+"""
+Spatial index over the cleaned incident table.
+
+Hotspots in the notebooks come from `value_counts()` on
+`analysis_neighborhood` or from offline K-Means, so a question like
+"incidents within 500 m of this point in the last 30 days" means scanning
+every row's latitude/longitude. `SpatialIndex` answers it from three
+structures built once:
+
+- a uniform grid (geohash-like, `cell_m` metres per side on a local
+  equirectangular projection): point positions are sorted by (cell, time),
+  so one cell's incidents in a time window are a contiguous slice found by
+  binary search. Radius and bounding-box queries only visit the few cells
+  that overlap the query shape, then run an exact distance/coordinate check.
+- per-cell cumulative counts by day bucket, so the incident count of every
+  cell over any day range is a single subtraction and top-k hottest cells
+  is an `argpartition` over ~2,000 occupied cells.
+- a KD-tree on projected coordinates for k-nearest-neighbour queries.
+
+Results are row positions into the frame the index was built from (and the
+matching `incident_id`s when available).
+
+Usage:
+    index = SpatialIndex.from_store(open_clean_store())
+    rows = index.radius(37.7599, -122.4148, 500, start=index.last(days=30))
+    index.top_cells(10, start='2024-01-01', end='2024-12-31')
+    index.knn(37.7599, -122.4148, k=20)
+    index.cell_density(df['latitude'], df['longitude'], start, end)   # per-row feature for models
+    SpatialIndex.from_snapshot(load_snapshot(), years=(2024, 2024))   # from the app's memory-mapped columns
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+EARTH_M_PER_DEG = 111_320.0
+MINUTES_PER_DAY = 1440
+
+
+def to_minutes(ts):
+    """Minutes since the Unix epoch for a datetime-like scalar or array (int64)."""
+    if np.ndim(ts) == 0:
+        return int(pd.Timestamp(ts).value // 60_000_000_000)
+    values = pd.to_datetime(pd.Series(ts)).to_numpy().astype('datetime64[m]')
+    return values.astype(np.int64)
+
+
+def grid_params(lat, lon, cell_m=250.0):
+    """
+    Grid over the points: a local equirectangular projection around their south-west corner (rounded
+    down to 0.01 degree), `cell_m` metres per side, and the nx x ny cells that cover them.
+    Shared with `sfcrime.snapshot`, whose `cell` column uses the same layout.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    if not ok.any():
+        return {'cell_m': float(cell_m), 'lat0': 0.0, 'lon0': 0.0, 'm_per_deg_lon': EARTH_M_PER_DEG, 'nx': 1, 'ny': 1}
+    lat, lon = lat[ok], lon[ok]
+    lat0 = float(np.floor(lat.min() * 100) / 100)
+    lon0 = float(np.floor(lon.min() * 100) / 100)
+    m_per_deg_lon = EARTH_M_PER_DEG * float(np.cos(np.radians(np.median(lat))))
+    nx = int((lon.max() - lon0) * m_per_deg_lon // cell_m) + 1
+    ny = int((lat.max() - lat0) * EARTH_M_PER_DEG // cell_m) + 1
+    return {'cell_m': float(cell_m), 'lat0': lat0, 'lon0': lon0, 'm_per_deg_lon': m_per_deg_lon, 'nx': nx, 'ny': ny}
+
+
+class SpatialIndex:
+    """
+    Grid + KD-tree index over incident points.
+    - lat / lon: float coordinates of every point
+    - minutes: incident time per point, minutes since the epoch
+    - cell_m: grid cell size in metres
+    - ids: optional ids per point (e.g. `incident_id`) returned by `ids_of`
+    - grid: optional fixed `grid_params` layout (default: fitted to the points; `cell_m` is then ignored)
+    """
+    def __init__(self, lat, lon, minutes, cell_m=250.0, ids=None, grid=None):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        self.minutes = np.asarray(minutes, dtype=np.int64)
+        self.ids = None if ids is None else np.asarray(ids)
+        self.n = len(lat)
+
+        grid = grid or grid_params(lat, lon, cell_m)
+        self.cell_m = float(grid['cell_m'])
+        self.lat0, self.lon0 = grid['lat0'], grid['lon0']
+        self.m_per_deg_lat = EARTH_M_PER_DEG
+        self.m_per_deg_lon = grid['m_per_deg_lon']
+        self.x, self.y = self.project(lat, lon)
+        self.nx, self.ny = grid['nx'], grid['ny']
+
+        # Sort by (cell, time): a cell's points in a time window are one contiguous slice
+        cell = self._cell_ids(self.x, self.y)
+        self.order = np.lexsort((self.minutes, cell))
+        sorted_cells = cell[self.order]
+        self.cells, self.cell_start = np.unique(sorted_cells, return_index=True)
+        self.cell_start = np.append(self.cell_start, self.n)
+        self.slot = np.full(self.nx * self.ny, -1, dtype=np.int64)
+        self.slot[self.cells] = np.arange(len(self.cells))
+        self.t_min = int(self.minutes.min()) if self.n else 0
+        self.t_max = int(self.minutes.max()) if self.n else 0
+        # Composite (slot, time) key for vectorized window lookups across cells
+        self._key = (self.slot[sorted_cells] << 32) + (self.minutes[self.order] - self.t_min)
+
+        # Per-cell cumulative counts by day bucket: count(cell, days [a, b)) = cum[cell, b] - cum[cell, a]
+        self.day0 = self.t_min // MINUTES_PER_DAY
+        n_days = self.t_max // MINUTES_PER_DAY - self.day0 + 1 if self.n else 1
+        day = self.minutes // MINUTES_PER_DAY - self.day0
+        daily = np.zeros((len(self.cells), n_days), dtype=np.int32)
+        np.add.at(daily, (self.slot[cell], day), 1)
+        self.cum = np.zeros((len(self.cells), n_days + 1), dtype=np.int32)
+        np.cumsum(daily, axis=1, out=self.cum[:, 1:])
+
+        self._tree = None
+
+    @classmethod
+    def from_frame(cls, df, lat_col='latitude', lon_col='longitude', time_col='incident_datetime',
+                   id_col='incident_id', cell_m=250.0):
+        valid = df[lat_col].notna() & df[lon_col].notna() & df[time_col].notna()
+        df = df[valid]
+        ids = df[id_col].to_numpy() if id_col in df.columns else None
+        return cls(df[lat_col].to_numpy(), df[lon_col].to_numpy(), to_minutes(df[time_col]), cell_m, ids)
+
+    @classmethod
+    def from_snapshot(cls, snap, start=None, end=None, years=None):
+        """
+        Build from the memory-mapped columns of a `sfcrime.snapshot.Snapshot` (optionally one date range),
+        on the snapshot's grid, so `cells` are the ids of its `cell` column.
+        """
+        lo, hi = snap.row_range(start, end, years)
+        lat, lon = snap.latitude[lo:hi], snap.longitude[lo:hi]
+        ok = ~(np.isnan(lat) | np.isnan(lon))
+        return cls(lat[ok], lon[ok], snap.minutes[lo:hi][ok], grid=snap.grid)
+
+    @classmethod
+    def from_store(cls, store, cell_m=250.0, **read_kwargs):
+        """Build from the cleaned store, reading only coordinates, time and id (`read_kwargs`: district/year/filters)."""
+        df = store.read(columns=['latitude', 'longitude', 'incident_datetime', 'incident_id'], **read_kwargs)
+        return cls.from_frame(df, cell_m=cell_m)
+
+    # -----------------------------
+    # Geometry
+    # -----------------------------
+    def project(self, lat, lon):
+        """(x, y) metres east / north of the grid origin."""
+        x = (np.asarray(lon, dtype=np.float64) - self.lon0) * self.m_per_deg_lon
+        y = (np.asarray(lat, dtype=np.float64) - self.lat0) * self.m_per_deg_lat
+        return x, y
+
+    def _cell_ids(self, x, y):
+        ix = np.clip((np.asarray(x) // self.cell_m).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip((np.asarray(y) // self.cell_m).astype(np.int64), 0, self.ny - 1)
+        return iy * self.nx + ix
+
+    def cell_of(self, lat, lon):
+        return self._cell_ids(*self.project(lat, lon))
+
+    def cell_center(self, cells):
+        """(lat, lon) of the centre of grid cells."""
+        cells = np.asarray(cells)
+        x = (cells % self.nx + 0.5) * self.cell_m
+        y = (cells // self.nx + 0.5) * self.cell_m
+        return self.lat0 + y / self.m_per_deg_lat, self.lon0 + x / self.m_per_deg_lon
+
+    def last(self, days):
+        """Start time of the last `days` days of data (for `start=`)."""
+        return self.t_max - int(days * MINUTES_PER_DAY)
+
+    def _window(self, start, end):
+        lo = self.t_min if start is None else (start if isinstance(start, (int, np.integer)) else to_minutes(start))
+        hi = self.t_max if end is None else (end if isinstance(end, (int, np.integer)) else to_minutes(end))
+        return max(lo, self.t_min), hi
+
+    # -----------------------------
+    # Point queries
+    # -----------------------------
+    def _candidates(self, x0, x1, y0, y1, start, end):
+        """Sorted-array positions of points in cells overlapping [x0, x1] x [y0, y1] within the time window."""
+        ix = np.arange(max(int(x0 // self.cell_m), 0), min(int(x1 // self.cell_m), self.nx - 1) + 1)
+        iy = np.arange(max(int(y0 // self.cell_m), 0), min(int(y1 // self.cell_m), self.ny - 1) + 1)
+        if len(ix) == 0 or len(iy) == 0:
+            return np.zeros(0, dtype=np.int64)
+        slots = self.slot[(iy[:, None] * self.nx + ix[None, :]).ravel()]
+        slots = slots[slots >= 0]
+        t0, t1 = self._window(start, end)
+        if t1 < t0 or len(slots) == 0:
+            return np.zeros(0, dtype=np.int64)
+        lo = np.searchsorted(self._key, (slots << 32) + (t0 - self.t_min), side='left')
+        hi = np.searchsorted(self._key, (slots << 32) + (t1 - self.t_min), side='right')
+        sizes = hi - lo
+        if sizes.sum() == 0:
+            return np.zeros(0, dtype=np.int64)
+        # Concatenate the [lo, hi) ranges without a Python loop
+        offsets = np.repeat(lo - np.concatenate([[0], np.cumsum(sizes)[:-1]]), sizes)
+        return np.arange(sizes.sum()) + offsets
+
+    def radius(self, lat, lon, radius_m, start=None, end=None):
+        """Row positions of points within `radius_m` metres of (lat, lon) and in [start, end]."""
+        cx, cy = self.project(lat, lon)
+        cand = self._candidates(cx - radius_m, cx + radius_m, cy - radius_m, cy + radius_m, start, end)
+        rows = self.order[cand]
+        d2 = (self.x[rows] - cx) ** 2 + (self.y[rows] - cy) ** 2
+        return rows[d2 <= radius_m ** 2]
+
+    def bbox(self, lat_min, lat_max, lon_min, lon_max, start=None, end=None):
+        """Row positions of points inside the bounding box and in [start, end]."""
+        x0, y0 = self.project(lat_min, lon_min)
+        x1, y1 = self.project(lat_max, lon_max)
+        rows = self.order[self._candidates(x0, x1, y0, y1, start, end)]
+        inside = (self.x[rows] >= x0) & (self.x[rows] <= x1) & (self.y[rows] >= y0) & (self.y[rows] <= y1)
+        return rows[inside]
+
+    def knn(self, lat, lon, k=10, start=None, end=None):
+        """(row positions, distances in metres) of the k nearest points, optionally within a time window."""
+        cx, cy = self.project(lat, lon)
+        if start is None and end is None:
+            if self._tree is None:
+                # Imported here so grid-only users (the app, the snapshot) don't pay for sklearn
+                from sklearn.neighbors import KDTree
+
+                self._tree = KDTree(np.column_stack([self.x, self.y]))
+            dist, rows = self._tree.query([[cx, cy]], k=min(k, self.n))
+            return rows[0], dist[0]
+        # Time-windowed: grow a grid radius query until it holds k points (the k nearest are then inside it)
+        reach = np.hypot(max(cx, self.nx * self.cell_m - cx), max(cy, self.ny * self.cell_m - cy))
+        radius_m = self.cell_m
+        while True:
+            rows = self.radius(lat, lon, radius_m, start, end)
+            if len(rows) >= k or radius_m >= reach:
+                dist = np.hypot(self.x[rows] - cx, self.y[rows] - cy)
+                nearest = np.argsort(dist, kind='stable')[:k]
+                return rows[nearest], dist[nearest]
+            radius_m *= 2
+
+    def ids_of(self, rows):
+        return None if self.ids is None else self.ids[rows]
+
+    # -----------------------------
+    # Cell aggregates
+    # -----------------------------
+    def _day_range(self, start, end):
+        t0, t1 = self._window(start, end)
+        n_days = self.cum.shape[1] - 1
+        a = int(np.clip(t0 // MINUTES_PER_DAY - self.day0, 0, n_days))
+        b = int(np.clip(t1 // MINUTES_PER_DAY - self.day0 + 1, 0, n_days))
+        return a, max(a, b)
+
+    def cell_counts(self, start=None, end=None):
+        """Incidents per occupied cell (aligned with `self.cells`) over whole days from start to end."""
+        a, b = self._day_range(start, end)
+        return self.cum[:, b] - self.cum[:, a]
+
+    def top_cells(self, k=10, start=None, end=None):
+        """The k cells with most incidents in the window: cell, centre lat/lon, count."""
+        counts = self.cell_counts(start, end)
+        k = min(k, len(counts))
+        top = np.argpartition(-counts, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+        top = top[np.argsort(-counts[top], kind='stable')]
+        lat, lon = self.cell_center(self.cells[top])
+        return pd.DataFrame({'cell': self.cells[top], 'latitude': lat, 'longitude': lon, 'count': counts[top]})
+
+    def cell_density(self, lat, lon, start=None, end=None):
+        """Per-point count of incidents in the point's grid cell over the window (0 for empty cells)."""
+        slots = self.slot[self.cell_of(lat, lon)]
+        counts = self.cell_counts(start, end)
+        return np.where(slots >= 0, counts[np.maximum(slots, 0)], 0)
+
+    def cell_series(self, cell, freq='D'):
+        """Daily (or resampled) incident counts of one grid cell."""
+        slot = self.slot[cell]
+        days = pd.date_range(pd.Timestamp(self.day0, unit='D'), periods=self.cum.shape[1] - 1, freq='D')
+        values = np.diff(self.cum[slot]) if slot >= 0 else np.zeros(len(days), dtype=np.int32)
+        series = pd.Series(values, index=days, name='incidents')
+        return series if freq == 'D' else series.resample(freq).sum()
+
+    @property
+    def grid(self):
+        """The `grid_params` layout of this index."""
+        return {'cell_m': self.cell_m, 'lat0': self.lat0, 'lon0': self.lon0, 'm_per_deg_lon': self.m_per_deg_lon,
+                'nx': self.nx, 'ny': self.ny}
+
+    @property
+    def nbytes(self):
+        arrays = (self.x, self.y, self.minutes, self.order, self.cell_start, self.slot, self._key, self.cum)
+        return sum(a.nbytes for a in arrays)
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, path):
+        """Only the inputs and the grid layout are stored; the index is rebuilt on load (a fraction of a second)."""
+        lat = self.lat0 + self.y / self.m_per_deg_lat
+        lon = self.lon0 + self.x / self.m_per_deg_lon
+        arrays = {'lat': lat, 'lon': lon, 'minutes': self.minutes}
+        # The layout is stored as is rather than refitted on load, so cell ids survive the round trip
+        # (e.g. an index on a snapshot's grid keeps matching its `cell` column)
+        arrays.update({name: np.array(value) for name, value in self.grid.items()})
+        if self.ids is not None:
+            arrays['ids'] = self.ids
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            grid = None
+            if 'nx' in z.files:
+                grid = {name: z[name].item() for name in ('cell_m', 'lat0', 'lon0', 'm_per_deg_lon', 'nx', 'ny')}
+            return cls(z['lat'], z['lon'], z['minutes'], float(z['cell_m']), z['ids'] if 'ids' in z.files else None,
+                       grid)
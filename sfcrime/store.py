@@ -0,0 +1,373 @@
+"""
+Local, partitioned incident store.
+
+Rows are partitioned by the month of `incident_datetime` into Hive-style
+directories (`year=2024/month=03/`), one Parquet file per partition. The
+cleaned store adds a `police_district=<name>/` level below each month, so a
+district-year read only opens that district's files. A month is still the
+unit of rewrite and versioning: a manifest keeps a store-wide version
+counter plus the version at which each month was last written, so
+downstream consumers (dashboard, models) can ask which partitions changed
+since the version they last saw. Versions restart in a new or rebuilt
+store, so the manifest also holds an id drawn when the store is created.
+
+Upserts are keyed on `incident_id`; an id -> partition index makes it
+possible to replace a row even if it moves to another month.
+
+Reads go through `pyarrow.dataset`, so callers get column projection and
+predicate pushdown (partition pruning on year/month/district, row-group
+statistics on everything else):
+
+    store = open_clean_store()
+    df = store.read(columns=['incident_date', 'incident_category'],
+                    district='Mission', year=2024)
+"""
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .cleaning import apply_clean_dtypes, coerce_types
+from .config import CLEAN_STORE_DIR, DISTRICT_COL, RAW_STORE_DIR
+
+MANIFEST = "_manifest.json"
+INDEX = "_index.parquet"
+PART_FILE = "part-0.parquet"
+
+
+def _atomic_write_json(path, payload):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(payload, fh, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def partition_keys(incident_datetime):
+    """Vectorized `year=YYYY/month=MM` key per row (NaN for unparseable datetimes)."""
+    ts = pd.to_datetime(incident_datetime, errors='coerce')
+    keys = "year=" + ts.dt.strftime("%Y") + "/month=" + ts.dt.strftime("%m")
+    return keys.where(ts.notna())
+
+
+class IncidentStore:
+    """
+    Directory of month partitions plus a manifest.
+    - root: store directory (created on first write)
+    - key: column rows are upserted on
+    - order_by: when several versions of a key arrive, the latest by this column wins
+    - subpartition: optional column split into `<col>=<value>/` directories within a month
+    """
+    def __init__(self, root, key="incident_id", order_by="report_datetime", subpartition=None):
+        self.root = root
+        self.key = key
+        self.order_by = order_by
+        self.subpartition = subpartition
+        self._manifest = None
+
+    # -----------------------------
+    # Manifest
+    # -----------------------------
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            path = os.path.join(self.root, MANIFEST)
+            if os.path.exists(path):
+                with open(path) as fh:
+                    self._manifest = json.load(fh)
+                if "id" not in self._manifest:
+                    # Stores written before ids existed get theirs on first open
+                    self._manifest["id"] = uuid.uuid4().hex
+                    self._save_manifest()
+            else:
+                self._manifest = {"id": uuid.uuid4().hex, "version": 0, "partitions": {}}
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        _atomic_write_json(os.path.join(self.root, MANIFEST), self.manifest)
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def identity(self):
+        """Resolved root plus the id drawn when the store was created: versions restart at 1 in a new or
+        rebuilt store, so anything cached by partition version is also keyed on this."""
+        return f"{os.path.realpath(self.root)}#{self.manifest['id']}"
+
+    def partitions(self):
+        return sorted(self.manifest["partitions"])
+
+    def partition_info(self, part):
+        return self.manifest["partitions"].get(part)
+
+    def changed_since(self, version):
+        """Partitions written after store version `version`."""
+        return sorted(p for p, info in self.manifest["partitions"].items() if info["version"] > version)
+
+    def _bump(self, parts, rows_by_part):
+        self.manifest["version"] += 1
+        v = self.manifest["version"]
+        now = time.time()
+        for part in parts:
+            if rows_by_part.get(part, 0) == 0:
+                self.manifest["partitions"].pop(part, None)
+            else:
+                self.manifest["partitions"][part] = {"version": v, "rows": int(rows_by_part[part]), "written_at": now}
+        self._save_manifest()
+        return v
+
+    # -----------------------------
+    # Partition I/O
+    # -----------------------------
+    def partition_dir(self, part):
+        return os.path.join(self.root, *part.split("/"))
+
+    def read_partition(self, part, columns=None):
+        pdir = self.partition_dir(part)
+        if not os.path.isdir(pdir):
+            return pd.DataFrame(columns=columns) if columns else pd.DataFrame()
+        if self.subpartition is None:
+            return pd.read_parquet(os.path.join(pdir, PART_FILE), columns=columns)
+        partitioning = ds.partitioning(pa.schema([(self.subpartition, pa.string())]), flavor="hive")
+        table = ds.dataset(pdir, format="parquet", partitioning=partitioning).to_table(columns=columns)
+        df = table.to_pandas()
+        if self.subpartition in df.columns:
+            df[self.subpartition] = df[self.subpartition].astype("category")
+        return df
+
+    @staticmethod
+    def _write_file(path, table):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _write_files(self, part, df):
+        pdir = self.partition_dir(part)
+        # A rewrite replaces the whole month, including sub-partitions that no longer have rows
+        shutil.rmtree(pdir, ignore_errors=True)
+        if len(df) == 0:
+            return
+        if self.subpartition is None:
+            self._write_file(os.path.join(pdir, PART_FILE), pa.Table.from_pandas(df, preserve_index=False))
+            return
+        # One pandas -> Arrow conversion per month: rows are ordered by sub-partition (stable, so
+        # each file keeps the month's row order) and every file is a zero-copy slice of that table.
+        # The sub-partition value lives in the directory name, not in the file
+        codes, values = pd.factorize(df[self.subpartition], sort=True)
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes[codes >= 0], minlength=len(values))
+        start = int((codes < 0).sum())
+        table = pa.Table.from_pandas(df.drop(columns=self.subpartition).iloc[order], preserve_index=False)
+        for value, count in zip(values, counts):
+            if count:
+                sub_dir = f"{self.subpartition}={quote(str(value), safe='')}"
+                self._write_file(os.path.join(pdir, sub_dir, PART_FILE), table.slice(start, count))
+            start += count
+
+    def write_frame(self, df):
+        """Replace every month present in `df` (e.g. to import `police_data_step1_cleaned.csv`)."""
+        parts = partition_keys(df["incident_datetime"])
+        frames = {part: group for part, group in df.groupby(parts, sort=True)}
+        return self.write_partitions(frames)
+
+    def write_partitions(self, frames):
+        """Replace whole partitions: {part: DataFrame}. Returns the new store version."""
+        for part, df in frames.items():
+            self._write_files(part, df)
+        return self._bump(list(frames), {p: len(df) for p, df in frames.items()})
+
+    def iter_partitions(self, parts=None, columns=None):
+        for part in (self.partitions() if parts is None else parts):
+            yield part, self.read_partition(part, columns=columns)
+
+    def read_all(self, columns=None):
+        frames = [df for _, df in self.iter_partitions(columns=columns)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    def map_partitions(self, fn, args=(), cache_path=None, cache_key=None, max_workers=None, refresh=None):
+        """
+        `fn(root, part, *args)` for every partition, in parallel processes, with results cached on
+        disk by partition version: only partitions written since the cached run are recomputed.
+        - cache_key: invalidates the whole cache when it changes (e.g. the column list); so does a
+          different store (see `identity`), since partition versions are only comparable within one
+        - refresh: optional predicate on a cached result that forces recomputation
+        Returns ({part: result} in partition order, [recomputed parts]).
+        """
+        cache = {"key": cache_key, "store": self.identity, "parts": {}}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as fh:
+                cached = pickle.load(fh)
+            if cached.get("key") == cache_key and cached.get("store") == self.identity:
+                cache = cached
+
+        parts = self.partitions()
+        versions = {part: self.partition_info(part)["version"] for part in parts}
+        stale = [p for p in parts
+                 if p not in cache["parts"] or cache["parts"][p][0] != versions[p]
+                 or (refresh is not None and refresh(cache["parts"][p][1]))]
+        removed = set(cache["parts"]) - set(parts)
+        for part in removed:
+            del cache["parts"][part]
+
+        max_workers = max_workers or min(len(stale), os.cpu_count() or 1)
+        if max_workers > 1:
+            n = len(stale)
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                fresh = list(pool.map(fn, [self.root] * n, stale, *[[a] * n for a in args]))
+        else:
+            fresh = [fn(self.root, part, *args) for part in stale]
+        for part, result in zip(stale, fresh):
+            cache["parts"][part] = (versions[part], result)
+
+        if cache_path and (stale or removed):
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            tmp = cache_path + ".tmp"
+            with open(tmp, "wb") as fh:
+                pickle.dump(cache, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path)
+        return {part: cache["parts"][part][1] for part in parts}, stale
+
+    # -----------------------------
+    # Dataset reads (projection + pushdown)
+    # -----------------------------
+    def dataset(self):
+        fields = [("year", pa.int16()), ("month", pa.int8())]
+        if self.subpartition is not None:
+            fields.append((self.subpartition, pa.dictionary(pa.int32(), pa.string())))
+        partitioning = ds.partitioning(pa.schema(fields), flavor="hive", dictionaries="infer")
+        # `_manifest.json` / `_index.parquet` are skipped by the default `_` ignore prefix
+        return ds.dataset(self.root, format="parquet", partitioning=partitioning)
+
+    def _filter_expression(self, filters=None, district=None, year=None, month=None):
+        expr = None
+        if filters is not None:
+            expr = filters if isinstance(filters, ds.Expression) else pq.filters_to_expression(filters)
+        for name, value in (("year", year), ("month", month), (self.subpartition, district)):
+            if value is None or name is None:
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            cond = ds.field(name).isin(list(values))
+            expr = cond if expr is None else expr & cond
+        return expr
+
+    def read_table(self, columns=None, filters=None, district=None, year=None, month=None):
+        """
+        Arrow table with only `columns`, pruned by `filters`.
+        - filters: a pyarrow expression or DNF tuples like `[('latitude', '>', 37.7)]`
+        - district / year / month: shortcuts for the partition columns (scalar or list)
+        """
+        if not os.path.isdir(self.root):
+            return None
+        expr = self._filter_expression(filters, district, year, month)
+        return self.dataset().to_table(columns=columns, filter=expr)
+
+    def scan_batches(self, columns=None, filters=None, district=None, year=None, month=None):
+        """Same selection as `read_table`, streamed as Arrow record batches (one file's rows at most)."""
+        if not os.path.isdir(self.root):
+            return
+        expr = self._filter_expression(filters, district, year, month)
+        yield from self.dataset().to_batches(columns=columns, filter=expr)
+
+    def read(self, columns=None, filters=None, district=None, year=None, month=None):
+        """DataFrame version of `read_table`; dictionary columns come back as `category`."""
+        table = self.read_table(columns, filters, district, year, month)
+        if table is None:
+            return pd.DataFrame(columns=columns)
+        return table.to_pandas()
+
+    def iter_frames(self, columns=None, batch_rows=262_144, **filters):
+        """
+        DataFrames of about `batch_rows` rows over the selection (`filters`: as `read_table`).
+        Record batches are at most one district-month file, so they are regrouped.
+        """
+        pending, rows = [], 0
+        for batch in self.scan_batches(columns, **filters):
+            pending.append(batch)
+            rows += batch.num_rows
+            if rows >= batch_rows:
+                yield pa.Table.from_batches(pending).to_pandas()
+                pending, rows = [], 0
+        if pending:
+            yield pa.Table.from_batches(pending).to_pandas()
+
+    # -----------------------------
+    # Upsert
+    # -----------------------------
+    def _load_index(self):
+        path = os.path.join(self.root, INDEX)
+        if not os.path.exists(path):
+            return pd.Series(dtype=object, name="partition")
+        idx = pd.read_parquet(path)
+        return pd.Series(idx["partition"].values, index=idx[self.key].values, name="partition")
+
+    def _save_index(self, index):
+        path = os.path.join(self.root, INDEX)
+        frame = pd.DataFrame({self.key: index.index.astype(str), "partition": index.values})
+        frame.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    def upsert(self, df):
+        """
+        Insert or replace rows by `key`. Only the partitions that receive rows,
+        or lose rows because a key moved month, are rewritten.
+        Returns the list of changed partitions.
+        """
+        if df.empty:
+            return []
+        df = df.copy()
+        df[self.key] = df[self.key].astype(str)
+        df["_part"] = partition_keys(df["incident_datetime"])
+        df = df[df["_part"].notna()]
+        if self.order_by in df.columns:
+            df = df.sort_values(self.order_by, kind="stable")
+        df = df.drop_duplicates(subset=[self.key], keep="last")
+
+        index = self._load_index()
+        incoming = df.set_index(self.key)["_part"]
+        previous = index.reindex(incoming.index).dropna()
+        changed = set(incoming.unique()) | set(previous.unique())
+
+        frames = {}
+        incoming_keys = set(incoming.index)
+        for part in sorted(changed):
+            existing = self.read_partition(part)
+            if not existing.empty:
+                existing[self.key] = existing[self.key].astype(str)
+                existing = existing[~existing[self.key].isin(incoming_keys)]
+            new_rows = df[df["_part"] == part].drop(columns="_part")
+            merged = pd.concat([existing, new_rows], ignore_index=True)
+            frames[part] = merged
+
+        self.write_partitions(frames)
+        index = pd.concat([index.drop(incoming.index, errors="ignore"), incoming])
+        self._save_index(index)
+        return sorted(changed)
+
+
+def open_raw_store(root=RAW_STORE_DIR):
+    """Raw SODA records (strings), one file per month."""
+    return IncidentStore(root)
+
+
+def open_clean_store(root=CLEAN_STORE_DIR):
+    """Cleaned, typed incident table, partitioned by month and police district."""
+    return IncidentStore(root, subpartition=DISTRICT_COL)
+
+
+def import_cleaned_csv(path="police_data_step1_cleaned.csv", store=None):
+    """One-off migration of the notebooks' cleaned CSV into the partitioned store."""
+    store = store or open_clean_store()
+    df = apply_clean_dtypes(coerce_types(pd.read_csv(path)))
+    return store.write_frame(df)
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the SODA endpoint, for exercising the ingestion code
+without touching data.sfgov.org.
+
+Supports the subset of SoQL that the pipeline sends: `$limit`, `$offset`,
+`$order=:id`, `$select=count(*)` and `$where` clauses of the form
+`field >= 'value'` joined by AND/OR (values compared as strings, which is
+correct for the ISO timestamps SODA returns). It can inject latency and transient
+failures (HTTP 503) to exercise retry/backoff.
+
+Usage:
+    with StubSodaServer(records, latency=0.01, fail_every=7) as server:
+        fetch_all(endpoint=server.url, out_dir=tmp_dir)
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_CLAUSE = re.compile(r"^\(?\s*(\S+)\s*(>=|<=|>|<|=)\s*'([^']*)'\s*\)?$")
+_OPS = {
+    ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, "<": lambda a, b: a < b, "=": lambda a, b: a == b,
+}
+
+
+def _compile_where(where):
+    """`a > 'x' OR b >= 'y' AND c = 'z'` -> predicate(record). AND binds tighter than OR."""
+    groups = []
+    for group in re.split(r"\s+OR\s+", where.strip(), flags=re.IGNORECASE):
+        clauses = []
+        for clause in re.split(r"\s+AND\s+", group, flags=re.IGNORECASE):
+            m = _CLAUSE.match(clause.strip())
+            if not m:
+                raise ValueError(f"unsupported $where clause: {clause!r}")
+            clauses.append((m.group(1), _OPS[m.group(2)], m.group(3)))
+        groups.append(clauses)
+
+    def predicate(rec):
+        return any(all(field in rec and op(str(rec[field]), value) for field, op, value in clauses)
+                   for clauses in groups)
+    return predicate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with stub.lock:
+            stub.requests += 1
+            n = stub.requests
+        if stub.latency:
+            time.sleep(stub.latency)
+        if stub.fail_every and n % stub.fail_every == 0:
+            self._send_json(503, {"message": "injected failure"})
+            return
+
+        rows = stub.select(query)
+        if query.get("$select", "").replace(" ", "") == "count(*)":
+            self._send_json(200, [{"count": str(len(rows))}])
+            return
+        offset = int(query.get("$offset", 0))
+        limit = int(query.get("$limit", 1000))
+        self._send_json(200, rows[offset:offset + limit])
+
+
+class StubSodaServer:
+    """
+    Serve `records` (a list of dicts, as SODA returns them) on 127.0.0.1.
+    - latency: seconds to sleep per request
+    - fail_every: answer every Nth request with HTTP 503 (0 disables)
+    """
+    def __init__(self, records, latency=0.0, fail_every=0):
+        self.records = list(records)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def select(self, query):
+        where = query.get("$where")
+        if not where:
+            return self.records
+        predicate = _compile_where(where)
+        return [rec for rec in self.records if predicate(rec)]
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/resource/wg3w-h783.json"
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,307 @@
+"""
+Deterministic synthetic incidents, for demos and benchmarks.
+
+The dashboard's demo mode draws (date, category, district, count) rows
+uniformly from five categories. That is enough to draw a chart, but it
+has none of the columns, missing values or skew the pipeline is built
+around. `synthetic_chunks` extends it to full raw SODA records:
+
+- every field in `RAW_COLUMNS`, as the strings the API returns, plus an
+  API-only `:@computed_region_*` column that cleaning drops
+- SF's 41 analysis neighborhoods around their real centroids, weighted
+  toward the Tenderloin / Mission / SoMa hot spots, each in its police
+  district
+- Zipf-like incident categories with their subcategories, descriptions and
+  incident codes, an hour-of-day profile with the :00 / :30 heaping of hand
+  entered times, and a lognormal report delay whose scale depends on the
+  category (frauds are reported days later, assaults within minutes)
+- the defects cleaning has to handle: rows without a location or a CAD
+  number, supplement rows that repeat an earlier incident_id, and a few
+  placeholder coordinates (lat 90) for the IQR filter
+
+Chunks are generated independently from `(seed, chunk index)` and cover
+consecutive date ranges (like pages ordered by time), so any row count from
+thousands to tens of millions is produced in memory bounded by the chunk size
+and is identical across runs.
+
+Usage:
+    from sfcrime.synthetic import synthetic_chunks, soda_records
+    for raw in synthetic_chunks(1_000_000, seed=0):    # raw DataFrames of strings
+        raw_store.upsert(raw)
+    StubSodaServer(soda_records(raw))                  # the same rows as SODA JSON
+    mock_dashboard_frame()                             # the dashboard's demo data
+"""
+import numpy as np
+import pandas as pd
+
+from .config import RAW_COLUMNS
+
+CHUNK_ROWS = 250_000
+START_DATE = '2018-01-01'
+END_DATE = '2024-12-31'
+
+# Demo dashboard data (website.py without a store)
+MOCK_CATEGORIES = ['Vehicle Theft', 'Robbery', 'Burglary', 'Assault', 'Vandalism']
+MOCK_DISTRICTS = ['Central', 'Southern', 'Northern', 'Bayview', 'Mission', 'Richmond', 'Ingleside', 'Park',
+                  'Taraval', 'Tenderloin']
+
+# Analysis neighborhood: (latitude, longitude, police district, relative incident weight)
+NEIGHBORHOODS = {
+    'Bayview Hunters Point': (37.7299, -122.3850, 'Bayview', 6.0),
+    'Bernal Heights': (37.7410, -122.4150, 'Ingleside', 2.2),
+    'Castro/Upper Market': (37.7610, -122.4350, 'Mission', 2.6),
+    'Chinatown': (37.7940, -122.4070, 'Central', 2.4),
+    'Excelsior': (37.7240, -122.4320, 'Ingleside', 2.0),
+    'Financial District/South Beach': (37.7920, -122.3970, 'Central', 7.5),
+    'Glen Park': (37.7360, -122.4330, 'Ingleside', 0.6),
+    'Golden Gate Park': (37.7690, -122.4830, 'Park', 1.0),
+    'Haight Ashbury': (37.7690, -122.4470, 'Park', 1.8),
+    'Hayes Valley': (37.7760, -122.4250, 'Northern', 2.4),
+    'Inner Richmond': (37.7800, -122.4650, 'Richmond', 1.4),
+    'Inner Sunset': (37.7600, -122.4670, 'Taraval', 1.2),
+    'Japantown': (37.7850, -122.4300, 'Northern', 0.9),
+    'Lakeshore': (37.7240, -122.4850, 'Taraval', 1.1),
+    'Lincoln Park': (37.7840, -122.4980, 'Richmond', 0.1),
+    'Lone Mountain/USF': (37.7780, -122.4510, 'Park', 0.8),
+    'Marina': (37.8010, -122.4370, 'Northern', 2.5),
+    'McLaren Park': (37.7180, -122.4190, 'Ingleside', 0.2),
+    'Mission': (37.7600, -122.4150, 'Mission', 10.0),
+    'Mission Bay': (37.7710, -122.3920, 'Southern', 1.6),
+    'Nob Hill': (37.7920, -122.4160, 'Central', 2.5),
+    'Noe Valley': (37.7500, -122.4330, 'Ingleside', 1.0),
+    'North Beach': (37.8010, -122.4100, 'Central', 2.5),
+    'Oceanview/Merced/Ingleside': (37.7170, -122.4600, 'Taraval', 1.2),
+    'Outer Mission': (37.7230, -122.4450, 'Ingleside', 1.0),
+    'Outer Richmond': (37.7770, -122.4950, 'Richmond', 1.3),
+    'Pacific Heights': (37.7920, -122.4350, 'Northern', 1.3),
+    'Portola': (37.7270, -122.4070, 'Ingleside', 0.9),
+    'Potrero Hill': (37.7590, -122.3990, 'Bayview', 1.5),
+    'Presidio': (37.7990, -122.4660, 'Richmond', 0.2),
+    'Presidio Heights': (37.7880, -122.4530, 'Richmond', 0.6),
+    'Russian Hill': (37.8010, -122.4190, 'Central', 1.5),
+    'Seacliff': (37.7860, -122.4900, 'Richmond', 0.1),
+    'South of Market': (37.7780, -122.4050, 'Southern', 9.0),
+    'Sunset/Parkside': (37.7480, -122.4930, 'Taraval', 2.4),
+    'Tenderloin': (37.7840, -122.4140, 'Tenderloin', 9.5),
+    'Treasure Island': (37.8230, -122.3700, 'Southern', 0.3),
+    'Twin Peaks': (37.7530, -122.4470, 'Park', 0.3),
+    'Visitacion Valley': (37.7130, -122.4050, 'Ingleside', 1.0),
+    'West of Twin Peaks': (37.7400, -122.4620, 'Taraval', 1.3),
+    'Western Addition': (37.7810, -122.4350, 'Northern', 3.5),
+}
+
+# Category: (relative weight, mean log report delay in minutes, subcategories, descriptions)
+CATEGORIES = {
+    'Larceny Theft': (30.0, 5.5, ['Larceny - From Vehicle', 'Larceny Theft - Other', 'Larceny Theft - Shoplifting'],
+                      ['Theft, From Locked Vehicle, >$950', 'Theft, Other Property, $50-$200',
+                       'Theft, Shoplifting, <$50', 'Theft, From Unlocked Vehicle, <$50']),
+    'Malicious Mischief': (7.0, 5.0, ['Malicious Mischief', 'Vandalism'],
+                           ['Malicious Mischief, Vandalism to Property', 'Malicious Mischief, Breaking Windows']),
+    'Other Miscellaneous': (7.0, 2.5, ['Other'], ['Investigative Detention', 'Stay Away Order Violation']),
+    'Assault': (6.0, 3.0, ['Simple Assault', 'Aggravated Assault'],
+                ['Battery', 'Assault, Aggravated, W/ Deadly Weapon', 'Battery, Former Dating Relationship']),
+    'Non-Criminal': (5.0, 4.0, ['Non-Criminal'], ['Aided Case', 'Mental Health Detention']),
+    'Burglary': (5.0, 6.0, ['Burglary - Residential', 'Burglary - Other', 'Burglary - Hot Prowl'],
+                 ['Burglary, Residential, Forcible Entry', 'Burglary, Commercial, Unlawful Entry']),
+    'Motor Vehicle Theft': (4.0, 6.5, ['Motor Vehicle Theft'], ['Vehicle, Stolen, Auto', 'Vehicle, Stolen, Motorcycle']),
+    'Recovered Vehicle': (3.0, 7.0, ['Recovered Vehicle'], ['Vehicle, Recovered, Auto']),
+    'Fraud': (3.0, 8.5, ['Fraud', 'Credit Card'], ['Fraudulent Use of Credit Card', 'Identity Theft']),
+    'Warrant': (3.0, 1.0, ['Warrant'], ['Warrant Arrest, Local SF Warrant', 'Warrant Arrest, Enroute To Outside Jurisdiction']),
+    'Lost Property': (2.5, 6.5, ['Lost Property'], ['Lost Property']),
+    'Drug Offense': (2.0, 1.5, ['Drug Violation'], ['Methamphetamine, Possession', 'Narcotics Paraphernalia, Possession']),
+    'Robbery': (2.0, 3.0, ['Robbery - Street', 'Robbery - Commercial'], ['Robbery, W/ Force', 'Robbery, Armed with a Gun']),
+    'Missing Person': (2.0, 4.5, ['Missing Person', 'Missing Adult'], ['Found Person', 'Missing Adult']),
+    'Suspicious Occ': (1.8, 4.0, ['Suspicious Occ'], ['Suspicious Occurrence', 'Suspicious Package']),
+    'Disorderly Conduct': (1.2, 3.0, ['Other', 'Intimidation'], ['Trespassing', 'Threats Against Life']),
+    'Traffic Violation Arrest': (1.0, 1.0, ['Traffic Violation Arrest'], ['Driving, Suspended License']),
+    'Offences Against The Family And Children': (0.8, 5.0, ['Other'], ['Domestic Violence', 'Child Abuse']),
+    'Weapons Offense': (0.7, 2.0, ['Weapons Offense'], ['Firearm, Possession By Prohibited Person', 'Firearm, Discharging']),
+    'Stolen Property': (0.6, 3.0, ['Stolen Property'], ['Stolen Property, Possession']),
+    'Traffic Collision': (0.5, 3.5, ['Traffic Collision'], ['Hit and Run, Property Damage', 'Vehicle Collision']),
+    'Miscellaneous Investigation': (0.5, 5.0, ['Miscellaneous Investigation'], ['Miscellaneous Investigation']),
+    'Courtesy Report': (0.3, 5.0, ['Courtesy Report'], ['Courtesy Report']),
+    'Arson': (0.3, 4.0, ['Arson'], ['Arson, Vehicle', 'Arson, Commercial Building']),
+    'Sex Offense': (0.3, 7.0, ['Sex Offense', 'Rape'], ['Sexual Battery', 'Annoy or Molest Children']),
+    'Forgery And Counterfeiting': (0.2, 8.0, ['Forgery And Counterfeiting'], ['Forgery, Checks']),
+    'Embezzlement': (0.1, 9.0, ['Embezzlement'], ['Embezzlement, Grand Theft By Employee']),
+    'Homicide': (0.02, 2.0, ['Homicide'], ['Homicide, W/ Gun']),
+}
+# Categories that mostly end in an arrest
+ARREST_CATEGORIES = {'Warrant', 'Drug Offense', 'Traffic Violation Arrest', 'Weapons Offense', 'Stolen Property'}
+
+REPORT_TYPES = [('II', 'Initial', 0.55), ('VS', 'Vehicle Supplement', 0.08), ('IS', 'Initial Supplement', 0.12),
+                ('VI', 'Vehicle Initial', 0.07), ('CI', 'Coplogic Initial', 0.15), ('CS', 'Coplogic Supplement', 0.03)]
+RESOLUTIONS = ['Open or Active', 'Cite or Arrest Adult', 'Unfounded', 'Exceptional Adult']
+STREETS = ['MISSION ST', 'MARKET ST', 'POLK ST', 'GEARY BLVD', 'VALENCIA ST', 'FOLSOM ST', 'HOWARD ST', 'JONES ST',
+           'TAYLOR ST', 'LEAVENWORTH ST', '03RD ST', '16TH ST', '24TH ST', 'EDDY ST', 'ELLIS ST', 'OFARRELL ST',
+           'LARKIN ST', 'VAN NESS AVE', 'IRVING ST', 'TARAVAL ST', 'CLEMENT ST', 'STOCKTON ST', 'BROADWAY',
+           'DIVISADERO ST', 'HAIGHT ST', 'CASTRO ST', 'OCEAN AVE', 'SAN BRUNO AVE', 'EVANS AVE', 'LOMBARD ST']
+# Share of incidents per hour of day (quiet at dawn, peaks at noon and early evening)
+HOUR_WEIGHTS = np.array([3.5, 2.5, 2.0, 1.5, 1.2, 1.2, 1.8, 2.5, 3.5, 4.0, 4.3, 4.5,
+                         6.0, 4.8, 4.8, 5.0, 5.2, 5.5, 5.7, 5.3, 5.0, 4.8, 4.5, 4.0])
+
+WEEKDAYS = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+
+MISSING_LOCATION = 0.05      # no neighborhood / coordinates / intersection
+MISSING_CAD = 0.08           # no cad_number (the largest source of `dropna` losses)
+SUPPLEMENTS = 0.04           # rows repeating an earlier incident_id
+PLACEHOLDER_COORDS = 0.0005  # latitude 90, longitude -120.5
+
+
+def _weights(values):
+    w = np.asarray(values, dtype=np.float64)
+    return w / w.sum()
+
+
+def _soda_timestamps(minutes):
+    """SODA floating timestamps (`2023-03-01T12:34:00.000`) of datetime64[m] values."""
+    return np.datetime_as_string(minutes, unit='ms')
+
+
+def _strings(values, missing=None):
+    out = pd.Series(values).astype(str)
+    return out.mask(missing) if missing is not None else out
+
+
+def generate_chunk(n_rows, first_day, n_days, first_id, seed, index):
+    """
+    One chronological chunk of raw records.
+    - first_day / n_days: the date range the chunk covers
+    - first_id: first incident_id / row counter of the chunk
+    - seed, index: the chunk's random stream is `default_rng([seed, index])`
+    """
+    rng = np.random.default_rng([seed, index])
+    n = n_rows
+
+    # When: uniform days, hour profile, half the minutes heaped on :00 / :30
+    day = np.sort(rng.integers(0, n_days, n))
+    hour = rng.choice(24, n, p=_weights(HOUR_WEIGHTS))
+    minute = np.where(rng.random(n) < 0.5, rng.choice([0, 30], n), rng.integers(0, 60, n))
+    start = np.datetime64(START_DATE, 'm')
+    ts = start + ((day + first_day) * 1440 + hour * 60 + minute).astype('timedelta64[m]')
+    stamps = _soda_timestamps(ts)
+    dates = ts.astype('datetime64[D]')
+
+    # What and where
+    names = list(CATEGORIES)
+    cat = rng.choice(len(names), n, p=_weights([CATEGORIES[c][0] for c in names]))
+    sub_pick, desc_pick = rng.integers(0, 1 << 16, n), rng.integers(0, 1 << 16, n)
+    subcategory = np.empty(n, dtype=object)
+    description = np.empty(n, dtype=object)
+    code = np.empty(n, dtype=np.int64)
+    log_delay = np.empty(n)
+    for i, name in enumerate(names):
+        rows = cat == i
+        _, mu, subs, descs = CATEGORIES[name]
+        subcategory[rows] = np.asarray(subs, dtype=object)[sub_pick[rows] % len(subs)]
+        d = desc_pick[rows] % len(descs)
+        description[rows] = np.asarray(descs, dtype=object)[d]
+        code[rows] = 1000 * (i + 1) + 10 * d
+        log_delay[rows] = mu
+    hoods = list(NEIGHBORHOODS)
+    hood = rng.choice(len(hoods), n, p=_weights([NEIGHBORHOODS[h][3] for h in hoods]))
+    centers = np.array([NEIGHBORHOODS[h][:2] for h in hoods])
+    lat = centers[hood, 0] + rng.normal(0, 0.004, n)
+    lon = centers[hood, 1] + rng.normal(0, 0.005, n)
+    placeholder = rng.random(n) < PLACEHOLDER_COORDS
+    lat[placeholder], lon[placeholder] = 90.0, -120.5
+    district = np.array([NEIGHBORHOODS[h][2] for h in hoods], dtype=object)[hood]
+    supervisor = hood % 11 + 1
+    no_location = rng.random(n) < MISSING_LOCATION
+
+    # Report delay, resolution, report type
+    delay = rng.lognormal(log_delay, 1.5)
+    reported = ts + np.round(delay).astype('timedelta64[m]')
+    arrest_rate = np.where(np.isin(np.asarray(names, dtype=object)[cat], list(ARREST_CATEGORIES)), 0.85, 0.12)
+    arrested = rng.random(n) < arrest_rate
+    other = rng.choice([0, 2, 3], n, p=[0.9, 0.06, 0.04])
+    resolution = np.asarray(RESOLUTIONS, dtype=object)[np.where(arrested, 1, other)]
+    report_type = rng.choice(len(REPORT_TYPES), n, p=_weights([w for _, _, w in REPORT_TYPES]))
+
+    # Ids: supplements repeat an earlier incident of the chunk
+    row = first_id + np.arange(n)
+    incident_id = row.copy()
+    supplement = rng.random(n) < SUPPLEMENTS
+    supplement[0] = False
+    incident_id[supplement] = first_id + (rng.random(int(supplement.sum())) * np.flatnonzero(supplement)).astype(np.int64)
+    incident_number = 180_000_000 + incident_id % 70_000_000
+    street_a, street_b = rng.integers(0, len(STREETS), (2, n))
+    streets = np.asarray(STREETS, dtype=object)
+    intersection = streets[street_a] + ' \\ ' + streets[(street_a + 1 + street_b % (len(STREETS) - 1)) % len(STREETS)]
+
+    df = pd.DataFrame({
+        'incident_datetime': stamps,
+        'incident_date': _soda_timestamps(dates.astype('datetime64[m]')),
+        'incident_time': pd.Series(stamps).str.slice(11, 16),
+        'incident_year': _strings(dates.astype('datetime64[Y]').astype(np.int64) + 1970),
+        # 1970-01-01 was a Thursday
+        'incident_day_of_week': WEEKDAYS[(dates.astype(np.int64) + 3) % 7],
+        'report_datetime': _soda_timestamps(reported),
+        'row_id': _strings(row * 100_000 + code),
+        'incident_id': _strings(incident_id),
+        'incident_number': _strings(incident_number),
+        'cad_number': _strings(200_000_000 + row % 99_000_000, rng.random(n) < MISSING_CAD),
+        'report_type_code': np.asarray([t[0] for t in REPORT_TYPES], dtype=object)[report_type],
+        'report_type_description': np.asarray([t[1] for t in REPORT_TYPES], dtype=object)[report_type],
+        'incident_code': _strings(code),
+        'incident_category': np.asarray(names, dtype=object)[cat],
+        'incident_subcategory': subcategory,
+        'incident_description': description,
+        'resolution': resolution,
+        'intersection': _strings(intersection, no_location),
+        'cnn': _strings(20_000_000 + (street_a * 1000 + street_b) * 7, no_location),
+        'police_district': district,
+        'analysis_neighborhood': _strings(np.asarray(hoods, dtype=object)[hood], no_location),
+        'supervisor_district': _strings(supervisor, no_location),
+        'supervisor_district_2012': _strings(supervisor, no_location),
+        'latitude': _strings(lat, no_location),
+        'longitude': _strings(lon, no_location),
+        ':@computed_region_jwn9_ihcz': _strings(hood + 1, no_location),
+    })
+    return df[RAW_COLUMNS + [':@computed_region_jwn9_ihcz']]
+
+
+def synthetic_chunks(n_rows, seed=0, chunk_rows=CHUNK_ROWS, start=START_DATE, end=END_DATE):
+    """
+    Yield `n_rows` raw records as DataFrames of at most `chunk_rows` rows,
+    in time order. The same arguments always yield the same rows.
+    """
+    global_start = np.datetime64(START_DATE, 'D')
+    first = int((np.datetime64(start, 'D') - global_start).astype(np.int64))
+    total_days = int((np.datetime64(end, 'D') - np.datetime64(start, 'D')).astype(np.int64)) + 1
+    n_chunks = max(1, -(-n_rows // chunk_rows))
+    day_edges = np.linspace(0, total_days, n_chunks + 1).round().astype(np.int64)
+    done = 0
+    for i in range(n_chunks):
+        size = min(chunk_rows, n_rows - done)
+        n_days = max(1, int(day_edges[i + 1] - day_edges[i]))
+        yield generate_chunk(size, first + int(day_edges[i]), n_days, 1_000_000 + done, seed, i)
+        done += size
+
+
+def synthetic_incidents(n_rows, seed=0, **kwargs):
+    """All of `synthetic_chunks` as one raw DataFrame."""
+    return pd.concat(list(synthetic_chunks(n_rows, seed, **kwargs)), ignore_index=True)
+
+
+def soda_records(df):
+    """SODA JSON records of a raw frame (null fields are omitted, as the API does)."""
+    columns = list(df.columns)
+    values = df.astype(object).where(df.notna(), None).to_numpy()
+    return [{c: v for c, v in zip(columns, row) if v is not None} for row in values]
+
+
+def mock_dashboard_frame(seed=0):
+    """The dashboard's demo data: daily (Date, Category, District, Incidents) rows for 2021-2024."""
+    np.random.seed(seed)
+    dates = pd.to_datetime(pd.date_range('2021-01-01', '2024-12-31', freq='D'))
+    data_points = len(dates)
+    return pd.DataFrame({
+        'Date': np.random.choice(dates, data_points * 5, replace=True),
+        # Categorical rather than object strings: one byte per row instead of a Python str pointer
+        'Category': pd.Categorical(np.random.choice(MOCK_CATEGORIES, data_points * 5, replace=True),
+                                   categories=MOCK_CATEGORIES),
+        'District': pd.Categorical(np.random.choice(MOCK_DISTRICTS, data_points * 5, replace=True),
+                                   categories=MOCK_DISTRICTS),
+        'Incidents': np.random.randint(1, 10, data_points * 5)
+    })
@@ -0,0 +1,401 @@
+"""
+Timed spans around the pipeline's hot paths.
+
+The notebooks print shapes but not durations or memory, and the app never
+shows where a slow rerun spent its time. A span is a named, nested timer
+that also records rows in / out and the peak resident memory while it was
+open:
+
+- spans nest per thread (an ingestion worker's pages, a Streamlit session's
+  rerun), and each finished span keeps its parent and root, so a run can be
+  broken down by stage
+- one background thread samples RSS while any span is open, instead of a
+  sampler per span
+- finished spans are kept in a bounded in-memory buffer (what the app's
+  diagnostics panel reads) and, when `SFCRIME_METRICS` is set, written to a
+  local metrics file: one JSON line per span (`*.jsonl`), or cumulative
+  per-span counters in Prometheus text format (`*.prom`, rewritten when a
+  root span ends)
+- `SFCRIME_PROFILE=clean.*,svm.fit` runs a sampling profiler while matching
+  spans are open and writes folded stacks (flamegraph input) next to the
+  metrics file. `StackSampler` is the built-in profiler; any factory whose
+  objects have `start()`, `stop()` and `output_text()` (e.g.
+  `pyinstrument.Profiler`) can be passed to `enable` instead
+
+Recording is off until `enable()` is called or one of the environment
+variables is set; a disabled span only reads the clock.
+
+Usage:
+    from sfcrime.telemetry import span, instrumented
+    with span("clean.dedupe", rows_in=len(df)) as s:
+        df = df.drop_duplicates(...)
+        s.rows_out = len(df)
+
+    @instrumented("mining.itemsets")
+    def frequent_itemsets(...): ...
+
+    SFCRIME_METRICS=data/metrics/spans.jsonl python -m sfcrime.sync
+    SFCRIME_METRICS=data/metrics/spans.prom SFCRIME_PROFILE='svm.*' python -m sfcrime.classify
+"""
+import fnmatch
+import functools
+import itertools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from .config import DATA_DIR, METRICS_PATH, PROFILE_SPANS
+
+# Finished spans kept in memory (the diagnostics panel reads the most recent ones)
+BUFFER_SPANS = 20_000
+RSS_INTERVAL = 0.01
+PROFILE_INTERVAL = 0.005
+
+
+# -----------------------------
+# Memory
+# -----------------------------
+def current_rss():
+    """Resident set size of this process in bytes (None where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss(who=resource.RUSAGE_SELF):
+    """Lifetime peak RSS in bytes (`ru_maxrss` is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# -----------------------------
+# Sampling profiler
+# -----------------------------
+class StackSampler:
+    """
+    Minimal sampling profiler: every `interval` seconds, the stack of the thread that
+    called `start()` is read from `sys._current_frames()` and counted as a folded stack
+    (`outer;...;inner count`, the input of flamegraph.pl / speedscope).
+    """
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sfcrime-profiler")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def output_text(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# -----------------------------
+# Spans
+# -----------------------------
+_ids = itertools.count(1)
+
+
+class Span:
+    """
+    One timed region. Set `rows_out` (and any `attrs`) inside the block.
+    Use as a context manager, or `start()` / `end()` when the region is not a block.
+    - parent: span to nest under when this thread has no open span (work handed to a pool thread)
+    """
+    __slots__ = ('name', 'rows_in', 'rows_out', 'attrs', 'id', 'parent', 'root', 'depth', 'thread',
+                 'started_at', 'seconds', 'rss_start', 'peak_rss', 'error', '_t0', '_profiler', '_outer',
+                 '_telemetry')
+
+    def __init__(self, name, rows_in=None, parent=None, telemetry=None, **attrs):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.attrs = attrs
+        self.id = next(_ids)
+        self.parent = self.root = None
+        self.depth = 0
+        self.thread = None
+        self.started_at = None
+        self.seconds = None
+        self.rss_start = self.peak_rss = None
+        self.error = None
+        self._t0 = None
+        self._profiler = None
+        self._outer = parent
+        self._telemetry = telemetry or TELEMETRY
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._telemetry._start(self)
+        return self
+
+    def end(self, error=None):
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self._t0
+            self.error = error
+            self._telemetry._finish(self)
+        return self
+
+    @property
+    def elapsed(self):
+        """Seconds so far (or in total, once ended)."""
+        return self.seconds if self.seconds is not None else time.perf_counter() - self._t0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(None if exc_type is None else exc_type.__name__)
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name, 'id': self.id, 'parent': self.parent, 'root': self.root, 'depth': self.depth,
+            'thread': self.thread, 'started_at': self.started_at, 'seconds': self.seconds,
+            'rows_in': self.rows_in, 'rows_out': self.rows_out, 'rss_start': self.rss_start,
+            'peak_rss': self.peak_rss, 'error': self.error, 'attrs': self.attrs,
+        }
+
+
+class Telemetry:
+    """Span recorder: nesting per thread, RSS sampling, the in-memory buffer and the exporters."""
+    def __init__(self):
+        self.enabled = False
+        self.metrics_path = None
+        self.profile_patterns = []
+        self.profiler_factory = StackSampler
+        self.spans = deque(maxlen=BUFFER_SPANS)
+        self.totals = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = {}
+        self._wake = threading.Event()
+        self._sampler = None
+
+    def enable(self, metrics_path=None, profile=None, profiler_factory=None):
+        """
+        Start recording spans.
+        - metrics_path: `*.prom` for Prometheus text, anything else for JSONL (None = memory only)
+        - profile: span-name patterns (`fnmatch`, e.g. "clean.*") to run the sampling profiler for
+        - profiler_factory: zero-argument callable returning a profiler (default `StackSampler`)
+        """
+        self.metrics_path = metrics_path or self.metrics_path
+        if profile:
+            self.profile_patterns = [profile] if isinstance(profile, str) else list(profile)
+        if profiler_factory is not None:
+            self.profiler_factory = profiler_factory
+        if self.metrics_path:
+            os.makedirs(os.path.dirname(self.metrics_path) or ".", exist_ok=True)
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_rss, daemon=True, name="sfcrime-rss")
+            self._sampler.start()
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        """Innermost open span of this thread (None outside any span)."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    # -----------------------------
+    # Span lifecycle
+    # -----------------------------
+    def _start(self, span):
+        if not self.enabled:
+            return
+        stack = self._stack()
+        outer = stack[-1] if stack else span._outer
+        if outer is not None and outer.root is not None:
+            span.parent, span.root, span.depth = outer.id, outer.root, outer.depth + 1
+        else:
+            span.root = span.id
+        span.thread = threading.current_thread().name
+        span.started_at = time.time()
+        span.rss_start = span.peak_rss = current_rss()
+        stack.append(span)
+        with self._lock:
+            self._active[span.id] = span
+        self._wake.set()
+        if self.profile_patterns and any(fnmatch.fnmatchcase(span.name, p) for p in self.profile_patterns):
+            span._profiler = self.profiler_factory()
+            span._profiler.start()
+
+    def _finish(self, span):
+        if span.started_at is None:
+            return
+        stack = self._stack()
+        # Remove by identity: a span ended out of order must not pop its siblings
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i] is span:
+                del stack[i]
+                break
+        rss = current_rss()
+        if rss is not None and (span.peak_rss is None or rss > span.peak_rss):
+            span.peak_rss = rss
+        if span._profiler is not None:
+            span._profiler.stop()
+            span.attrs['profile'] = self._save_profile(span)
+            span._profiler = None
+        with self._lock:
+            self._active.pop(span.id, None)
+            self.spans.append(span)
+            self._accumulate(span)
+        if self.metrics_path:
+            self._export(span)
+
+    def _sample_rss(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                self._wake.clear()
+                with self._lock:
+                    if self._active:
+                        self._wake.set()
+                continue
+            rss = current_rss()
+            if rss is None:
+                return
+            for span in active:
+                if span.peak_rss is None or rss > span.peak_rss:
+                    span.peak_rss = rss
+            time.sleep(RSS_INTERVAL)
+
+    def _save_profile(self, span):
+        base = os.path.dirname(self.metrics_path) if self.metrics_path else os.path.join(DATA_DIR, "metrics")
+        directory = os.path.join(base, "profiles")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{span.name}-{time.strftime('%Y%m%d-%H%M%S')}-{span.id}.folded")
+        with open(path, "w") as fh:
+            fh.write(span._profiler.output_text())
+        return path
+
+    # -----------------------------
+    # Queries and export
+    # -----------------------------
+    def finished(self, root=None, name=None):
+        """Finished spans, optionally only those under root span id `root` or named `name`."""
+        with self._lock:
+            spans = list(self.spans)
+        return [s for s in spans if (root is None or s.root == root) and (name is None or s.name == name)]
+
+    def _accumulate(self, span):
+        t = self.totals.setdefault(span.name, {'count': 0, 'seconds': 0.0, 'rows_in': 0, 'rows_out': 0,
+                                               'errors': 0, 'peak_rss': 0})
+        t['count'] += 1
+        t['seconds'] += span.seconds
+        t['rows_in'] += span.rows_in or 0
+        t['rows_out'] += span.rows_out or 0
+        t['errors'] += span.error is not None
+        t['peak_rss'] = max(t['peak_rss'], span.peak_rss or 0)
+
+    def _export(self, span):
+        if self.metrics_path.endswith(".prom"):
+            if span.parent is None:
+                self.write_prometheus(self.metrics_path)
+            return
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.metrics_path, "a") as fh:
+            fh.write(line + "\n")
+
+    def prometheus_text(self):
+        """Cumulative per-span counters of this process in the Prometheus text exposition format."""
+        metrics = [
+            ('sfcrime_span_calls_total', 'counter', 'Finished spans', 'count'),
+            ('sfcrime_span_seconds_total', 'counter', 'Wall seconds spent in the span', 'seconds'),
+            ('sfcrime_span_rows_in_total', 'counter', 'Rows entering the span', 'rows_in'),
+            ('sfcrime_span_rows_out_total', 'counter', 'Rows leaving the span', 'rows_out'),
+            ('sfcrime_span_errors_total', 'counter', 'Spans that ended with an exception', 'errors'),
+            ('sfcrime_span_peak_rss_bytes', 'gauge', 'Largest resident set size seen while the span was open',
+             'peak_rss'),
+        ]
+        with self._lock:
+            totals = {name: dict(t) for name, t in self.totals.items()}
+        lines = []
+        for metric, kind, help_text, key in metrics:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            lines += [f'{metric}{{span="{name}"}} {t[key]}' for name, t in sorted(totals.items())]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fh:
+            fh.write(self.prometheus_text())
+        os.replace(tmp, path)
+        return path
+
+
+TELEMETRY = Telemetry()
+if METRICS_PATH or PROFILE_SPANS:
+    TELEMETRY.enable(METRICS_PATH or None, [p for p in PROFILE_SPANS.split(",") if p])
+
+
+def span(name, rows_in=None, parent=None, **attrs):
+    """A `Span` on the process-wide recorder (a no-op timer while recording is off)."""
+    return Span(name, rows_in, parent, **attrs)
+
+
+def enable(metrics_path=None, profile=None, profiler_factory=None):
+    return TELEMETRY.enable(metrics_path, profile, profiler_factory)
+
+
+def instrumented(name):
+    """Decorator: run the function inside `span(name)`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def breakdown(root, spans=None):
+    """
+    Seconds per direct child of span `root` (a `Span`), plus `(other)` for time not
+    covered by a child, e.g. one Streamlit rerun split into its stages.
+    """
+    children = [s for s in (spans if spans is not None else TELEMETRY.finished(root=root.root))
+                if s.parent == root.id]
+    totals = {}
+    for child in children:
+        totals[child.name] = totals.get(child.name, 0.0) + child.seconds
+    totals['(other)'] = max(0.0, root.elapsed - sum(totals.values()))
+    return totals
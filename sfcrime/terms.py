@@ -0,0 +1,248 @@
+"""
+Streaming term counts for the `incident_description` word cloud.
+
+The notebook joins every description into one string and lets
+`WordCloud.generate` re-tokenize it. On the full history that string is
+gigabytes, for a vocabulary of a few hundred words. Here:
+
+- each partition is reduced to description value counts per incident
+  category and police district. Each distinct description is tokenized
+  once (WordCloud's own rules: `\\w[\\w']*`, trailing "'s" and numbers
+  dropped, stopwords removed), and its tokens are weighted by the
+  description's count
+- the counts go into `HeavyHitters` sketches (exact while the vocabulary is
+  small, Count-Min + top-k beyond), one overall and one per category and per
+  district. Partition results are cached by partition version, and the
+  index keeps them merged per year
+- `cloud_frequencies` applies WordCloud's case folding and plural merging
+  to the top terms, and `generate_from_frequencies` renders the image. The
+  result is the same cloud as `generate(text)`, built in memory bounded by
+  the sketches
+
+Usage:
+    index = store_terms()                                   # incremental over the cleaned store
+    freqs = index.frequencies(categories=['Larceny Theft'], years=(2022, 2024))
+    fig = plot_wordcloud(freqs)
+    python -m sfcrime.terms --publish                       # `wordcloud` artifact
+"""
+import io
+import os
+import re
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR, DISTRICT_COL
+from .sketches import HeavyHitters
+
+TEXT_COL = 'incident_description'
+CATEGORY_COL = 'incident_category'
+TERMS_CACHE = os.path.join(DATA_DIR, "eda", "terms.pkl")
+MAX_WORDS = 200                     # WordCloud's default max_words
+TOKEN_RE = re.compile(r"\w[\w']*")
+
+
+@lru_cache(maxsize=None)
+def _stopwords():
+    from wordcloud import STOPWORDS
+
+    return frozenset(w.lower() for w in STOPWORDS)
+
+
+@lru_cache(maxsize=65_536)
+def tokenize(text):
+    """WordCloud's `process_text` tokenization of one string (before case / plural merging)."""
+    words = (w[:-2] if w.lower().endswith("'s") else w for w in TOKEN_RE.findall(text))
+    stop = _stopwords()
+    return tuple(w for w in words if not w.isdigit() and w.lower() not in stop)
+
+
+def term_matrix(texts):
+    """(terms, D x T matrix of token counts) for distinct `texts`."""
+    tokens = [tokenize(t) for t in texts]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    flat = np.fromiter((w for t in tokens for w in t), dtype=object, count=int(lengths.sum()))
+    term_codes, terms = pd.factorize(flat)
+    matrix = np.zeros((len(tokens), len(terms)), dtype=np.int64)
+    np.add.at(matrix, (np.repeat(np.arange(len(tokens)), lengths), term_codes), 1)
+    return np.asarray(terms, dtype=object), matrix
+
+
+def cloud_frequencies(counts, max_words=MAX_WORDS):
+    """
+    WordCloud's case folding and plural merging over weighted `(term, count)` pairs, then the top
+    `max_words`: the dict `generate(text)` would have built from the joined descriptions.
+    """
+    cases = {}
+    for word, count in counts:
+        case_dict = cases.setdefault(word.lower(), {})
+        case_dict[word] = case_dict.get(word, 0) + count
+    for key in list(cases):
+        if key.endswith('s') and not key.endswith('ss') and key[:-1] in cases:
+            singular = cases[key[:-1]]
+            for word, count in cases.pop(key).items():
+                singular[word[:-1]] = singular.get(word[:-1], 0) + count
+    fused = {max(d.items(), key=lambda item: item[1])[0]: sum(d.values()) for d in cases.values()}
+    return dict(sorted(fused.items(), key=lambda item: -item[1])[:max_words])
+
+
+class TermCounts:
+    """Overall, per-category and per-district `HeavyHitters` of description terms."""
+    def __init__(self, k=512):
+        self.k = k
+        self.total = HeavyHitters(k)
+        self.by_category = {}
+        self.by_district = {}
+
+    def _group(self, groups, key):
+        if key not in groups:
+            groups[key] = HeavyHitters(self.k)
+        return groups[key]
+
+    def _add(self, sketch, terms, counts):
+        hit = counts > 0
+        sketch.update(terms[hit], counts[hit])
+
+    def update(self, df):
+        """Add a frame with `incident_description`, `incident_category` and `police_district`."""
+        text_codes, texts = pd.factorize(df[TEXT_COL])
+        present = text_codes >= 0
+        if not present.any():
+            return self
+        terms, matrix = term_matrix(np.asarray(texts, dtype=str))
+        n_texts = len(texts)
+        self._add(self.total, terms, np.bincount(text_codes[present], minlength=n_texts) @ matrix)
+        for col, groups in ((CATEGORY_COL, self.by_category), (DISTRICT_COL, self.by_district)):
+            if col not in df.columns:
+                continue
+            group_codes, keys = pd.factorize(df[col])
+            both = present & (group_codes >= 0)
+            # (group x description) counts, then (group x term) counts through the token matrix
+            pairs = np.bincount(group_codes[both] * n_texts + text_codes[both], minlength=len(keys) * n_texts)
+            by_group = pairs.reshape(len(keys), n_texts) @ matrix
+            for key, counts in zip(keys, by_group):
+                self._add(self._group(groups, str(key)), terms, counts)
+        return self
+
+    def merge(self, other):
+        self.total.merge(other.total)
+        for mine, theirs in ((self.by_category, other.by_category), (self.by_district, other.by_district)):
+            for key, sketch in theirs.items():
+                self._group(mine, key).merge(sketch)
+        return self
+
+
+class TermIndex:
+    """Per-year `TermCounts`, queried by years plus either categories or districts."""
+    def __init__(self, by_year):
+        self.by_year = by_year
+
+    @property
+    def years(self):
+        return sorted(self.by_year)
+
+    def counts(self, years=None, categories=None, districts=None):
+        """
+        Merged term counts for the year range `(first, last)` and the chosen categories *or*
+        districts (the cache keeps one dimension at a time, not their intersection).
+        """
+        if categories is not None and districts is not None:
+            raise ValueError("filter by categories or by districts, not both")
+        merged = HeavyHitters(next(iter(self.by_year.values())).k if self.by_year else 512)
+        for year, tc in self.by_year.items():
+            if years is not None and not years[0] <= year <= years[1]:
+                continue
+            if categories is not None:
+                sketches = [tc.by_category[c] for c in categories if c in tc.by_category]
+            elif districts is not None:
+                sketches = [tc.by_district[d] for d in districts if d in tc.by_district]
+            else:
+                sketches = [tc.total]
+            for sketch in sketches:
+                merged.merge(sketch)
+        return merged
+
+    def frequencies(self, years=None, categories=None, districts=None, max_words=MAX_WORDS):
+        """Word-cloud frequencies (see `cloud_frequencies`) for a filter."""
+        return cloud_frequencies(self.counts(years, categories, districts).most_common(), max_words)
+
+
+# -----------------------------
+# Rendering
+# -----------------------------
+def wordcloud_image(frequencies):
+    """The notebook's WordCloud settings, from frequencies instead of joined text."""
+    from wordcloud import WordCloud
+
+    return WordCloud(width=800, height=400, background_color='white', colormap='viridis',
+                     collocations=False).generate_from_frequencies(frequencies)
+
+
+def wordcloud_png(frequencies):
+    buf = io.BytesIO()
+    wordcloud_image(frequencies).to_image().save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def plot_wordcloud(frequencies, title='Most Common Words in Incident Descriptions'):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(15, 7))
+    plt.imshow(wordcloud_image(frequencies), interpolation='bilinear')
+    plt.axis("off")
+    plt.title(title, fontsize=16)
+    return fig
+
+
+# -----------------------------
+# Store scan
+# -----------------------------
+def partition_terms(root, part, k=512):
+    """Worker: term counts of one store partition."""
+    from .store import open_clean_store
+
+    df = open_clean_store(root).read_partition(part, columns=[TEXT_COL, CATEGORY_COL, DISTRICT_COL])
+    return TermCounts(k).update(df)
+
+
+def store_terms(store=None, k=512, max_workers=None, cache_path=TERMS_CACHE, verbose=True):
+    """`TermIndex` of the cleaned store; only partitions written since the cached run are re-counted."""
+    from .store import open_clean_store
+
+    t0 = time.perf_counter()
+    store = store or open_clean_store()
+    results, stale = store.map_partitions(partition_terms, (k,), cache_path=cache_path, cache_key=k,
+                                          max_workers=max_workers)
+    by_year = {}
+    for part, counts in results.items():
+        year = int(part.split("/")[0].split("=")[1])
+        by_year.setdefault(year, TermCounts(k)).merge(counts)
+    if verbose:
+        print(f"Term counts ✅ {len(stale)} of {len(results)} partitions counted in {time.perf_counter() - t0:.1f}s")
+    return TermIndex(by_year)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Streaming incident_description term counts and word cloud")
+    parser.add_argument("--top", type=int, default=20, help="print the N most frequent words")
+    parser.add_argument("--publish", action="store_true", help="publish the `wordcloud` artifact")
+    args = parser.parse_args()
+
+    from .store import open_clean_store
+
+    store = open_clean_store()
+    index = store_terms(store)
+    freqs = index.frequencies()
+    for word, count in list(freqs.items())[:args.top]:
+        print(f"{word:>20}  {count:,}")
+    if args.publish:
+        from .artifacts import ArtifactStore
+
+        ArtifactStore().publish("wordcloud", figure=plot_wordcloud(freqs), data_version=store.version,
+                                caption="Most Common Words in Incident Descriptions")
@@ -0,0 +1,432 @@
+"""
+Budget-aware hyperparameter search for the response-time regressors.
+
+The XGBoost cell runs `RandomizedSearchCV` over 8 configurations x 3 folds and
+the LightGBM cell reruns a separate 24-candidate search with `n_jobs=1`. Both
+train every candidate to its full `n_estimators`, rebuild the feature
+histograms for every fit, and lose everything if the kernel dies.
+
+`search` is one engine for both models, using asynchronous successive halving
+(ASHA):
+
+- boosting rounds are the budget: every trial starts at `min_rounds`, and a
+  trial is promoted to the next rung (x `eta` rounds) only if it is in the
+  top 1/eta of the trials that finished that rung; early stopping on the
+  validation RMSE of the log target ends trials that stopped improving
+- the training and validation matrices are binned once per worker process
+  (`xgb.QuantileDMatrix`, `lgb.Dataset`) and reused by every trial that
+  worker runs; promoted XGBoost trials continue from their checkpoint
+  instead of starting over (LightGBM trials are retrained, because
+  continuing would overwrite the init score of the shared Dataset)
+- trials are scheduled on a process pool sized by a CPU budget
+  (`cpu_budget // threads_per_trial` workers)
+- every finished rung is appended to `history.jsonl` next to the
+  checkpoints, so an interrupted search resumes where it stopped; the
+  directory is keyed by a hash of the data and search settings
+
+The same number of CPU-seconds therefore covers a far wider space
+(`max_depth`, `reg_lambda`, `num_leaves`, ...) than the notebooks' grids.
+
+Usage:
+    result = search("xgb", data.X_train_final, data.y_train_log, max_trials=64, cpu_budget=8)
+    model = fit_best(result, data.X_train_final, data.y_train_log)
+    python -m sfcrime.tuning --model lgbm --trials 64 --compare
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR
+
+TUNING_DIR = os.path.join(DATA_DIR, "tuning")
+
+# Search spaces: list = choice, ('int' | 'uniform' | 'log', low, high) = range
+XGB_SPACE = {
+    'learning_rate': ('log', 0.01, 0.3),
+    'max_depth': ('int', 3, 10),
+    'min_child_weight': ('log', 1.0, 50.0),
+    'subsample': ('uniform', 0.5, 1.0),
+    'colsample_bytree': ('uniform', 0.5, 1.0),
+    'reg_lambda': ('log', 0.1, 50.0),
+    'reg_alpha': ('log', 1e-3, 10.0),
+}
+LGBM_SPACE = {
+    'learning_rate': ('log', 0.01, 0.3),
+    'num_leaves': ('int', 8, 255),
+    'max_depth': [-1, 4, 6, 8, 12],
+    'min_child_samples': ('int', 5, 200),
+    'subsample': ('uniform', 0.5, 1.0),
+    'subsample_freq': [1],
+    'colsample_bytree': ('uniform', 0.5, 1.0),
+    'reg_lambda': ('log', 1e-3, 50.0),
+    'reg_alpha': ('log', 1e-3, 10.0),
+    'min_split_gain': ('uniform', 0.0, 0.1),
+}
+SPACES = {'xgb': XGB_SPACE, 'lgbm': LGBM_SPACE}
+
+# The notebooks' grids, for `baseline_search`
+NOTEBOOK_GRIDS = {
+    'xgb': {
+        "n_estimators": [200, 400], "learning_rate": [0.01, 0.03], "max_depth": [4, 6],
+        "subsample": [0.8, 1], "colsample_bytree": [0.6, 0.8], "reg_lambda": [5, 10],
+    },
+    'lgbm': {
+        'n_estimators': [100, 200, 400], 'learning_rate': [0.01, 0.03, 0.05], 'num_leaves': [15, 31, 63],
+        'max_depth': [3, 6, -1], 'subsample': [0.6, 0.8, 1.0], 'colsample_bytree': [0.6, 0.8, 1.0],
+        'reg_alpha': [0, 0.1, 1.0], 'reg_lambda': [0, 1.0, 5.0], 'min_child_samples': [5, 10, 20],
+        'min_split_gain': [0.0, 0.05, 0.1],
+    },
+}
+NOTEBOOK_ITERS = {'xgb': 8, 'lgbm': 24}
+
+
+def sample_config(space, rng):
+    config = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            config[name] = spec[rng.integers(len(spec))]
+            continue
+        kind, low, high = spec
+        if kind == 'int':
+            config[name] = int(rng.integers(low, high + 1))
+        elif kind == 'log':
+            config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            config[name] = float(rng.uniform(low, high))
+    return {k: v.item() if isinstance(v, np.generic) else v for k, v in config.items()}
+
+
+def rung_rounds(min_rounds, max_rounds, eta):
+    """Boosting rounds of each rung: min_rounds * eta^i, ending at max_rounds."""
+    rungs = []
+    r = min_rounds
+    while r < max_rounds:
+        rungs.append(int(r))
+        r *= eta
+    return rungs + [int(max_rounds)]
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+_DATASETS = {}
+
+
+def _datasets(kind, data_path):
+    """Binned train / valid matrices, built once per process and reused by every trial."""
+    key = (kind, data_path)
+    if key not in _DATASETS:
+        with np.load(data_path) as z:
+            X_fit, y_fit, X_valid, y_valid = z['X_fit'], z['y_fit'], z['X_valid'], z['y_valid']
+        if kind == 'xgb':
+            import xgboost as xgb
+
+            dtrain = xgb.QuantileDMatrix(X_fit, y_fit)
+            dvalid = xgb.QuantileDMatrix(X_valid, y_valid, ref=dtrain)
+        else:
+            import lightgbm as lgb
+
+            # feature_pre_filter=False: min_child_samples varies between trials
+            params = {'verbose': -1, 'feature_pre_filter': False}
+            dtrain = lgb.Dataset(X_fit, y_fit, params=params, free_raw_data=False).construct()
+            dvalid = lgb.Dataset(X_valid, y_valid, reference=dtrain, params=params).construct()
+        _DATASETS[key] = (dtrain, dvalid)
+    return _DATASETS[key]
+
+
+def _train_rung(kind, data_path, params, rounds, checkpoint, early_stopping_rounds, threads, seed):
+    """
+    Train one trial up to `rounds` boosting rounds.
+    Returns (validation RMSE curve of all rounds trained so far, converged).
+    """
+    dtrain, dvalid = _datasets(kind, data_path)
+    if kind == 'xgb':
+        import xgboost as xgb
+
+        booster = xgb.Booster(model_file=checkpoint) if os.path.exists(checkpoint) else None
+        done = booster.num_boosted_rounds() if booster is not None else 0
+        prev = json.loads(booster.attr('valid_rmse') or '[]') if booster is not None else []
+        if done >= rounds:
+            # Finished before an interruption, but not recorded
+            return prev, False
+        evals = {}
+        booster = xgb.train(
+            {'objective': 'reg:squarederror', 'eval_metric': 'rmse', 'nthread': threads, 'seed': seed, **params},
+            dtrain, num_boost_round=rounds - done, evals=[(dvalid, 'valid')], evals_result=evals,
+            early_stopping_rounds=early_stopping_rounds, xgb_model=booster, verbose_eval=False,
+        )
+        new = evals['valid']['rmse']
+        curve = prev + new
+        booster.set_attr(valid_rmse=json.dumps(curve))
+        booster.save_model(checkpoint)
+        return curve, len(new) < rounds - done
+
+    import lightgbm as lgb
+
+    evals = {}
+    lgb.train(
+        {'objective': 'regression', 'metric': 'rmse', 'num_threads': threads, 'seed': seed, 'verbose': -1, **params},
+        dtrain, num_boost_round=rounds, valid_sets=[dvalid], valid_names=['valid'],
+        callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False), lgb.record_evaluation(evals)],
+    )
+    curve = evals['valid']['rmse']
+    return curve, len(curve) < rounds
+
+
+def _run_job(kind, data_path, trial_id, rung, params, rounds, checkpoint, early_stopping_rounds, threads, seed):
+    t0 = time.perf_counter()
+    curve, converged = _train_rung(kind, data_path, params, rounds, checkpoint, early_stopping_rounds, threads, seed)
+    best = int(np.argmin(curve))
+    return {"trial": trial_id, "rung": rung, "rounds": len(curve), "score": float(curve[best]),
+            "best_iteration": best, "converged": bool(converged), "params": params,
+            "seconds": time.perf_counter() - t0}
+
+
+# -----------------------------
+# Scheduler
+# -----------------------------
+@dataclass
+class Trial:
+    trial_id: int
+    params: dict
+    scores: dict = field(default_factory=dict)   # rung -> best validation RMSE (log target)
+    best_iteration: int = 0
+    converged: bool = False
+    seconds: float = 0.0
+
+    @property
+    def rung(self):
+        return max(self.scores) if self.scores else -1
+
+    @property
+    def score(self):
+        return self.scores[self.rung] if self.scores else np.inf
+
+
+@dataclass
+class SearchResult:
+    kind: str
+    trials: list
+    rungs: list
+    directory: str
+    seconds: float
+    cpu_seconds: float
+
+    @property
+    def best(self):
+        # Every score is a validation RMSE at that trial's best iteration, so rungs are comparable
+        return min(self.trials, key=lambda t: t.score)
+
+    def frame(self):
+        rows = [{"trial": t.trial_id, "rung": t.rung, "rounds": self.rungs[t.rung], "score": t.score,
+                 "best_iteration": t.best_iteration, "converged": t.converged, "seconds": t.seconds, **t.params}
+                for t in self.trials if t.scores]
+        return pd.DataFrame(rows).sort_values(["rung", "score"], ascending=[False, True]).reset_index(drop=True)
+
+
+def _search_key(kind, X, y, settings):
+    h = hashlib.blake2b(digest_size=8)
+    for a in (np.ascontiguousarray(X), np.ascontiguousarray(y)):
+        h.update(str(a.shape).encode())
+        h.update(a.data)
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return f"{kind}-{h.hexdigest()}"
+
+
+def _load_history(path):
+    records = []
+    if os.path.exists(path):
+        with open(path) as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break   # torn last line from an interrupted write
+    return records
+
+
+def search(kind, X, y, space=None, max_trials=64, min_rounds=25, max_rounds=800, eta=3,
+           early_stopping_rounds=30, cpu_budget=None, threads_per_trial=1, valid_fraction=0.2,
+           time_budget=None, root=TUNING_DIR, seed=42, verbose=True):
+    """
+    ASHA over `space` for kind 'xgb' or 'lgbm' on (X, y_log).
+    - max_trials: configurations sampled in total (across resumes)
+    - min_rounds / max_rounds / eta: rung schedule in boosting rounds
+    - cpu_budget: cores to use (default: all); threads_per_trial: threads per model
+    - valid_fraction: rows held out for the validation loss
+    - time_budget: seconds after which no new trial is started
+    """
+    space = space or SPACES[kind]
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    settings = {"space": space, "max_rounds": max_rounds, "min_rounds": min_rounds, "eta": eta,
+                "early_stopping_rounds": early_stopping_rounds, "valid_fraction": valid_fraction, "seed": seed}
+    directory = os.path.join(root, _search_key(kind, X, y, settings))
+    os.makedirs(os.path.join(directory, "checkpoints"), exist_ok=True)
+    data_path = os.path.join(directory, "data.npz")
+    if not os.path.exists(data_path):
+        valid = np.random.default_rng(seed).random(len(y)) < valid_fraction
+        tmp = data_path + ".tmp.npz"
+        np.savez(tmp, X_fit=X[~valid], y_fit=y[~valid], X_valid=X[valid], y_valid=y[valid])
+        os.replace(tmp, data_path)
+
+    rungs = rung_rounds(min_rounds, max_rounds, eta)
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    workers = max(1, cpu_budget // threads_per_trial)
+    history_path = os.path.join(directory, "history.jsonl")
+
+    # Resume: replay the finished rungs
+    trials = {}
+    records = _load_history(history_path)
+    for rec in records:
+        t = trials.setdefault(rec["trial"], Trial(rec["trial"], rec["params"]))
+        t.scores[rec["rung"]] = rec["score"]
+        t.best_iteration, t.converged = rec["best_iteration"], rec["converged"]
+        t.seconds += rec["seconds"]
+    if verbose and records:
+        print(f"Resuming {kind} search: {len(trials)} trials, {len(records)} finished rungs in {directory}")
+
+    inflight = {}
+    busy = set()
+    started = time.perf_counter()
+    # Trials finish out of order, so the history can have gaps (e.g. 0, 2, 3 when trial 1 was in
+    # flight at the interruption): new trials take the unused ids, and a sampled config depends
+    # only on (seed, trial id), so a gap is re-run with the config it had
+    new_ids = (i for i in range(max_trials) if i not in trials)
+
+    def next_job():
+        # Promotions first, from the highest rung down
+        for k in range(len(rungs) - 2, -1, -1):
+            finished = sorted((t for t in trials.values() if k in t.scores), key=lambda t: t.scores[k])
+            for t in finished[:len(finished) // eta]:
+                if k + 1 not in t.scores and not t.converged and t.trial_id not in busy:
+                    return t, k + 1
+        out_of_time = time_budget is not None and time.perf_counter() - started > time_budget
+        trial_id = None if out_of_time else next(new_ids, None)
+        if trial_id is not None:
+            t = Trial(trial_id, sample_config(space, np.random.default_rng([seed, trial_id])))
+            trials[trial_id] = t
+            return t, 0
+        return None
+
+    def job_args(t, rung):
+        checkpoint = os.path.join(directory, "checkpoints", f"trial_{t.trial_id:05d}.json")
+        return (kind, data_path, t.trial_id, rung, t.params, rungs[rung], checkpoint,
+                early_stopping_rounds, threads_per_trial, seed)
+
+    def record(rec):
+        t = trials[rec["trial"]]
+        t.scores[rec["rung"]] = rec["score"]
+        t.best_iteration, t.converged = rec["best_iteration"], rec["converged"]
+        t.seconds += rec["seconds"]
+        busy.discard(t.trial_id)
+        with open(history_path, "a") as fh:
+            fh.write(json.dumps(rec) + "\n")
+        if verbose:
+            print(f"  trial {rec['trial']:3d} rung {rec['rung']} ({rec['rounds']:4d} rounds) "
+                  f"rmse={rec['score']:.4f}{' converged' if rec['converged'] else ''}")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                while len(inflight) < workers:
+                    job = next_job()
+                    if job is None:
+                        break
+                    busy.add(job[0].trial_id)
+                    inflight[pool.submit(_run_job, *job_args(*job))] = job
+                if not inflight:
+                    break
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    inflight.pop(fut)
+                    record(fut.result())
+    else:
+        while (job := next_job()) is not None:
+            record(_run_job(*job_args(*job)))
+
+    seconds = time.perf_counter() - started
+    result = SearchResult(kind, sorted(trials.values(), key=lambda t: t.trial_id), rungs, directory, seconds,
+                          sum(t.seconds for t in trials.values()) * threads_per_trial)
+    if verbose:
+        best = result.best
+        print(f"{kind} search done ✅ {len(trials)} trials in {seconds:.1f}s on {workers} workers; "
+              f"best rmse={best.score:.4f} at {best.best_iteration + 1} rounds: {best.params}")
+    return result
+
+
+def make_estimator(kind, params, n_estimators, n_jobs=None, seed=42):
+    """Scikit-learn regressor with the given parameters (what the notebooks' `best_estimator_` is)."""
+    if kind == 'xgb':
+        from xgboost import XGBRegressor
+
+        return XGBRegressor(objective='reg:squarederror', n_estimators=n_estimators, random_state=seed,
+                            n_jobs=n_jobs, **params)
+    from lightgbm import LGBMRegressor
+
+    return LGBMRegressor(objective='regression', n_estimators=n_estimators, random_state=seed,
+                         n_jobs=n_jobs, verbose=-1, **params)
+
+
+def fit_best(result, X, y, n_jobs=None, seed=42):
+    """Refit the best trial on all of (X, y) with its early-stopped number of rounds."""
+    best = result.best
+    return make_estimator(result.kind, best.params, best.best_iteration + 1, n_jobs, seed).fit(X, y)
+
+
+def baseline_search(kind, X, y, n_jobs=-1, seed=42, verbose=True):
+    """The notebooks' RandomizedSearchCV (3-fold, NOTEBOOK_ITERS candidates), for comparison."""
+    from sklearn.model_selection import RandomizedSearchCV
+
+    estimator = make_estimator(kind, {}, 100, n_jobs=1, seed=seed)
+    rs = RandomizedSearchCV(estimator, NOTEBOOK_GRIDS[kind], n_iter=NOTEBOOK_ITERS[kind], cv=3, scoring='neg_root_mean_squared_error',
+                            random_state=seed, n_jobs=n_jobs)
+    t0 = time.perf_counter()
+    rs.fit(X, y)
+    if verbose:
+        print(f"{kind} RandomizedSearchCV: {time.perf_counter() - t0:.1f}s, best params {rs.best_params_}")
+    return rs
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .response import evaluate, load_response_frame, prepare, print_metrics
+
+    parser = argparse.ArgumentParser(description="ASHA hyperparameter search for the response-time models")
+    parser.add_argument("--model", choices=sorted(SPACES), default="xgb")
+    parser.add_argument("--trials", type=int, default=64)
+    parser.add_argument("--min-rounds", type=int, default=25)
+    parser.add_argument("--max-rounds", type=int, default=800)
+    parser.add_argument("--cpu-budget", type=int, default=None)
+    parser.add_argument("--threads-per-trial", type=int, default=1)
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds after which no new trial starts")
+    parser.add_argument("--rows", type=int, default=None, help="sample N rows of the store")
+    parser.add_argument("--compare", action="store_true", help="also run the notebook's RandomizedSearchCV")
+    args = parser.parse_args()
+
+    frame = load_response_frame()
+    if args.rows and args.rows < len(frame):
+        frame = frame.sample(args.rows, random_state=42)
+    data = prepare(frame)
+    print("Final X_train shape:", data.X_train_final.shape)
+
+    t0 = time.perf_counter()
+    result = search(args.model, data.X_train_final, data.y_train_log, max_trials=args.trials,
+                    min_rounds=args.min_rounds, max_rounds=args.max_rounds, cpu_budget=args.cpu_budget,
+                    threads_per_trial=args.threads_per_trial, time_budget=args.time_budget)
+    model = fit_best(result, data.X_train_final, data.y_train_log, n_jobs=args.cpu_budget)
+    print(f"ASHA search + refit: {time.perf_counter() - t0:.1f}s")
+    print(result.frame().head(10).to_string(index=False))
+    print_metrics(f"{args.model} (ASHA)", evaluate(model, data))
+    if args.compare:
+        rs = baseline_search(args.model, data.X_train_final, data.y_train_log, n_jobs=args.cpu_budget or -1)
+        print_metrics(f"{args.model} (RandomizedSearchCV)", evaluate(rs.best_estimator_, data))
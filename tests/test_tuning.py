@@ -0,0 +1,46 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("xgboost")
+
+from sfcrime.tuning import search  # noqa: E402
+
+SETTINGS = dict(max_trials=4, min_rounds=2, max_rounds=4, eta=2, early_stopping_rounds=2, cpu_budget=1,
+                verbose=False)
+
+
+def _data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4)).astype(np.float32)
+    return X, (X[:, 0] + rng.normal(scale=0.1, size=200)).astype(np.float32)
+
+
+def _history(directory):
+    with open(os.path.join(directory, "history.jsonl")) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def test_resume_fills_trial_id_gap(tmp_path):
+    X, y = _data()
+    first = search("xgb", X, y, root=str(tmp_path), **SETTINGS)
+    records = _history(first.directory)
+    scores = {(r["trial"], r["rung"]): r["score"] for r in records}
+
+    # Trial 1 was still running when the search was interrupted: history holds trials 0, 2, 3
+    with open(os.path.join(first.directory, "history.jsonl"), "w") as fh:
+        fh.writelines(json.dumps(r) + "\n" for r in records if r["trial"] != 1)
+
+    # A time budget bounds the run should the scheduler hand out an existing id again
+    resumed = search("xgb", X, y, root=str(tmp_path), time_budget=60, **SETTINGS)
+    history = _history(resumed.directory)
+    assert sorted(t.trial_id for t in resumed.trials) == [0, 1, 2, 3]
+    assert len(history) == len(records)
+    assert len({(r["trial"], r["rung"]) for r in history}) == len(history)
+    # Trial 1 re-runs with the config it was sampled with; the others keep their scores
+    assert {k: v for k, v in scores.items() if k[0] != 1} == \
+        {(r["trial"], r["rung"]): r["score"] for r in history if r["trial"] != 1}
+    assert next(t for t in resumed.trials if t.trial_id == 1).params == \
+        next(t for t in first.trials if t.trial_id == 1).params
@@ -1,9 +1,20 @@
+import time
+
+RUN_STARTED = time.perf_counter()
+
 import streamlit as st
-import plotly.express as px
 import pandas as pd
-import numpy as np
 import os
 
+from sfcrime.aggregates import detail_figures, load_aggregates, overview_figures
+from sfcrime.artifacts import ArtifactStore
+from sfcrime.cube import DAYS_OF_WEEK, CrimeCube
+from sfcrime.report import REPORT_MANIFEST, load_report_manifest
+from sfcrime.snapshot import load_snapshot
+from sfcrime.store import open_clean_store
+from sfcrime.synthetic import MOCK_CATEGORIES, MOCK_DISTRICTS, mock_dashboard_frame
+from sfcrime.telemetry import TELEMETRY, breakdown, span
+
 # Page configuration
 st.set_page_config(
     page_title="SF Crime Analysis Project",
@@ -12,6 +23,144 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Spans are always recorded in memory for the diagnostics panel (and exported when SFCRIME_METRICS is set)
+TELEMETRY.enable()
+# Hidden panel: open the app with ?diagnostics=1, or set SFCRIME_DIAGNOSTICS=1
+SHOW_DIAGNOSTICS = st.query_params.get("diagnostics") == "1" or os.getenv("SFCRIME_DIAGNOSTICS") == "1"
+DIAGNOSTICS_HISTORY = 20
+
+# =========================
+# CACHED DATA LAYER
+# =========================
+# Loads and aggregates are shared by every session of this server process.
+# Every cached function takes the store version as its first argument, so a
+# sync that bumps the version makes all sessions rebuild once, and stale
+# entries age out of the bounded caches.
+def data_version():
+    """Version of the cleaned incident store (0 when no store has been built yet)."""
+    return open_clean_store().version
+
+
+@st.cache_resource(show_spinner=False)
+def load_timings():
+    """Process-wide load timings: cold start (first full script run) and per-page load times."""
+    return {"first_paint": None, "pages": {}}
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_aggregate_tables(version):
+    """Materialized count tables (`sfcrime.aggregates`), refreshed first if a sync did not already."""
+    return load_aggregates(open_clean_store())
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_crime_cube(version):
+    """Dashboard cube from the materialized count tables, or mock data without a store."""
+    if version > 0:
+        tables = load_aggregate_tables(version)
+        return CrimeCube.from_aggregates(tables['daily'], tables['hourly'])
+    # Mock Data Generation (for interactive demo)
+    df = mock_dashboard_frame()
+    return CrimeCube.from_frame(df, weight_col='Incidents', categories=MOCK_CATEGORIES, districts=MOCK_DISTRICTS)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_incident_snapshot(version):
+    """Memory-mapped incident columns (cleaned store only; the mock data has no locations)."""
+    # Read-only maps of one file set per version: sessions and server processes share the pages
+    return load_snapshot(open_clean_store())
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def hotspot_cells(version, years, categories, districts):
+    """Top 10 grid cells for one filter tuple, counted over the snapshot's code arrays."""
+    return load_incident_snapshot(version).top_cells(10, years=years, categories=categories, districts=districts)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def dashboard_view(version, years, categories, districts):
+    """Key statistics and figures for one filter tuple (least recently used entries are evicted)."""
+    # Filters are slices of the pre-aggregated cube, not masks over the rows
+    return overview_figures(load_crime_cube(version), years, categories, districts)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def dashboard_detail(version, years, categories, districts):
+    """Hourly pattern and category treemap for one filter tuple, from the count tables (cleaned store only)."""
+    return detail_figures(load_crime_cube(version), load_aggregate_tables(version), years, categories, districts)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_term_index(version):
+    """Per-year incident_description term counts by category and district (cleaned store only)."""
+    from sfcrime.terms import store_terms
+
+    return store_terms(open_clean_store(), verbose=False)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def description_wordcloud(version, years, dimension, groups):
+    """Word cloud PNG for the selected categories or districts (None when nothing matches)."""
+    from sfcrime.terms import wordcloud_png
+
+    freqs = load_term_index(version).frequencies(years=years, **{dimension: list(groups)})
+    return wordcloud_png(freqs) if freqs else None
+
+
+ARTIFACTS = ArtifactStore()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_artifact(path):
+    # Artifact paths embed their version, so a republished image is a new cache key
+    with open(path, 'rb') as fh:
+        return fh.read()
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_response_scorer(model_version):
+    """Micro-batching scorer of a published response-time model bundle, shared by every session."""
+    # Imported here so pages without the model don't pay for sklearn / xgboost imports
+    from sfcrime.serving import BatchScorer, ResponseScorer, load_bundle
+
+    return BatchScorer(ResponseScorer(load_bundle(ARTIFACTS)))
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_report(root, mtime):
+    # Keyed on the manifest's mtime, so a re-render is picked up without restarting the app
+    return load_report_manifest(root)
+
+
+def report_entry(name):
+    """`_report.json` entry of an image, or None when the report renderer never drew it."""
+    path = os.path.join(ARTIFACTS.root, REPORT_MANIFEST)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    return load_report(ARTIFACTS.root, mtime)["figures"].get(name)
+
+
+def show_artifact(name, caption):
+    """Current version of a published image, with its version and build date; repo-root PNGs are a fallback."""
+    with span("app.artifact", artifact=name):
+        entry, path = ARTIFACTS.entry(name), ARTIFACTS.path(name)
+        image = load_artifact(path) if path is not None else None
+    if path is not None:
+        st.image(image, caption=caption, use_container_width=True)
+        note = f"v{entry['version']} · built {time.strftime('%Y-%m-%d', time.localtime(entry['created_at']))}"
+        if entry.get('data_version') is not None:
+            note += f" from data version {entry['data_version']}"
+        report = report_entry(name)
+        # Only meaningful while the shown image is the one the renderer last checked
+        if report is not None and report['artifact_version'] == entry['version']:
+            note += f" · checked against data version {report['data_version']}"
+        st.caption(note)
+    elif os.path.exists(f"{name}.png"):
+        st.image(f"{name}.png", caption=caption, use_container_width=True)
+        st.caption("Unversioned image from the repository root (`python -m sfcrime.artifacts --import-legacy` publishes it).")
+    else:
+        st.warning(f"⚠️ {name} has not been published to {ARTIFACTS.root} yet.")
+
+
 # Custom CSS for better styling
 st.markdown("""
 <style>
@@ -58,19 +207,20 @@ st.markdown("""
 st.markdown('<h1 class="main-header">🚔 Predicting Crime Patterns in San Francisco</h1>', unsafe_allow_html=True)
 st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">Optimizing Public Safety Resource Allocation Through Data Science</p>', unsafe_allow_html=True)
 
-# Tabs: added Models Implemented as tab5
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
+# Navigation: a horizontal radio instead of st.tabs, so only the selected page's code runs
+PAGES = [
     "📊 Introduction",
     "👥 Team",
     "📋 Proposal Overview",
     "🔍 Phase 2 – EDA",
     "🧠 Models Implemented"
-])
+]
+selected_page = st.radio("Navigation", PAGES, horizontal=True, label_visibility="collapsed")
 
 # =========================
 # TAB 1 – INTRODUCTION
 # =========================
-with tab1:
+def render_introduction():
     st.markdown('<h2 class="sub-header">Research Topic & Significance</h2>', unsafe_allow_html=True)
     
     st.write("""
@@ -118,7 +268,7 @@ with tab1:
 # =========================
 # TAB 2 – TEAM
 # =========================
-with tab2:
+def render_team():
     st.markdown('<h2 class="sub-header">👥 Meet Our Team</h2>', unsafe_allow_html=True)
     
     st.info("🎯 **Team Mission Statement**\n\n*To leverage cutting-edge data science and machine learning techniques to transform public safety in San Francisco, creating predictive solutions that protect communities while optimizing resource allocation for maximum societal impact.*")
@@ -164,7 +314,7 @@ with tab2:
 # =========================
 # TAB 3 – PROPOSAL OVERVIEW
 # =========================
-with tab3:
+def render_proposal_overview():
     st.markdown('<h2 class="sub-header">📋 Quick Reference Summary</h2>', unsafe_allow_html=True)
     
     st.markdown("""
@@ -193,57 +343,83 @@ with tab3:
         • **Output:** Interactive dashboards and recommendations  
         """)
 
-    # Mock Data Generation (for interactive demo)
-    np.random.seed(0)
-    dates = pd.to_datetime(pd.date_range('2021-01-01', '2024-12-31', freq='D'))
-    data_points = len(dates)
-    crime_categories = ['Vehicle Theft', 'Robbery', 'Burglary', 'Assault', 'Vandalism']
-    districts = ['Central', 'Southern', 'Northern', 'Bayview', 'Mission', 'Richmond', 'Ingleside', 'Park', 'Taraval', 'Tenderloin']
-    df = pd.DataFrame({
-        'Date': np.random.choice(dates, data_points * 5, replace=True),
-        'Category': np.random.choice(crime_categories, data_points * 5, replace=True),
-        'District': np.random.choice(districts, data_points * 5, replace=True),
-        'Incidents': np.random.randint(1, 10, data_points * 5)
-    })
-
-    st.markdown("### Interactive Crime Dashboard (Mock Data)")
+    with span("app.load_cube"):
+        version = data_version()
+        crime_cube = load_crime_cube(version)
+    crime_categories, districts, years = crime_cube.categories, crime_cube.districts, crime_cube.years
+
+    st.markdown(f"### Interactive Crime Dashboard ({'SF Incident Reports' if version else 'Mock Data'})")
     st.markdown('<div class="text-block">Use the sliders and filters below to explore how crime trends change over time, by category, and by district.</div>', unsafe_allow_html=True)
     col_filters1, col_filters2 = st.columns(2)
     with col_filters1:
-        selected_years = st.slider("Select Year Range:", 2021, 2024, (2022, 2024))
+        if len(years) > 1:
+            selected_years = st.slider("Select Year Range:", years[0], years[-1], (max(years[0], years[-1] - 2), years[-1]))
+        else:
+            selected_years = (years[0], years[0]) if years else (0, 0)
         selected_categories = st.multiselect("Select Crime Categories:", options=crime_categories, default=crime_categories)
     with col_filters2:
         selected_districts = st.multiselect("Select Districts:", options=districts, default=districts)
-    filtered_df = df[
-        (df['Date'].dt.year >= selected_years[0]) &
-        (df['Date'].dt.year <= selected_years[1]) &
-        (df['Category'].isin(selected_categories)) &
-        (df['District'].isin(selected_districts))
-    ]
+    with span("app.dashboard_view"):
+        stats, fig_time, fig_district = dashboard_view(
+            version, tuple(selected_years), tuple(sorted(selected_categories)), tuple(sorted(selected_districts)))
 
     # Display statistics
     st.markdown('<h3 class="sub-header">Key Statistics</h3>', unsafe_allow_html=True)
     col_stats1, col_stats2, col_stats3 = st.columns(3)
     with col_stats1:
-        st.metric("Total Incidents (in range)", f"{filtered_df['Incidents'].sum():,}")
+        st.metric("Total Incidents (in range)", f"{stats['total']:,}")
     with col_stats2:
-        st.metric("Average Daily Incidents", f"{filtered_df['Incidents'].sum() / (filtered_df['Date'].nunique()):.2f}")
+        st.metric("Average Daily Incidents", f"{stats['daily_average']:.2f}")
     with col_stats3:
-        st.metric("Most Common Crime", filtered_df['Category'].mode()[0] if not filtered_df.empty else "N/A")
+        st.metric("Most Common Crime", stats['top_category'] or "N/A")
 
     # Crime Trends Over Time
     st.markdown('<h3 class="sub-header">Crime Trends Over Time</h3>', unsafe_allow_html=True)
-    trend_data = filtered_df.groupby(filtered_df['Date'].dt.to_period('M'))['Incidents'].sum().reset_index()
-    trend_data['Date'] = trend_data['Date'].astype(str)
-    fig_time = px.line(trend_data, x='Date', y='Incidents', title='Monthly Crime Incidents Trend')
     st.plotly_chart(fig_time, use_container_width=True)
 
     # Crime Distribution by District
     st.markdown('<h3 class="sub-header">Crime Distribution by District</h3>', unsafe_allow_html=True)
-    district_data = filtered_df.groupby('District')['Incidents'].sum().reset_index()
-    fig_district = px.bar(district_data, x='District', y='Incidents', title='Total Incidents by District')
     st.plotly_chart(fig_district, use_container_width=True)
 
+    # Hour-of-day pattern and category hierarchy from the materialized count tables
+    if version:
+        with span("app.dashboard_detail"):
+            fig_hour, fig_treemap = dashboard_detail(
+                version, tuple(selected_years), tuple(sorted(selected_categories)), tuple(sorted(selected_districts)))
+        st.markdown('<h3 class="sub-header">Crime by Hour of Day</h3>', unsafe_allow_html=True)
+        st.plotly_chart(fig_hour, use_container_width=True)
+        st.markdown('<h3 class="sub-header">Categories and Subcategories</h3>', unsafe_allow_html=True)
+        st.plotly_chart(fig_treemap, use_container_width=True)
+
+    # Word cloud from the cached term counts (one filter dimension at a time)
+    if version:
+        st.markdown('<h3 class="sub-header">Incident Description Word Cloud</h3>', unsafe_allow_html=True)
+        cloud_for = st.radio("Word cloud for:", ["Selected categories", "Selected districts"], horizontal=True)
+        dimension, groups = (('categories', selected_categories) if cloud_for == "Selected categories"
+                             else ('districts', selected_districts))
+        with span("app.wordcloud"):
+            png = description_wordcloud(version, tuple(selected_years), dimension, tuple(sorted(groups)))
+        if png:
+            st.image(png, use_container_width=True)
+        else:
+            st.info("No incident descriptions match the selected filters.")
+        st.caption("Term counts are cached per year, category and district, so the cloud follows the year range "
+                   "and one of the category / district filters.")
+
+    # Hotspot cells (250 m grid) from the memory-mapped snapshot
+    if version:
+        st.markdown('<h3 class="sub-header">Hotspot Cells</h3>', unsafe_allow_html=True)
+        with span("app.hotspots") as step:
+            hotspots = hotspot_cells(
+                version, tuple(selected_years), tuple(sorted(selected_categories)), tuple(sorted(selected_districts)))
+            step.rows_out = len(hotspots)
+        col_map, col_table = st.columns([2, 1])
+        with col_map:
+            st.map(hotspots, latitude='latitude', longitude='longitude', size=125)
+        with col_table:
+            st.dataframe(hotspots[['latitude', 'longitude', 'count']], use_container_width=True, hide_index=True)
+        st.caption("Top 10 grid cells by incident count for the selected years, categories and districts.")
+
     # Key Research Questions
     st.markdown('<h3 class="sub-header">❓ Key Research Questions</h3>', unsafe_allow_html=True)
     questions = [
@@ -275,7 +451,7 @@ with tab3:
 # =========================
 # TAB 4 – PHASE 2 EDA
 # =========================
-with tab4:
+def render_eda():
     st.markdown('<h2 class="sub-header">🧠 Phase 2 – Exploratory Data Analysis (EDA)</h2>', unsafe_allow_html=True)
 
     st.write("""
@@ -302,10 +478,7 @@ with tab4:
         ("coorelation_heatmap", "Correlation Heatmap (Before Cleaning)"),
         ("coorelation_heatmap_cleaned", "Correlation Heatmap (After Cleaning)")
     ]:
-        if os.path.exists(f"{img_name}.png"):
-            st.image(f"{img_name}.png", caption=caption, use_container_width=True)
-        else:
-            st.warning(f"⚠️ {img_name}.png not found in directory.")
+        show_artifact(img_name, caption)
 
     st.write("""
     The correlation heatmaps help in identifying **relationships between variables**
@@ -339,10 +512,7 @@ with tab4:
 
     for img_name, title, desc in visualizations:
         st.markdown(f'<h4 style="color:#1f77b4;">📍 {title}</h4>', unsafe_allow_html=True)
-        if os.path.exists(f"{img_name}.png"):
-            st.image(f"{img_name}.png", caption=title, use_container_width=True)
-        else:
-            st.warning(f"⚠️ {img_name}.png not found.")
+        show_artifact(img_name, title)
         st.write(desc)
         st.markdown("---")
 
@@ -367,7 +537,7 @@ with tab4:
 # =========================
 # TAB 5 – MODELS IMPLEMENTED
 # =========================
-with tab5:
+def render_models():
     st.markdown('<h2 class="sub-header">🧠 Models Implemented</h2>', unsafe_allow_html=True)
 
     st.markdown("""
@@ -427,10 +597,7 @@ with tab5:
       could be effective in those regions.
     """)
 
-    if os.path.exists("apriori_scatter_plot.png"):
-        st.image("apriori_scatter_plot.png",
-                 caption="Apriori Association Rules – Confidence vs Lift (colored by Support)",
-                 use_container_width=True)
+    show_artifact("apriori_scatter_plot", "Apriori Association Rules – Confidence vs Lift (colored by Support)")
 
     st.markdown("---")
 
@@ -474,15 +641,9 @@ with tab5:
 
     cols_k = st.columns(2)
     with cols_k[0]:
-        if os.path.exists("kmeans_elbow_plot.png"):
-            st.image("kmeans_elbow_plot.png",
-                     caption="K-Means Elbow Plot – Choosing Number of Clusters",
-                     use_container_width=True)
+        show_artifact("kmeans_elbow_plot", "K-Means Elbow Plot – Choosing Number of Clusters")
     with cols_k[1]:
-        if os.path.exists("kmeans_cluster_map.png"):
-            st.image("kmeans_cluster_map.png",
-                     caption="K-Means Cluster Map – Spatial Distribution of Clusters",
-                     use_container_width=True)
+        show_artifact("kmeans_cluster_map", "K-Means Cluster Map – Spatial Distribution of Clusters")
 
     st.markdown("---")
 
@@ -527,10 +688,7 @@ with tab5:
     This plot helps us understand where the model is confident vs likely to misclassify.
     """)
 
-    if os.path.exists("svm_decision_boundary.png"):
-        st.image("svm_decision_boundary.png",
-                 caption="SVM Decision Boundary (Slice in PCA Space: PC1 vs PC2)",
-                 use_container_width=True)
+    show_artifact("svm_decision_boundary", "SVM Decision Boundary (Slice in PCA Space: PC1 vs PC2)")
 
     st.markdown("---")
 
@@ -618,6 +776,8 @@ with tab5:
 
     st.markdown("---")
 
+    render_response_model()
+
     # -------------------------
     # OVERALL MODEL SUMMARY
     # -------------------------
@@ -639,6 +799,67 @@ with tab5:
       potential and limitations of purely data-driven forecasting for public safety.
     """)
 
+
+def render_response_model():
+    """Metrics and a what-if prediction from the published response-time model bundle, if there is one."""
+    entry = ARTIFACTS.entry("response_time_model")
+    if entry is None:
+        return
+    meta = entry.get('meta', {})
+    metrics = meta.get('metrics', {})
+    st.markdown('<h3 class="sub-header">⏱️ Response-Time Model (Published Bundle)</h3>', unsafe_allow_html=True)
+    st.caption(f"{meta.get('kind', '')} · bundle v{entry['version']} · trained on data version {entry['data_version']} "
+               f"· target capped at {meta.get('cap_val', float('nan')):,.0f} min")
+    if metrics:
+        st.table(pd.DataFrame({
+            'RMSE': [metrics['rmse_tr'], metrics['rmse']],
+            'MAE': [metrics['mae_tr'], metrics['mae']],
+            'R²': [metrics['r2_tr'], metrics['r2']],
+        }, index=['Train', 'Test']).round(3))
+
+    scorer = load_response_scorer(entry['version'])
+    categories = scorer.scorer.bundle.categories
+    with st.form("response_time_form"):
+        cols = st.columns(3)
+        district = cols[0].selectbox("Police district", categories['police_district'])
+        neighborhood = cols[1].selectbox("Neighborhood", categories['analysis_neighborhood'])
+        category = cols[2].selectbox("Incident category", categories['incident_category'])
+        cols = st.columns(5)
+        lat = cols[0].number_input("Latitude", value=37.7749, format="%.4f")
+        lon = cols[1].number_input("Longitude", value=-122.4194, format="%.4f")
+        hour = cols[2].slider("Hour", 0, 23, 12)
+        weekday = cols[3].selectbox("Weekday", range(7), format_func=lambda d: DAYS_OF_WEEK[d])
+        month = cols[4].slider("Month", 1, 12, 6)
+        submitted = st.form_submit_button("Predict response time")
+    if submitted:
+        minutes = scorer.predict({'lat': [lat], 'lon': [lon], 'hour': [hour], 'weekday': [weekday], 'month': [month],
+                                  'district': [district], 'neighborhood': [neighborhood], 'category': [category]})[0]
+        st.metric("Predicted response time", f"{minutes:,.0f} min")
+    stats = scorer.stats()
+    if stats['requests']:
+        st.caption(f"Scorer: {stats['requests']} requests · p50 {stats['p50_ms']:.1f} ms · p99 {stats['p99_ms']:.1f} ms")
+
+    st.markdown("---")
+
+
+# =========================
+# PAGE DISPATCH
+# =========================
+RENDERERS = dict(zip(PAGES, [render_introduction, render_team, render_proposal_overview, render_eda, render_models]))
+# Root span of this rerun; the diagnostics panel breaks it down by its direct children. As a context
+# manager it is closed when a page raises, or when Streamlit interrupts the run for a widget change
+with span("app.rerun", page=selected_page) as rerun:
+    page_started = time.perf_counter()
+    RENDERERS[selected_page]()
+    page_seconds = time.perf_counter() - page_started
+
+    timings = load_timings()
+    page_stats = timings["pages"].setdefault(selected_page, {"first_load": page_seconds, "last_load": page_seconds, "runs": 0})
+    page_stats["last_load"] = page_seconds
+    page_stats["runs"] += 1
+    if timings["first_paint"] is None:
+        timings["first_paint"] = time.perf_counter() - RUN_STARTED
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -647,3 +868,27 @@ st.markdown("""
     <p>San Francisco Crime Prediction Project • 2024</p>
 </div>
 """, unsafe_allow_html=True)
+
+with st.expander("⏱️ Load times"):
+    st.write(f"Cold start (first page of this server process): **{timings['first_paint']:.2f} s** · "
+             f"this run: **{time.perf_counter() - RUN_STARTED:.2f} s**")
+    st.dataframe(pd.DataFrame.from_dict(timings["pages"], orient="index").rename_axis("Page"),
+                 use_container_width=True)
+
+if SHOW_DIAGNOSTICS:
+    # Per-session history of rerun breakdowns (seconds per stage)
+    history = st.session_state.setdefault("diagnostics_history", [])
+    history.append({"page": selected_page, **breakdown(rerun)})
+    del history[:-DIAGNOSTICS_HISTORY]
+    with st.expander("🩺 Diagnostics", expanded=True):
+        st.write(f"This rerun: **{rerun.seconds * 1000:,.0f} ms** on {selected_page}")
+        spans = TELEMETRY.finished(root=rerun.root)
+        rows = [{"Stage": "\u2003" * s.depth + s.name, "ms": round(s.seconds * 1000, 1), "Rows in": s.rows_in,
+                 "Rows out": s.rows_out,
+                 "Peak RSS (MB)": round(s.peak_rss / 2**20, 1) if s.peak_rss is not None else None}
+                for s in sorted(spans, key=lambda s: s.started_at)]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.markdown(f"**Last {len(history)} reruns** (seconds by stage; `(other)` is everything outside a span)")
+        recent = pd.DataFrame(history).drop(columns="page").fillna(0.0)
+        recent.index = pd.RangeIndex(1, len(recent) + 1, name="Rerun")
+        st.bar_chart(recent, x_label="Rerun", y_label="Seconds")